@@ -1,36 +1,19 @@
 import os
 import logging
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from database import Base, configure_app, db  # noqa: F401
 
 # Configure logging for debugging
 logging.basicConfig(level=logging.DEBUG)
 
-class Base(DeclarativeBase):
-    pass
-
-db = SQLAlchemy(model_class=Base)
-
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "hr-management-secret-key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "postgresql://localhost/hr_management")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-    "connect_args": {
-        "client_encoding": "utf8"
-    }
-}
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# initialize the app with the extension
-db.init_app(app)
+# Database, payroll and attendance settings (see database.configure_app)
+configure_app(app)
 
 with app.app_context():
     # Import models to ensure tables are created
@@ -39,7 +22,27 @@ with app.app_context():
     # Import routes
     from routes import *
     
-    # Create all database tables
-    db.create_all()
+    # Register background job handlers
+    import payroll_jobs
     
-    print("Database tables created successfully!")
+    # Command-line payroll runs: flask payroll run, flask attendance ingest, flask db upgrade...
+    from commands import attendance_cli, db_cli, jobs_cli, payroll_cli
+    app.cli.add_command(payroll_cli)
+    app.cli.add_command(attendance_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(jobs_cli)
+
+
+def start_web_server():
+    """
+    Startup of a web server process (main.py): create and upgrade the
+    tables, then fail or requeue the background jobs a stopped server left
+    behind. Importing app changes nothing in the database, so flask
+    commands and payroll worker processes do not run this.
+    """
+    from job_runner import recover_stale_jobs
+    from schema_upgrades import prepare_database
+
+    with app.app_context():
+        prepare_database()
+        recover_stale_jobs()
@@ -0,0 +1,112 @@
+"""
+Attendance File Cache
+Parsed punches of uploaded attendance exports, kept on local disk keyed by
+the SHA-256 of the upload, so a repeat upload of the same export skips
+Excel parsing. Each entry is a directory of NumPy .npz column files, one
+per chunk; least recently used entries are evicted once the cache exceeds
+its size budget.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+DIGEST_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as content:
+        for block in iter(lambda: content.read(DIGEST_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _columns(frame):
+    """Typed NumPy columns of a frame; text columns become fixed-width strings"""
+    return {
+        column: values.astype(str).to_numpy(dtype=str) if values.dtype == object else values.to_numpy()
+        for column, values in frame.items()
+    }
+
+
+class AttendanceCache:
+    """Cache directory of parsed punch frames, bounded by max_bytes"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def get(self, digest):
+        """Chunks of a cached file as DataFrames, None when the file was never stored"""
+        entry = self._entry(digest)
+        if not os.path.isdir(entry):
+            return None
+        # Entry mtime is the LRU clock
+        os.utime(entry)
+        return self._read(entry, sorted(os.listdir(entry)))
+
+    def _read(self, entry, names):
+        for name in names:
+            with np.load(os.path.join(entry, name), allow_pickle=False) as columns:
+                yield pd.DataFrame({column: columns[column] for column in columns.files})
+
+    def store(self, digest, chunks):
+        """
+        Pass chunks through while writing them to the cache
+
+        The entry only appears once every chunk was written, so an
+        interrupted read never leaves a partial file behind.
+        """
+        staging = tempfile.mkdtemp(prefix=f'.{digest[:12]}-', dir=self.directory)
+        complete = False
+        try:
+            for index, chunk in enumerate(chunks):
+                np.savez(os.path.join(staging, f'{index:06d}.npz'), **_columns(chunk))
+                yield chunk
+            complete = True
+        finally:
+            if complete:
+                try:
+                    os.rename(staging, self._entry(digest))
+                except OSError:
+                    # Stored meanwhile by another run
+                    complete = False
+            if not complete:
+                shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def _size(self, entry):
+        return sum(entry_file.stat().st_size for entry_file in os.scandir(entry))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = [
+            (entry.stat().st_mtime, entry.path, self._size(entry.path))
+            for entry in os.scandir(self.directory)
+            if entry.is_dir() and not entry.name.startswith('.')
+        ]
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def get_attendance_cache():
+    """Cache configured by ATTENDANCE_CACHE_DIR/ATTENDANCE_CACHE_MAX_MB, None when disabled"""
+    from flask import current_app
+
+    max_mb = current_app.config.get('ATTENDANCE_CACHE_MAX_MB', 0)
+    if max_mb <= 0:
+        return None
+    return AttendanceCache(current_app.config['ATTENDANCE_CACHE_DIR'], max_mb * 1024 * 1024)
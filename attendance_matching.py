@@ -0,0 +1,139 @@
+"""
+Attendance Employee Matching
+Reconciles device users of an attendance export with active employees from
+one query: exact lookups on the employee code (the device card number) and
+on normalized names, then trigram similarity for names that do not match
+exactly one employee. A code held by several employees identifies none of
+them: device users with that card are left unmatched and reported.
+
+    matcher = EmployeeMatcher.load()
+    match = matcher.match('BENALI Ahmed', '1042')   # EmployeeMatch or None
+"""
+
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+
+# pg_trgm-style similarity needed for a fuzzy match, and the lead the best
+# candidate needs over the next one
+FUZZY_THRESHOLD = 0.65
+FUZZY_MARGIN = 0.1
+
+EmployeeMatch = namedtuple('EmployeeMatch', ['id', 'name', 'matched_by'])
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize_name(name):
+    """Accent-stripped, case-folded name with its words sorted: 'Bénali  AHMED' -> 'ahmed benali'"""
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(sorted(_WORD.findall(text)))
+
+
+def normalize_code(code):
+    """Employee code or card number as compared: stripped, case-folded"""
+    return str(code).strip().casefold() if code is not None else ''
+
+
+def trigrams(normalized):
+    """Trigrams of each word padded like pg_trgm ('  w', ' wo', ..., 'rd ')"""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class EmployeeMatcher:
+    """In-memory indexes of active employees by code, name and name trigrams"""
+
+    def __init__(self, employees):
+        """
+        Args:
+            employees: iterable of (id, employee_id, name) rows
+        """
+        self.names = {}
+        self.by_code = {}
+        self.shared_codes = defaultdict(list)
+        self.by_name = defaultdict(list)
+        self.trigram_counts = {}
+        self.by_trigram = defaultdict(list)
+        for id_, code, name in employees:
+            self.names[id_] = name
+            code = normalize_code(code)
+            if code in self.shared_codes:
+                self.shared_codes[code].append(id_)
+            elif code in self.by_code:
+                self.shared_codes[code] = [self.by_code.pop(code), id_]
+            elif code:
+                self.by_code[code] = id_
+            normalized = normalize_name(name)
+            if normalized:
+                self.by_name[normalized].append(id_)
+                grams = trigrams(normalized)
+                self.trigram_counts[id_] = len(grams)
+                for gram in grams:
+                    self.by_trigram[gram].append(id_)
+
+    @classmethod
+    def load(cls):
+        """Matcher over the active employees"""
+        from database import db
+        from models import Employee
+
+        return cls(
+            db.session.query(Employee.id, Employee.employee_id, Employee.name)
+            .filter(Employee.is_active == 1)
+        )
+
+    def _found(self, id_, matched_by):
+        return EmployeeMatch(id_, self.names[id_], matched_by)
+
+    def fuzzy(self, normalized):
+        """
+        Employee whose name is most similar, None below FUZZY_THRESHOLD or
+        without a clear lead over the next most similar employee
+        """
+        grams = trigrams(normalized)
+        if not grams:
+            return None
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.by_trigram.get(gram, ()))
+        # Shared trigrams over the trigrams of either name
+        ranked = heapq.nlargest(
+            2, ((count / (len(grams) + self.trigram_counts[id_] - count), id_) for id_, count in shared.items())
+        )
+        if not ranked or ranked[0][0] < FUZZY_THRESHOLD:
+            return None
+        if len(ranked) > 1 and ranked[0][0] - ranked[1][0] < FUZZY_MARGIN:
+            return None
+        return self._found(ranked[0][1], 'fuzzy')
+
+    def sharing_card(self, card_number):
+        """Names of the employees whose code is this card number, when more than one has it"""
+        return [self.names[id_] for id_ in self.shared_codes.get(normalize_code(card_number), ())]
+
+    def match(self, name, card_number=None):
+        """
+        Employee of a device user: by card number, then exact name, then
+        similar name; None when the card number is shared by several employees
+        """
+        code = normalize_code(card_number)
+        if code in self.shared_codes:
+            return None
+        id_ = self.by_code.get(code)
+        if id_ is not None:
+            return self._found(id_, 'card')
+
+        normalized = normalize_name(name)
+        if not normalized:
+            return None
+        ids = self.by_name.get(normalized)
+        if ids and len(ids) == 1:
+            return self._found(ids[0], 'name')
+        return self.fuzzy(normalized)
@@ -1,23 +1,160 @@
 """
 Attendance Processor for Excel File Integration
 Processes attendance data from Excel files for payroll calculations
+
+Exports are read in chunks of rows and reduced to one row per employee and
+day as they are read, so memory follows the number of employees rather than
+the number of punches. Only .xlsx files are streamed from disk: xlrd loads a
+legacy .xls sheet whole before its rows are chunked.
+
+Unreadable files raise ValueError, which fails the payroll job or the
+attendance CLI command with the reason.
 """
 
+import logging
+import math
+from itertools import islice
 import pandas as pd
-from datetime import datetime, timedelta
-from collections import defaultdict
-import re
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 50000
+
+# First bytes of the two Excel container formats
+XLSX_SIGNATURE = b'PK\x03\x04'
+XLS_SIGNATURE = b'\xd0\xcf\x11\xe0'
+
+
+def _blank(value):
+    """Empty cells become NaN, as pandas.read_excel leaves them"""
+    return math.nan if value is None or value == '' else value
+
+
+def _xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    return _closing(workbook.worksheets[0].iter_rows(values_only=True), workbook.close)
+
+
+def _xls_rows(path):
+    """
+    Rows of a legacy .xls sheet
+
+    Not streamed: on_demand only defers loading the other sheets, the first
+    sheet is parsed whole by sheet_by_index. The format is limited to 65,536
+    rows, which bounds the memory this takes.
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(path, on_demand=True)
+    sheet = book.sheet_by_index(0)
+
+    def cells(index):
+        for cell in sheet.row(index):
+            value = cell.value
+            if cell.ctype == xlrd.XL_CELL_DATE:
+                value = xlrd.xldate_as_datetime(value, book.datemode)
+            elif cell.ctype == xlrd.XL_CELL_NUMBER and value.is_integer():
+                value = int(value)
+            elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                value = None
+            yield value
+
+    return _closing((list(cells(index)) for index in range(sheet.nrows)), book.release_resources)
+
+
+def _cell_text(value):
+    """Cell value as text, card number 3111173.0 as '3111173'"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _closing(rows, close):
+    try:
+        yield from rows
+    finally:
+        close()
+
+
+def open_excel_rows(path):
+    """
+    Row iterator of the first sheet of an .xlsx or .xls file, picked from
+    the file's signature (uploads are saved as .xls whatever their format)
+
+    The workbook is opened by this call: unreadable files raise here, and
+    ValueError is raised for anything that is not an Excel workbook.
+    """
+    with open(path, 'rb') as excel_file:
+        signature = excel_file.read(4)
+    if signature == XLSX_SIGNATURE:
+        return _xlsx_rows(path)
+    if signature == XLS_SIGNATURE:
+        return _xls_rows(path)
+    raise ValueError("Not an Excel workbook")
+
+
+def iter_excel_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    DataFrames of at most chunk_rows rows, with the first row as header
+
+    Columns hold the cell values as objects, empty cells as NaN. The file
+    is opened by this call, so read errors are raised here.
+    """
+    return _chunks(open_excel_rows(path), chunk_rows)
+
+
+def _chunks(rows, chunk_rows):
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [
+        str(name).strip() if name is not None else f'Unnamed: {index}'
+        for index, name in enumerate(header)
+    ]
+    while True:
+        chunk = [
+            [_blank(value) for value in row[:len(columns)]] + [math.nan] * (len(columns) - len(row))
+            for row in islice(rows, chunk_rows)
+        ]
+        if not chunk:
+            return
+        yield pd.DataFrame(chunk, columns=columns, dtype=object)
+
 
 class AttendanceProcessor:
     """Process attendance data from Excel files for payroll integration"""
     
-    def __init__(self, excel_file_path):
+    # Device export columns used by the processing
+    EXPORT_COLUMNS = ['Time', 'Prénom', 'Last Name', 'Nombre du personnel', 'Numéro de carte',
+                      'In / Out Status', 'Device']
+    
+    STANDARD_DAILY_HOURS = 8
+    LUNCH_BREAK_HOURS = 1
+    LUNCH_BREAK_AFTER_HOURS = 6
+    
+    def __init__(self, excel_file_path, chunk_rows=CHUNK_ROWS, cache=None):
         self.excel_file_path = excel_file_path
+        self.chunk_rows = chunk_rows
+        # AttendanceCache of parsed punches (see attendance_cache), None to always parse
+        self.cache = cache
+        self.from_cache = False
+        # Whole export, only when loaded with read_excel_file or assigned directly
         self.attendance_data = None
+        self.daily_hours = None
         self.processed_data = {}
+        # Employee id of each matched device user, by employee key
+        self.employee_matches = {}
+        # Names of the employees sharing each card number left unmatched
+        self.ambiguous_cards = {}
         
     def read_excel_file(self):
-        """Read and validate Excel file format"""
+        """
+        Read and validate Excel file format, loading the whole export in memory
+
+        Raises ValueError when neither engine can read the file.
+        """
         try:
             # Try reading with xlrd engine first
             self.attendance_data = pd.read_excel(
@@ -26,6 +163,7 @@ class AttendanceProcessor:
             )
             return True
         except Exception as e:
+            logger.info(f"xlrd cannot read {self.excel_file_path} ({e}), trying openpyxl")
             try:
                 # Fallback to openpyxl
                 self.attendance_data = pd.read_excel(
@@ -34,179 +172,210 @@ class AttendanceProcessor:
                 )
                 return True
             except Exception as e2:
-                print(f"Error reading Excel file: {e2}")
-                return False
+                raise ValueError(f"Fichier de présence illisible: {e2}") from e2
+    
+    def iter_chunks(self):
+        """The export in chunks of rows: streamed from the file unless already loaded"""
+        if self.attendance_data is not None:
+            return iter([self.attendance_data])
+        return iter_excel_chunks(self.excel_file_path, self.chunk_rows)
+    
+    def _text_column(self, df, column):
+        """
+        Column as stripped strings; '' for every row when the export lacks it
+
+        Whole numbers read as floats (read_excel turns a numeric column with
+        blanks into float64) are written without '.0', like the streamed rows.
+        """
+        if column not in df.columns:
+            return pd.Series('', index=df.index)
+        return df[column].map(_cell_text).str.strip()
+    
+    def _prepare_punches(self, df):
+        """
+        One row per punch with a valid time: employee key, name, card number,
+        time, day and in/out classification
+        """
+        times = pd.to_datetime(df['Time'], errors='coerce')
+        keep = times.notna()
+        df = df.loc[keep, [column for column in self.EXPORT_COLUMNS if column in df.columns]]
+        times = times[keep]
+        
+        # Use the most complete name: first and last name, else the personnel name
+        full_name = (self._text_column(df, 'Prénom') + ' ' + self._text_column(df, 'Last Name')).str.strip()
+        full_name = full_name.where(full_name != '', self._text_column(df, 'Nombre du personnel'))
+        card_number = self._text_column(df, 'Numéro de carte')
+        status = self._text_column(df, 'In / Out Status').str.lower()
+        is_in = status.str.contains('in', regex=False)
+        
+        return pd.DataFrame({
+            'employee_key': full_name + '_' + card_number,
+            'name': full_name,
+            'card_number': card_number,
+            'time': times,
+            'day': times.dt.normalize(),
+            'is_in': is_in,
+            'is_out': ~is_in & status.str.contains('out', regex=False),
+            'device': self._text_column(df, 'Device'),
+        })
+    
+    def _month_punches(self, punches, month_year=None):
+        """Punches of a 'MM/YYYY' month, all of them without one"""
+        if not month_year:
+            return punches
+        try:
+            month, year = month_year.split('/')
+            return punches[(punches['time'].dt.month == int(month)) & (punches['time'].dt.year == int(year))]
+        except ValueError:
+            return punches
+    
+    def iter_punches(self):
+        """
+        Prepared punches in chunks; a file already parsed once is loaded from
+        the cache instead of being read again
+        """
+        self.from_cache = False
+        if self.attendance_data is not None or self.cache is None:
+            return (self._prepare_punches(chunk) for chunk in self.iter_chunks())
+        
+        from attendance_cache import file_digest
+        
+        digest = file_digest(self.excel_file_path)
+        punches = self.cache.get(digest)
+        if punches is not None:
+            self.from_cache = True
+            return punches
+        # Opened here so that unreadable files fail before anything is cached
+        chunks = self.iter_chunks()
+        return self.cache.store(digest, (self._prepare_punches(chunk) for chunk in chunks))
+    
+    def _daily_bounds(self, punches):
+        """Per employee and day: first check-in, last check-out and punch count"""
+        return punches.assign(
+            in_time=punches['time'].where(punches['is_in']),
+            out_time=punches['time'].where(punches['is_out'])
+        ).groupby(['employee_key', 'day'], sort=False).agg(
+            first_in=('in_time', 'min'),
+            last_out=('out_time', 'max'),
+            punches=('time', 'size')
+        )
+    
+    def _merge_daily(self, daily, bounds):
+        """Fold the day bounds of a new chunk into the ones read so far"""
+        return pd.concat([daily, bounds]).groupby(level=['employee_key', 'day'], sort=False).agg(
+            first_in=('first_in', 'min'),
+            last_out=('last_out', 'max'),
+            punches=('punches', 'sum')
+        )
+    
+    def _daily_hours(self, daily):
+        """
+        Hours worked per employee and day, in day order
+        
+        Days without both a check-in and a check-out, or with no positive
+        time between them, count no hours and are not worked days.
+        """
+        daily = daily.sort_index(level='day', sort_remaining=False)
+        hours = (daily['last_out'] - daily['first_in']).dt.total_seconds() / 3600
+        # Subtract lunch break if working more than the threshold
+        hours = hours.where(hours <= self.LUNCH_BREAK_AFTER_HOURS, hours - self.LUNCH_BREAK_HOURS)
+        daily['worked'] = hours > 0
+        daily['hours'] = hours.where(daily['worked'], 0.0)
+        return daily
     
     def process_attendance_data(self, month_year=None):
         """
         Process attendance data and calculate working hours for each employee
         
+        The export is read chunk by chunk, or loaded from the cache when
+        the same file was parsed before; only the employees and their
+        per-day check-in/check-out bounds are kept between chunks.
+        
         Args:
             month_year: Format 'MM/YYYY' to filter specific month
         
         Returns:
             dict: Employee attendance summary
+        
+        Raises ValueError when the file cannot be read.
         """
-        if self.attendance_data is None:
-            if not self.read_excel_file():
-                return {}
+        try:
+            chunks = self.iter_punches()
+        except Exception as e:
+            raise ValueError(f"Fichier de présence illisible: {e}") from e
         
-        # Clean and prepare data
-        df = self.attendance_data.copy()
+        employees = None
+        daily = None
+        for punches in chunks:
+            punches = self._month_punches(punches, month_year)
+            chunk_employees = punches.drop_duplicates('employee_key')[['employee_key', 'name', 'card_number']]
+            bounds = self._daily_bounds(punches)
+            if employees is None:
+                employees, daily = chunk_employees, bounds
+            else:
+                # Employees stay in the order they first appear in the export
+                employees = pd.concat([employees, chunk_employees]).drop_duplicates('employee_key')
+                daily = self._merge_daily(daily, bounds)
         
-        # Convert Time column to datetime
-        df['Time'] = pd.to_datetime(df['Time'], errors='coerce')
+        self.processed_data = {}
+        if employees is None:
+            return self.processed_data
         
-        # Filter by month if specified
-        if month_year:
-            try:
-                month, year = month_year.split('/')
-                df = df[
-                    (df['Time'].dt.month == int(month)) & 
-                    (df['Time'].dt.year == int(year))
-                ]
-            except:
-                pass
-        
-        # Group by employee (using name and card number)
-        employee_summary = defaultdict(lambda: {
-            'name': '',
-            'card_number': '',
-            'days_worked': 0,
-            'total_hours': 0,
-            'overtime_hours': 0,
-            'attendance_records': []
-        })
+        daily = self._daily_hours(daily)
+        employees = employees.set_index('employee_key')
+        totals = daily.groupby(level='employee_key', sort=False).agg(
+            total_hours=('hours', 'sum'),
+            days_worked=('worked', 'sum')
+        ).reindex(employees.index)
         
-        # Process each record
-        for _, row in df.iterrows():
-            if pd.isna(row['Time']):
-                continue
-                
-            # Combine name fields
-            first_name = str(row.get('Prénom', '')).strip()
-            last_name = str(row.get('Last Name', '')).strip()
-            personnel_name = str(row.get('Nombre du personnel', '')).strip()
-            
-            # Use the most complete name
-            full_name = f"{first_name} {last_name}".strip()
-            if not full_name or full_name == ' ':
-                full_name = personnel_name
-            
-            card_number = str(row.get('Numéro de carte', '')).strip()
-            
-            # Create unique key for employee
-            employee_key = f"{full_name}_{card_number}"
-            
-            # Store basic info
-            employee_summary[employee_key]['name'] = full_name
-            employee_summary[employee_key]['card_number'] = card_number
-            
-            # Add attendance record
-            employee_summary[employee_key]['attendance_records'].append({
-                'time': row['Time'],
-                'in_out_status': str(row.get('In / Out Status', '')).strip(),
-                'device': str(row.get('Device', '')).strip()
-            })
-        
-        # Calculate working hours for each employee
-        for employee_key, data in employee_summary.items():
-            self._calculate_working_hours(data)
-        
-        self.processed_data = dict(employee_summary)
+        self.daily_hours = daily
+        for employee_key, name, card_number, total_hours, days_worked in zip(
+            employees.index, employees['name'], employees['card_number'],
+            totals['total_hours'], totals['days_worked']
+        ):
+            # Overtime beyond the standard hours per worked day
+            days_worked = int(days_worked)
+            standard_hours = days_worked * self.STANDARD_DAILY_HOURS
+            self.processed_data[employee_key] = {
+                'name': name,
+                'card_number': card_number,
+                'days_worked': days_worked,
+                'total_hours': round(total_hours, 2),
+                'overtime_hours': round(total_hours - standard_hours, 2) if total_hours > standard_hours else 0,
+            }
         return self.processed_data
     
-    def _calculate_working_hours(self, employee_data):
-        """Calculate total working hours and overtime for an employee"""
-        records = sorted(employee_data['attendance_records'], key=lambda x: x['time'])
-        
-        daily_hours = defaultdict(list)
-        
-        # Group records by date
-        for record in records:
-            date_key = record['time'].date()
-            daily_hours[date_key].append(record)
-        
-        total_hours = 0
-        days_worked = 0
-        
-        # Calculate hours for each day
-        for date, day_records in daily_hours.items():
-            # Find check-in and check-out times
-            in_times = []
-            out_times = []
-            
-            for record in day_records:
-                if 'in' in record['in_out_status'].lower():
-                    in_times.append(record['time'])
-                elif 'out' in record['in_out_status'].lower():
-                    out_times.append(record['time'])
-            
-            # Calculate daily hours
-            if in_times and out_times:
-                # Use first check-in and last check-out
-                first_in = min(in_times)
-                last_out = max(out_times)
-                
-                # Calculate hours worked
-                time_diff = last_out - first_in
-                hours_worked = time_diff.total_seconds() / 3600
-                
-                # Subtract lunch break (1 hour) if working > 6 hours
-                if hours_worked > 6:
-                    hours_worked -= 1
-                
-                if hours_worked > 0:
-                    total_hours += hours_worked
-                    days_worked += 1
-        
-        # Update employee data
-        employee_data['total_hours'] = round(total_hours, 2)
-        employee_data['days_worked'] = days_worked
-        
-        # Calculate overtime (assuming 8 hours standard per day)
-        standard_hours = days_worked * 8
-        if total_hours > standard_hours:
-            employee_data['overtime_hours'] = round(total_hours - standard_hours, 2)
-        else:
-            employee_data['overtime_hours'] = 0
-    
     def match_with_database_employees(self):
         """Match processed attendance data with database employees"""
         if not self.processed_data:
             return {}
         
         # Import here to avoid circular imports
-        from models import Employee
+        from attendance_matching import EmployeeMatcher
         
+        matcher = EmployeeMatcher.load()
         matched_data = {}
+        self.employee_matches = {}
+        self.ambiguous_cards = {}
         
         for employee_key, attendance_data in self.processed_data.items():
             name = attendance_data['name']
             card_number = attendance_data['card_number']
             
-            # Try to find employee in database by name or card number
-            employee = None
-            
-            # First try exact name match
-            if name:
-                employee = Employee.query.filter(
-                    Employee.name.ilike(f"%{name}%")
-                ).filter_by(is_active=1).first()
-            
-            # If not found, try card number in employee_id field
-            if not employee and card_number:
-                employee = Employee.query.filter(
-                    Employee.employee_id == card_number
-                ).filter_by(is_active=1).first()
-            
+            sharing = matcher.sharing_card(card_number)
+            if sharing:
+                self.ambiguous_cards[card_number] = sharing
+                continue
+            employee = matcher.match(name, card_number)
             if employee:
+                self.employee_matches[employee_key] = employee.id
                 matched_data[employee.id] = {
                     'employee_id': employee.id,
                     'employee_name': employee.name,
                     'database_name': employee.name,
                     'attendance_name': name,
                     'card_number': card_number,
+                    'matched_by': employee.matched_by,
                     'days_worked': attendance_data['days_worked'],
                     'total_hours': attendance_data['total_hours'],
                     'overtime_hours': attendance_data['overtime_hours']
@@ -223,6 +392,7 @@ class AttendanceProcessor:
             'total_records': len(self.processed_data),
             'matched_employees': len(matched_data),
             'unmatched_count': len(self.processed_data) - len(matched_data),
+            'ambiguous_cards': self.ambiguous_cards,
             'attendance_data': matched_data,
             'raw_data': self.processed_data
         }
\ No newline at end of file
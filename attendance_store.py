@@ -0,0 +1,156 @@
+"""
+Attendance History Persistence
+Stores the daily summaries of a processed attendance export as
+AttendanceEmployee rows. Rows are streamed with COPY into a temporary
+staging table, then merged into attendance_employees on (employee_id, date),
+so importing an export again updates its days instead of duplicating them.
+"""
+
+import io
+from datetime import datetime, time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from database import db
+from models import AttendanceEmployee
+
+# Working day that late arrivals and early leaving are measured against
+SHIFT_START = time(8, 0)
+SHIFT_END = time(17, 0)
+
+STAGING_TABLE = 'attendance_employees_staging'
+
+# Columns that identify a day of attendance; everything else is overwritten on conflict
+CONFLICT_COLUMNS = ['employee_id', 'date']
+
+# Columns kept from the first import of a day
+INSERT_ONLY_COLUMNS = ['created_by', 'created_at']
+
+COPY_COLUMNS = [
+    'employee_id', 'date', 'status', 'hs', 'clock_in', 'clock_out', 'late', 'early_leaving',
+    'overtime', 'total_rest', 'created_by', 'created_at', 'updated_at',
+]
+
+MIDNIGHT = pd.Timestamp('1970-01-01')
+ZERO = pd.Timedelta(0)
+LAST_SECOND = pd.Timedelta(hours=23, minutes=59, seconds=59)
+
+
+def _offset(clock):
+    return pd.Timedelta(hours=clock.hour, minutes=clock.minute, seconds=clock.second)
+
+
+def _as_time(durations):
+    """Durations as the times of day the Time columns store, 00:00:00 when missing"""
+    durations = durations.fillna(ZERO).clip(lower=ZERO, upper=LAST_SECOND).dt.round('s')
+    return (MIDNIGHT + durations).dt.time
+
+
+def _clock(times):
+    """Times of day of timestamps, 00:00:00 when missing"""
+    return _as_time(times - times.dt.normalize())
+
+
+def daily_attendance_frame(processor, created_by=1):
+    """
+    One row of attendance_employees per matched employee and day
+
+    Args:
+        processor: AttendanceProcessor after get_attendance_summary(), whose
+            daily_hours and employee_matches are used
+        created_by: user recorded on the rows
+
+    Device users matched to the same employee are merged: the day spans
+    their earliest check-in and latest check-out.
+    """
+    if processor.daily_hours is None or not processor.employee_matches:
+        return pd.DataFrame(columns=COPY_COLUMNS)
+
+    daily = processor.daily_hours.reset_index()
+    daily['employee_id'] = daily['employee_key'].map(processor.employee_matches)
+    daily = daily[daily['employee_id'].notna()].astype({'employee_id': int})
+    daily = daily.groupby(['employee_id', 'day'], sort=False).agg(
+        first_in=('first_in', 'min'),
+        last_out=('last_out', 'max'),
+        punches=('punches', 'sum')
+    )
+    daily = processor._daily_hours(daily).reset_index()
+
+    worked = daily['worked']
+    hours = daily['hours']
+    span = (daily['last_out'] - daily['first_in']).where(worked)
+    late = daily['first_in'] - (daily['day'] + _offset(SHIFT_START))
+    early_leaving = (daily['day'] + _offset(SHIFT_END)) - daily['last_out']
+    overtime = pd.to_timedelta((hours - processor.STANDARD_DAILY_HOURS).clip(lower=0), unit='h')
+    status = np.select(
+        [hours < processor.STANDARD_DAILY_HOURS / 2, late > ZERO],
+        ['half_day', 'late'],
+        'present'
+    )
+
+    now = datetime.utcnow()
+    return pd.DataFrame({
+        'employee_id': daily['employee_id'],
+        'date': daily['day'].dt.date,
+        'status': status,
+        'hs': hours.round(2).astype(str),
+        'clock_in': _clock(daily['first_in']),
+        'clock_out': _clock(daily['last_out']),
+        'late': _as_time(late),
+        'early_leaving': _as_time(early_leaving),
+        'overtime': _as_time(overtime),
+        'total_rest': _as_time(span - pd.to_timedelta(hours, unit='h')),
+        'created_by': created_by,
+        'created_at': now,
+        'updated_at': now,
+    }, columns=COPY_COLUMNS)
+
+
+def store_daily_attendance(processor, created_by=1, commit=True):
+    """
+    Insert or update the daily attendance of a processed export
+
+    Returns:
+        int: number of employee days written
+
+    Either every day is written or, on any error, none are: the transaction
+    is rolled back and the exception re-raised.
+    """
+    frame = daily_attendance_frame(processor, created_by)
+    if frame.empty:
+        return 0
+
+    columns = ', '.join(COPY_COLUMNS)
+    table = AttendanceEmployee.__tablename__
+    updates = ', '.join(
+        f"{column} = EXCLUDED.{column}"
+        for column in COPY_COLUMNS if column not in CONFLICT_COLUMNS + INSERT_ONLY_COLUMNS
+    )
+    rows = io.StringIO()
+    frame.to_csv(rows, index=False, header=False)
+    rows.seek(0)
+
+    try:
+        # pg_temp: never a permanent table that happens to share the name
+        db.session.execute(text(f"DROP TABLE IF EXISTS pg_temp.{STAGING_TABLE}"))
+        db.session.execute(text(
+            f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        ))
+        # COPY goes through the DBAPI cursor of the session's connection, in its transaction
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", rows)
+        finally:
+            cursor.close()
+        db.session.execute(text(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+            f"ON CONFLICT ({', '.join(CONFLICT_COLUMNS)}) DO UPDATE SET {updates}"
+        ))
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(frame)
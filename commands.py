@@ -0,0 +1,317 @@
+"""
+Payroll Command-Line Interface
+Flask CLI commands running the batch payroll engine outside the web process,
+from cron or a shell, free of request timeouts and web-worker memory limits
+
+    flask payroll run --month 03/2026 [--branch Casablanca] [--workers 8] [--dry-run]
+    flask payroll scan-retirements [--window-days 60]
+    flask payroll diff 03/2026 [--previous 02/2026] [--threshold 100] [--output diff.json]
+    flask attendance ingest export.xls --month 03/2026 [--no-store] [--run-payroll]
+    flask db upgrade
+    flask jobs recover
+
+Progress is printed as the run goes; the exit status is 1 when any error
+was reported.
+"""
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from database import db
+from models import Branch, Employee
+from payroll_metrics import instrumented_run
+from payroll_parallel import PARTITION_STRATEGIES
+from payroll_ytd import normalize_salary_month
+
+payroll_cli = AppGroup('payroll', help='Payroll runs.')
+attendance_cli = AppGroup('attendance', help='Attendance imports.')
+db_cli = AppGroup('db', help='Database schema.')
+jobs_cli = AppGroup('jobs', help='Background jobs.')
+
+
+class ConsoleProgress:
+    """JobProgress-like reporter writing to stdout (errors to stderr)"""
+
+    def __init__(self, label):
+        self.label = label
+        self.total = 0
+        self.processed = 0
+        self.errors = []
+
+    def set_total(self, total):
+        self.total = total
+        click.echo(f"{self.label}: {total} employees")
+
+    def advance(self, count=1):
+        self.processed += count
+        percent = f" ({self.processed * 100 // self.total}%)" if self.total else ''
+        click.echo(f"{self.label}: {self.processed}/{self.total}{percent}")
+
+    def add_errors(self, errors):
+        self.errors.extend(errors)
+        for error in errors:
+            click.echo(f"{self.label}: {error}", err=True)
+
+    def add_error(self, error):
+        self.add_errors([error])
+
+
+def _check_month(salary_month, param_hint='--month'):
+    """The month as the stored 'MM/YYYY' label (YYYY-MM is accepted too)"""
+    salary_month = normalize_salary_month(salary_month)
+    if salary_month is None:
+        raise click.BadParameter('expected MM/YYYY', param_hint=param_hint)
+    return salary_month
+
+
+def _find_branch(branch):
+    """Branch id from an id or a name"""
+    if branch is None:
+        return None
+    found = db.session.get(Branch, int(branch)) if branch.isdigit() else \
+        Branch.query.filter(Branch.name == branch).first()
+    if found is None:
+        raise click.BadParameter(f"unknown branch {branch}", param_hint='--branch')
+    return found.id
+
+
+def run_batch(salary_month, progress, overtime_hours=None, branch_id=None, workers=1, partition_by='branch',
+              dry_run=False, skip_unchanged=False):
+    """
+    Calculate a month with the batch engine, in-process or across worker processes
+
+    Returns:
+        tuple: (number of payslips saved, list of errors)
+    """
+    if workers > 1:
+        from payroll_parallel import ParallelPayrollExecutor
+
+        executor = ParallelPayrollExecutor(salary_month, workers=workers, partition_by=partition_by)
+        report = executor.run(overtime_hours, branch_id=branch_id, progress=progress, dry_run=dry_run,
+                              skip_unchanged=skip_unchanged)
+        click.echo(f"{len(report.partitions)} partitions in {report.elapsed_seconds:.1f}s")
+        if report.failed_partitions:
+            click.echo(f"Partitions non enregistrées ({report.unsaved_employees} employés): "
+                       f"{', '.join(report.failed_partitions)}", err=True)
+        return report.saved, report.errors
+
+    from payroll_batch import BatchPayrollEngine, calculate_batch_payslips
+
+    employee_ids = None
+    if branch_id is not None:
+        employee_ids = [
+            employee_id for employee_id, in
+            db.session.query(Employee.id).filter(Employee.branch_id == branch_id, Employee.is_active == 1)
+        ]
+    if not dry_run:
+        return calculate_batch_payslips(salary_month, overtime_hours, employee_ids=employee_ids,
+                                        progress=progress, skip_unchanged=skip_unchanged)
+
+    engine = BatchPayrollEngine(salary_month, employee_ids)
+    try:
+        engine.load_inputs()
+        progress.set_total(len(engine.input_frame))
+        results = engine.calculate(overtime_hours)
+    except Exception as e:
+        progress.add_error(str(e))
+        return 0, progress.errors
+    progress.advance(len(results))
+    click.echo(f"Dry run: net payable {results['net_payble'].sum():.2f} for {len(results)} employees, nothing saved")
+    return 0, engine.errors
+
+
+def _scan_retirements(progress, window_days=None):
+    """
+    Record upcoming retirements, as payroll jobs do after each run
+
+    Returns:
+        list: the error, reported through progress, when the scan failed
+    """
+    from retirement_scanner import NOTIFICATION_WINDOW_DAYS, scan_retirements
+
+    try:
+        created = scan_retirements(window_days=window_days or NOTIFICATION_WINDOW_DAYS)
+    except Exception as e:
+        error = f"Erreur de détection des départs à la retraite: {str(e)}"
+        progress.add_error(error)
+        return [error]
+    click.echo(f"{created} retirement events created")
+    return []
+
+
+def _finish(saved, errors, run_metrics, dry_run=False):
+    """Print the outcome and exit with status 1 when the run reported errors"""
+    if run_metrics is not None:
+        click.echo(run_metrics.report())
+    if not dry_run:
+        click.echo(f"{saved} payslips saved")
+    if errors:
+        click.echo(f"{len(errors)} errors", err=True)
+        raise SystemExit(1)
+
+
+def _payroll_options(func):
+    """Options shared by the commands that run a payroll month"""
+    options = [
+        click.option('--workers', type=int, default=None,
+                     help='worker processes (default: the PAYROLL_WORKERS setting)'),
+        click.option('--partition-by', type=click.Choice(PARTITION_STRATEGIES), default=None,
+                     help='how employees are split across workers (default: PAYROLL_PARTITION_BY)'),
+        click.option('--skip-unchanged', is_flag=True, help='leave payslips whose inputs did not change'),
+        click.option('--metrics', is_flag=True, help='print step timings at the end of the run'),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+@payroll_cli.command('run')
+@click.option('--month', 'salary_month', required=True, help='salary month, MM/YYYY')
+@click.option('--branch', help='only the employees of this branch (id or name)')
+@click.option('--dry-run', is_flag=True, help='calculate without saving anything')
+@_payroll_options
+def run_payroll(salary_month, branch, dry_run, workers, partition_by, skip_unchanged, metrics):
+    """Calculate and save the payslips of a month."""
+    salary_month = _check_month(salary_month)
+    branch_id = _find_branch(branch)
+    workers = workers or current_app.config.get('PAYROLL_WORKERS', 1)
+    partition_by = partition_by or current_app.config.get('PAYROLL_PARTITION_BY', 'branch')
+
+    progress = ConsoleProgress('payroll')
+    with instrumented_run('payroll_cli', metrics, salary_month=salary_month, workers=workers,
+                          branch_id=branch_id) as run_metrics:
+        saved, errors = run_batch(salary_month, progress, branch_id=branch_id, workers=workers,
+                                  partition_by=partition_by, dry_run=dry_run, skip_unchanged=skip_unchanged)
+    if not dry_run:
+        errors = errors + _scan_retirements(progress)
+    _finish(saved, errors, run_metrics, dry_run)
+
+
+@payroll_cli.command('scan-retirements')
+@click.option('--window-days', type=int, default=None,
+              help='days ahead to look for retirements (default: 60)')
+def scan_retirements_command(window_days):
+    """Record the retirements of active employees within the notification window."""
+    if _scan_retirements(ConsoleProgress('retirements'), window_days):
+        raise SystemExit(1)
+
+
+@payroll_cli.command('diff')
+@click.argument('salary_month')
+@click.option('--previous', 'previous_month', help='month to compare with, MM/YYYY (default: the month before)')
+@click.option('--threshold', type=float, default=None,
+              help='report net pay changes of at least this amount (MAD, default: 100)')
+@click.option('--threshold-pct', type=float, default=None,
+              help='report net pay changes of at least this percentage (default: 10)')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              help='write the full diff as JSON to this file')
+def diff_payroll(salary_month, previous_month, threshold, threshold_pct, output):
+    """Compare the payslips of a month with those of the previous month."""
+    import json
+    from payroll_diff import DEFAULT_THRESHOLD, DEFAULT_THRESHOLD_PCT, diff_payroll_months
+
+    salary_month = _check_month(salary_month, 'SALARY_MONTH')
+    if previous_month:
+        previous_month = _check_month(previous_month, '--previous')
+    try:
+        diff = diff_payroll_months(
+            salary_month, previous_month,
+            DEFAULT_THRESHOLD if threshold is None else threshold,
+            DEFAULT_THRESHOLD_PCT if threshold_pct is None else threshold_pct
+        )
+    except Exception as e:
+        click.echo(f"Diff failed: {e}", err=True)
+        raise SystemExit(1)
+
+    summary = diff['summary']
+    click.echo(f"{diff['previous_month']} -> {diff['salary_month']}: "
+               f"{summary['previous_count']} -> {summary['current_count']} payslips, "
+               f"net {summary['net_total_previous']:.2f} -> {summary['net_total']:.2f} "
+               f"({summary['net_total_delta']:+.2f})")
+    click.echo(f"  added: {summary['added']}, removed: {summary['removed']}, "
+               f"changes above threshold: {summary['changed']}")
+    for change in diff['changes'][:20]:
+        click.echo(f"  {change['code'] or change['employee_id']} {change['name']}: "
+                   f"{change['net_payable_previous']:.2f} -> {change['net_payable']:.2f} ({change['delta']:+.2f})")
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(diff, file, indent=2, ensure_ascii=False)
+        click.echo(f"Diff written to {output}")
+
+
+@attendance_cli.command('ingest')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--month', 'salary_month', help='only the punches of this month, MM/YYYY')
+@click.option('--store/--no-store', default=True, help='save the daily attendance of matched employees')
+@click.option('--run-payroll', is_flag=True, help="calculate the month's payroll with the file's overtime")
+@_payroll_options
+def ingest_attendance(file, salary_month, store, run_payroll, workers, partition_by, skip_unchanged, metrics):
+    """Process a device attendance export, match it to employees and save their days."""
+    from attendance_cache import get_attendance_cache
+    from attendance_processor import AttendanceProcessor
+    from attendance_store import store_daily_attendance
+
+    if salary_month:
+        salary_month = _check_month(salary_month)
+    elif run_payroll:
+        raise click.UsageError('--run-payroll needs --month')
+
+    processor = AttendanceProcessor(file, cache=get_attendance_cache())
+    try:
+        summary = processor.get_attendance_summary(salary_month)
+    except ValueError as e:
+        click.echo(f"{file}: {e}", err=True)
+        raise SystemExit(1)
+    if processor.from_cache:
+        click.echo(f"{file} loaded from the attendance cache")
+    if not summary['total_records']:
+        click.echo(f"No attendance records read from {file}", err=True)
+        raise SystemExit(1)
+
+    click.echo(f"{summary['total_records']} attendance employees, {summary['matched_employees']} matched, "
+               f"{summary['unmatched_count']} unmatched")
+    matched_names = {data['attendance_name'] for data in summary['attendance_data'].values()}
+    unmatched = [data['name'] for data in summary['raw_data'].values() if data['name'] not in matched_names]
+    for name in unmatched[:20]:
+        click.echo(f"  unmatched: {name}")
+    for card_number, names in summary['ambiguous_cards'].items():
+        click.echo(f"  card {card_number} shared by {', '.join(names)}, not matched")
+    if store:
+        click.echo(f"{store_daily_attendance(processor)} attendance days saved")
+    if not run_payroll:
+        return
+
+    overtime_hours = {
+        employee_id: employee_attendance.get('overtime_hours', 0)
+        for employee_id, employee_attendance in summary['attendance_data'].items()
+    }
+    workers = workers or current_app.config.get('PAYROLL_WORKERS', 1)
+    partition_by = partition_by or current_app.config.get('PAYROLL_PARTITION_BY', 'branch')
+    progress = ConsoleProgress('payroll')
+    with instrumented_run('attendance_cli', metrics, salary_month=salary_month, workers=workers) as run_metrics:
+        saved, errors = run_batch(salary_month, progress, overtime_hours, workers=workers,
+                                  partition_by=partition_by, skip_unchanged=skip_unchanged)
+    _finish(saved, errors + _scan_retirements(progress), run_metrics)
+
+
+@db_cli.command('upgrade')
+def upgrade_database():
+    """Create the missing tables and apply the schema upgrades."""
+    from schema_upgrades import prepare_database
+
+    prepare_database()
+    click.echo("Database up to date")
+
+
+@jobs_cli.command('recover')
+def recover_jobs():
+    """Fail the jobs a stopped server left running and run the ones it left queued."""
+    from job_runner import recover_stale_jobs, run_job
+
+    failed, queued = recover_stale_jobs(requeue=False)
+    click.echo(f"{failed} interrupted jobs marked failed")
+    # Run here, in the foreground: a pool of this process would die with it
+    for job_id in queued:
+        click.echo(f"Running queued job {job_id}")
+        run_job(job_id)
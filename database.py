@@ -0,0 +1,63 @@
+"""
+Database and Settings
+The SQLAlchemy extension and the settings read from the environment, shared
+by the web application (app.py) and the minimal app of payroll worker
+processes, which need the database but none of the routes, CLI commands or
+startup work of the web application.
+"""
+
+import os
+import tempfile
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+def configure_app(app):
+    """Apply the database and payroll settings to an app and initialize db on it"""
+    # configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "postgresql://localhost/hr_management")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {"client_encoding": "utf8"}
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Payroll batch settings
+    app.config['PAYSLIP_UPSERT_CHUNK_SIZE'] = int(os.environ.get('PAYSLIP_UPSERT_CHUNK_SIZE', 1000))
+    app.config['BACKGROUND_JOB_WORKERS'] = int(os.environ.get('BACKGROUND_JOB_WORKERS', 1))
+    # Queued/running jobs without a heartbeat for this long were left by a stopped server
+    app.config['BACKGROUND_JOB_STALE_SECONDS'] = int(os.environ.get('BACKGROUND_JOB_STALE_SECONDS', 300))
+    app.config['PAYROLL_WORKERS'] = int(os.environ.get('PAYROLL_WORKERS', 1))
+    app.config['PAYROLL_PARTITION_BY'] = os.environ.get('PAYROLL_PARTITION_BY', 'branch')
+    # Step timings of payroll runs (see payroll_metrics); jobs can also ask for them
+    app.config['PAYROLL_METRICS'] = os.environ.get('PAYROLL_METRICS', '0') == '1'
+    # Parsed attendance exports kept on disk by content (see attendance_cache); 0 MB disables it
+    app.config['ATTENDANCE_CACHE_DIR'] = os.environ.get(
+        'ATTENDANCE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'attendance_cache'))
+    app.config['ATTENDANCE_CACHE_MAX_MB'] = int(os.environ.get('ATTENDANCE_CACHE_MAX_MB', 512))
+
+    # initialize the app with the extension
+    db.init_app(app)
+
+
+def create_worker_app():
+    """
+    App of a payroll worker process: settings and db only
+
+    Models are imported so the mappers are configured; nothing is written
+    to the database.
+    """
+    app = Flask(__name__)
+    configure_app(app)
+    import models  # noqa: F401
+    return app
@@ -0,0 +1,248 @@
+"""
+Background Job Runner
+Runs long payroll and attendance batches outside the HTTP request.
+Job state lives in the background_jobs table; an in-process thread pool
+does the work, so no external broker is needed. Running jobs write a
+heartbeat, so jobs left behind by a stopped server are recovered at startup.
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from app import app, db
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# job_type -> handler(params, progress) returning a JSON-serialisable summary
+JOB_HANDLERS = {}
+
+# How often a running job touches updated_at (see recover_stale_jobs)
+HEARTBEAT_SECONDS = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_handler(job_type):
+    """Register a function as the handler for a job type"""
+    def register(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('BACKGROUND_JOB_WORKERS', 1),
+                thread_name_prefix='background-job'
+            )
+        return _executor
+
+
+class JobProgress:
+    """
+    Progress reporter handed to job handlers
+
+    Progress is written on its own connection so it is visible to the
+    progress endpoint while the handler's own transaction is still open.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.total = 0
+        self.processed = 0
+        self.errors = []
+        # Final status a handler can report instead of 'completed' ('partial', 'failed')
+        self.status = None
+
+    def set_total(self, total):
+        self.total = total
+        self.flush()
+
+    def advance(self, count=1):
+        self.processed += count
+        self.flush()
+
+    def add_errors(self, errors):
+        self.errors.extend(errors)
+        self.flush()
+
+    def add_error(self, error):
+        self.add_errors([error])
+
+    def _values(self):
+        return {
+            'total': self.total,
+            'processed': self.processed,
+            'error_count': len(self.errors),
+            'errors': json.dumps(self.errors),
+            'updated_at': datetime.utcnow(),
+        }
+
+    def flush(self, **extra):
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(BackgroundJob.__table__)
+                .where(BackgroundJob.__table__.c.id == self.job_id)
+                .values(**self._values(), **extra)
+            )
+
+
+class _Heartbeat:
+    """Touches a running job's updated_at until the handler returns"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, name=f'background-job-{job_id}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _beat(self):
+        table = BackgroundJob.__table__
+        with app.app_context():
+            while not self.stopped.wait(HEARTBEAT_SECONDS):
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(
+                            update(table).where(table.c.id == self.job_id).values(updated_at=datetime.utcnow())
+                        )
+                except Exception:
+                    logger.warning(f"Heartbeat of background job {self.job_id} failed", exc_info=True)
+
+
+def enqueue_job(job_type, params=None):
+    """
+    Record a queued job and hand it to the worker pool
+
+    Returns:
+        BackgroundJob: the queued job, whose id can be polled for progress
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    job = BackgroundJob(
+        job_type=job_type,
+        status='queued',
+        params=json.dumps(params or {}),
+        created_by=1  # This should come from current user
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _get_executor().submit(run_job, job.id)
+    return job
+
+
+def run_job(job_id):
+    """Claim a queued job and run its handler inside an app context"""
+    with app.app_context():
+        try:
+            # Only one worker may move a job out of the queue
+            claimed = db.session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = db.session.get(BackgroundJob, job_id)
+            handler = JOB_HANDLERS[job.job_type]
+            params = json.loads(job.params or '{}')
+            progress = JobProgress(job_id)
+
+            try:
+                with _Heartbeat(job_id):
+                    result = handler(params, progress)
+                status = progress.status or 'completed'
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f"Background job {job_id} failed")
+                progress.errors.append(f"Erreur: {str(e)}")
+                result = None
+                status = 'failed'
+
+            progress.flush(
+                status=status,
+                result=json.dumps(result, default=str),
+                finished_at=datetime.utcnow()
+            )
+        finally:
+            db.session.remove()
+
+
+def recover_stale_jobs(requeue=True):
+    """
+    Settle the jobs a stopped server left queued or running
+
+    A job is stale when its updated_at is older than
+    BACKGROUND_JOB_STALE_SECONDS: live jobs write a heartbeat more often.
+    Stale running jobs are marked failed rather than run again, since a
+    batch may have been half-saved. With requeue, stale queued jobs are
+    handed to this process's workers (claiming keeps them from running
+    twice); only the web server should do that, as the pool dies with the
+    process.
+
+    Returns:
+        tuple: (number of jobs failed, ids of the stale queued jobs)
+    """
+    table = BackgroundJob.__table__
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=app.config['BACKGROUND_JOB_STALE_SECONDS'])
+    stale = func.coalesce(table.c.updated_at, table.c.created_at) < cutoff
+
+    failed = 0
+    with db.engine.begin() as connection:
+        running = connection.execute(
+            select(table.c.id, table.c.errors).where(table.c.status == 'running', stale)
+        ).all()
+        for job_id, errors in running:
+            errors = json.loads(errors or '[]') + ["Erreur: travail interrompu par l'arrêt du serveur"]
+            # Still stale: a heartbeat since the select means the job is alive
+            failed += connection.execute(
+                update(table)
+                .where(table.c.id == job_id, table.c.status == 'running', stale)
+                .values(status='failed', errors=json.dumps(errors), error_count=len(errors),
+                        finished_at=now, updated_at=now)
+            ).rowcount
+        queued = connection.execute(
+            select(table.c.id).where(table.c.status == 'queued', stale).order_by(table.c.id)
+        ).scalars().all()
+
+    if requeue:
+        for job_id in queued:
+            _get_executor().submit(run_job, job_id)
+    if failed or queued:
+        logger.warning(f"Background jobs recovered: {failed} failed, {len(queued)} stale queued")
+    return failed, queued
+
+
+def job_to_dict(job):
+    """Progress view of a job, as returned by the JSON endpoint"""
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'total': job.total or 0,
+        'processed': job.processed or 0,
+        'error_count': job.error_count or 0,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -1,4 +1,11 @@
-from app import app
+import os
+from app import app, start_web_server
 
 if __name__ == "__main__":
+    # Development server: with the reloader, only the child process serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_web_server()
     app.run(host="0.0.0.0", port=5000, debug=True)
+else:
+    # gunicorn main:app, once per worker
+    start_web_server()
@@ -1,4 +1,4 @@
-from app import db
+from database import db
 from datetime import datetime, date
 from sqlalchemy import func
 
@@ -121,6 +121,9 @@ class Employee(db.Model):
 
 class AttendanceEmployee(db.Model):
     __tablename__ = 'attendance_employees'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'date', name='uq_attendance_employees_employee_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
@@ -267,11 +270,17 @@ class EmployeeTraining(db.Model):
 
 class PaySlip(db.Model):
     __tablename__ = 'pay_slips'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'salary_month', name='uq_pay_slips_employee_month'),
+        db.Index('ix_pay_slips_employee_period', 'employee_id', 'period'),
+        db.Index('ix_pay_slips_period', 'period'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
     net_payble = db.Column(db.Numeric(15, 2), nullable=False)  # Keep original field name
     salary_month = db.Column(db.String(191), nullable=False)
+    period = db.Column(db.Date)  # first day of salary_month, for range scans (see payroll_ytd)
     status = db.Column(db.Integer, default=0)  # Keep original field type
     basic_salary = db.Column(db.Numeric(15, 2), nullable=False)
     allowance = db.Column(db.Numeric(15, 2), default=0)
@@ -280,13 +289,78 @@ class PaySlip(db.Model):
     saturation_deduction = db.Column(db.Numeric(15, 2), default=0)
     other_payment = db.Column(db.Numeric(15, 2), default=0)
     overtime = db.Column(db.Numeric(15, 2), default=0)
+    input_fingerprint = db.Column(db.String(64))  # SHA-256 of calculation inputs, see payroll_fingerprint
     created_by = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     employee = db.relationship('Employee', backref='pay_slips')
+    lines = db.relationship('PaySlipLine', backref='payslip', cascade='all, delete-orphan',
+                            order_by='PaySlipLine.position')
 
+class PaySlipLine(db.Model):
+    """One component of a payslip's breakdown (see payslip_lines for the codes)"""
+    __tablename__ = 'pay_slip_lines'
+    __table_args__ = (
+        db.UniqueConstraint('payslip_id', 'component', name='uq_pay_slip_lines_payslip_component'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    payslip_id = db.Column(db.Integer, db.ForeignKey('pay_slips.id', ondelete='CASCADE'), nullable=False)
+    component = db.Column(db.String(50), nullable=False, index=True)  # cnss, amo, net_ir, ...
+    position = db.Column(db.Integer, nullable=False, default=0)  # display order on the payslip
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    rate = db.Column(db.Numeric(8, 4))  # contribution or bonus rate, when the line has one
+    quantity = db.Column(db.Numeric(10, 2))  # days or hours, when the line has them
+
+
+
+class PayrollAggregate(db.Model):
+    """Payroll totals of one month, branch and department (see payroll_aggregates)"""
+    __tablename__ = 'payroll_aggregates'
+    __table_args__ = (
+        db.UniqueConstraint('salary_month', 'branch_id', 'department_id', name='uq_payroll_aggregates_group'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    salary_month = db.Column(db.String(191), nullable=False)
+    branch_id = db.Column(db.Integer)
+    department_id = db.Column(db.Integer)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+    basic_salary = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    gross_salary = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    cnss = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    amo = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    cimr = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_ir = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    advances = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_payable = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class PayrollYtd(db.Model):
+    """Year-to-date payroll totals of one employee (see payroll_ytd)"""
+    __tablename__ = 'payroll_ytd'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'year', name='uq_payroll_ytd_employee_year'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False, index=True)
+    months = db.Column(db.Integer, nullable=False, default=0)
+    last_period = db.Column(db.Date)
+    basic_salary = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    gross_salary = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    cnss = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    amo = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    cimr = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    professional_expenses = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_taxable_salary = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_ir = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_payable = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    employee = db.relationship('Employee', backref='payroll_ytd')
 
 class PayrollConfiguration(db.Model):
     __tablename__ = 'payroll_configurations'
@@ -301,6 +375,9 @@ class PayrollConfiguration(db.Model):
 
 class RetirementEvent(db.Model):
     __tablename__ = 'retirement_events'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'retirement_date', name='uq_retirement_events_employee_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
@@ -326,3 +403,21 @@ class Advance(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     employee = db.relationship('Employee', backref='advances')
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # payroll_batch, payroll_batch_attendance
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, partial, failed
+    params = db.Column(db.Text)  # JSON string of job parameters
+    total = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text)  # JSON list of error messages
+    result = db.Column(db.Text)  # JSON summary written when the job finishes
+    created_by = db.Column(db.Integer, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
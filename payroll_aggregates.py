@@ -0,0 +1,118 @@
+"""
+Payroll Aggregates
+Monthly payroll totals per (salary_month, branch, department), kept in
+payroll_aggregates so dashboards read a handful of rows instead of
+scanning pay_slips
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import delete, distinct, func, insert, select
+from database import db
+from models import Employee, PayrollAggregate, PaySlip
+from payslip_lines import line_totals
+
+ZERO = Decimal('0')
+
+# Aggregate column -> payslip line component summed into it (see payslip_lines)
+LINE_TOTALS = {
+    'gross_salary': 'gross_salary',
+    'cnss': 'cnss',
+    'amo': 'amo',
+    'cimr': 'cimr',
+    'net_ir': 'net_ir',
+    'advances': 'advances',
+}
+
+# Every amount column of PayrollAggregate
+TOTAL_COLUMNS = ['basic_salary'] + list(LINE_TOTALS) + ['net_payable']
+
+
+def refresh_payroll_aggregates(salary_month, commit=True):
+    """
+    Recompute the aggregates of a month
+
+    Args:
+        commit: commit once the rows are replaced; batch runs pass False to
+            update the aggregates in the transaction that writes the payslips
+
+    Returns:
+        int: number of aggregate rows written
+
+    Employees are grouped by their current branch and department, so every
+    row of the month is replaced: an employee who moved since the last
+    refresh leaves their old group too. Payslips saved before line items
+    existed count in headcount, basic salary and net payable only.
+    """
+    group_columns = (Employee.branch_id, Employee.department_id)
+    cleared = delete(PayrollAggregate).where(PayrollAggregate.salary_month == salary_month)
+
+    lines = line_totals(LINE_TOTALS, PaySlip.salary_month == salary_month)
+    totals = select(
+        PaySlip.salary_month,
+        *group_columns,
+        func.count(distinct(PaySlip.id)),
+        func.coalesce(func.sum(PaySlip.basic_salary), 0),
+        *[func.coalesce(func.sum(getattr(lines.c, column)), 0) for column in LINE_TOTALS],
+        func.coalesce(func.sum(PaySlip.net_payble), 0),
+        func.now(),
+    ).select_from(PaySlip) \
+        .join(Employee, PaySlip.employee_id == Employee.id) \
+        .outerjoin(lines, lines.c.payslip_id == PaySlip.id) \
+        .where(PaySlip.salary_month == salary_month) \
+        .group_by(PaySlip.salary_month, *group_columns)
+
+    try:
+        db.session.execute(cleared)
+        written = db.session.execute(
+            insert(PayrollAggregate).from_select(
+                ['salary_month', 'branch_id', 'department_id', 'headcount'] + TOTAL_COLUMNS + ['updated_at'],
+                totals
+            )
+        ).rowcount
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return written
+
+
+def _sum_rows(rows):
+    totals = {'headcount': 0, **{column: ZERO for column in TOTAL_COLUMNS}}
+    for row in rows:
+        totals['headcount'] += row.headcount
+        for column in TOTAL_COLUMNS:
+            totals[column] += getattr(row, column) or ZERO
+    return totals
+
+
+def month_totals(salary_month):
+    """Company totals of a month"""
+    return _sum_rows(PayrollAggregate.query.filter_by(salary_month=salary_month).all())
+
+
+def branch_totals(salary_month):
+    """Totals of a month per branch id, summed over its departments"""
+    by_branch = defaultdict(list)
+    for row in PayrollAggregate.query.filter_by(salary_month=salary_month).all():
+        by_branch[row.branch_id].append(row)
+    return {branch_id: _sum_rows(rows) for branch_id, rows in by_branch.items()}
+
+
+def _month_key(salary_month):
+    """'MM/YYYY' -> (year, month), for chronological ordering; other labels sort first"""
+    try:
+        month, year = salary_month.split('/')
+        return int(year), int(month)
+    except ValueError:
+        return 0, 0
+
+
+def monthly_trend(months=12):
+    """Company totals of the latest `months` months, oldest first"""
+    by_month = defaultdict(list)
+    for row in PayrollAggregate.query.all():
+        by_month[row.salary_month].append(row)
+    latest = sorted(by_month, key=_month_key)[-months:]
+    return [{'salary_month': salary_month, **_sum_rows(by_month[salary_month])} for salary_month in latest]
@@ -0,0 +1,349 @@
+"""
+Vectorized Batch Payroll Engine
+Calculates payslips for the whole workforce in a single pandas/NumPy pass:
+the simple payslip pipeline of payroll_kernel.SimplePayrollKernel run on
+columns, producing the same amounts as the per-employee calculator
+"""
+
+from datetime import date
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from database import db
+from payroll_aggregates import refresh_payroll_aggregates
+from payroll_fingerprint import payslip_fingerprint
+from payroll_kernel import SimplePayrollKernel
+from payroll_loader import PayrollInputLoader
+from payroll_metrics import timed
+from payroll_pipeline import ARRAYS, DECIMAL, near_half_cent, round_half_up
+from payroll_ytd import refresh_ytd_for_month, salary_month_period
+from payslip_lines import build_lines
+from payslip_store import bulk_upsert_payslips
+
+
+class BatchPayrollEngine:
+    """
+    Whole-company payroll engine using columnar arrays instead of one
+    calculator instance per employee
+    """
+
+    # Columns written to PaySlip, in the layout used by SimpleMoroccanPayrollCalculator
+    PAYSLIP_COLUMNS = [
+        'basic_salary', 'allowance', 'commission', 'overtime',
+        'other_payment', 'loan', 'saturation_deduction', 'net_payble',
+    ]
+
+    # Payslip line component -> result column (see payslip_lines)
+    LINE_COLUMNS = {
+        'basic_salary': 'salary',
+        'overtime': 'overtime_amount',
+        'seniority_bonus': 'seniority_bonus',
+        'leave_allowance': 'leave_allowance',
+        'gross_salary': 'gross_salary',
+        'cnss': 'cnss',
+        'amo': 'amo',
+        'cimr': 'cimr',
+        'professional_expenses': 'professional_expenses',
+        'net_taxable_salary': 'net_taxable_salary',
+        'gross_ir': 'gross_ir',
+        'family_allowance': 'family_allowance',
+        'net_ir': 'net_ir',
+        'advances': 'advances',
+        'total_deductions': 'total_deductions',
+        'net_salary': 'net_salary',
+        'net_payable': 'net_payable',
+    }
+
+    # Pipeline outputs kept on the results frame
+    RESULT_COLUMNS = [
+        'seniority_bonus', 'overtime_amount', 'gross_salary', 'cnss', 'amo', 'cimr',
+        'professional_expenses', 'net_taxable_salary', 'gross_ir', 'net_ir', 'family_allowance',
+        'total_deductions', 'net_salary', 'net_payable',
+    ]
+
+    def __init__(self, salary_month, employee_ids=None, inputs=None, rates=None, tax_table=None):
+        self.salary_month = salary_month
+        self.employee_ids = employee_ids
+        # PayrollRates snapshot; taken from the loaded inputs when not supplied
+        self.rates = rates
+        self.tax_table = tax_table or SimplePayrollKernel.TAX_TABLE
+        self.kernel = None
+        # Preloaded PayrollInputs; loaded on demand when not supplied
+        self.inputs = inputs
+        self.input_frame = None
+        self.results = None
+        self.errors = []
+        self.skipped = 0
+
+    def load_inputs(self):
+        """Build the input columns from prefetched employees and advances"""
+        if self.inputs is None:
+            with timed('batch.load_inputs') as timing:
+                self.inputs = PayrollInputLoader(self.salary_month, self.employee_ids, rates=self.rates).load()
+                timing.rows = len(self.inputs.employees)
+        self._build_kernel()
+
+        employees = list(self.inputs.employees.values())
+        records = [self.inputs.get_payroll_input(employee.id) for employee in employees]
+        frame = pd.DataFrame({
+            'employee_id': [record.employee_id for record in records],
+            'name': [employee.name for employee in employees],
+            'branch_id': [employee.branch_id for employee in employees],
+            'salary': [float(record.salary) for record in records],
+            'company_doj': [record.company_doj for record in records],
+            'marital_status': [record.marital_status for record in records],
+            'advances': [float(record.advances) for record in records],
+        })
+
+        self.input_frame = frame
+        return frame
+
+    def _build_kernel(self):
+        if self.rates is None:
+            self.rates = self.inputs.rates
+        self.kernel = SimplePayrollKernel(self.rates, self.tax_table)
+
+    def calculate(self, overtime_hours=None, leave_allowance=None):
+        """
+        Calculate all payslips at once
+
+        Args:
+            overtime_hours: dict of employee id -> overtime hours
+            leave_allowance: dict of employee id -> leave allowance amount
+
+        Returns:
+            DataFrame: one row per employee with unrounded and PaySlip amounts
+        """
+        if self.input_frame is None:
+            self.load_inputs()
+        elif self.kernel is None:
+            # Input frame shared between engines (see payroll_simulation)
+            self._build_kernel()
+
+        frame = self.input_frame.copy()
+        overtime_hours = overtime_hours or {}
+        leave_allowance = leave_allowance or {}
+        frame['overtime_hours'] = frame['employee_id'].map(overtime_hours).fillna(0).astype(float)
+        frame['leave_allowance'] = frame['employee_id'].map(leave_allowance).fillna(0).astype(float)
+
+        # Simple payslip pipeline, run once on whole columns
+        basic_salary = frame['salary'].to_numpy()
+        years_of_service = self._years_of_service(frame['company_doj'])
+        advances = frame['advances'].to_numpy()
+        leave = frame['leave_allowance'].to_numpy()
+        with timed('batch.calculate', rows=len(frame)):
+            values = self.kernel.PIPELINE.run({
+                'basic_salary': basic_salary,
+                'years_of_service': years_of_service,
+                'overtime_hours': frame['overtime_hours'].to_numpy(),
+                'leave_allowance': leave,
+                'is_married': (frame['marital_status'] == 'Marié').to_numpy(),
+                'number_of_children': 0,
+                'advances': advances,
+            }, self.kernel, ARRAYS)
+
+        frame['years_of_service'] = years_of_service
+        for column in self.RESULT_COLUMNS:
+            frame[column] = values[column]
+        seniority_bonus = values['seniority_bonus']
+        overtime_amount = values['overtime_amount']
+        family_allowance = values['family_allowance']
+        total_deductions = values['total_deductions']
+        net_payable = values['net_payable']
+
+        # PaySlip layout, rounded the way the Numeric(15, 2) columns store it
+        frame['basic_salary'] = round_half_up(basic_salary)
+        frame['allowance'] = round_half_up(seniority_bonus + leave)
+        frame['commission'] = 0.0
+        frame['overtime'] = round_half_up(overtime_amount)
+        frame['other_payment'] = round_half_up(family_allowance)
+        frame['loan'] = round_half_up(advances)
+        frame['saturation_deduction'] = round_half_up(total_deductions - advances)
+        frame['net_payble'] = round_half_up(net_payable)
+        unrounded = [values[column] for column in self.RESULT_COLUMNS]
+        self._recalculate_ties(frame, unrounded + [seniority_bonus + leave, total_deductions - advances])
+
+        with timed('batch.fingerprints', rows=len(frame)):
+            frame['input_fingerprint'] = [
+                payslip_fingerprint(salary, doj, marital_status, advance_total, overtime, leave_amount,
+                                    years, self.rates.version)
+                for salary, doj, marital_status, advance_total, overtime, leave_amount, years in zip(
+                    frame['salary'], frame['company_doj'], frame['marital_status'], frame['advances'],
+                    frame['overtime_hours'], frame['leave_allowance'], years_of_service
+                )
+            ]
+
+        self.results = frame
+        return frame
+
+    def _recalculate_ties(self, frame, amounts):
+        """
+        Recalculate with the Decimal kernel the rows with an amount near a half-cent tie
+
+        Float rounding cannot tell which side of a tie the Decimal formulas
+        land on: a 3306 salary with 21.01 overtime hours is exactly 454.575,
+        but 454.57499... in Decimal, stored as 454.57. Those rows take the
+        Decimal amounts, rounded to cents.
+
+        Returns:
+            int: number of rows recalculated
+        """
+        ties = np.zeros(len(frame), dtype=bool)
+        for amount in amounts:
+            ties |= near_half_cent(np.asarray(amount, dtype=float))
+        if not ties.any():
+            return 0
+
+        today = date.today()
+        rows = frame.index[ties]
+        results = [
+            self.kernel.calculate(self.inputs.get_payroll_input(
+                int(employee_id), overtime_hours=hours, leave_allowance=leave_amount, as_of=today
+            ))
+            for employee_id, hours, leave_amount in zip(
+                frame.loc[rows, 'employee_id'], frame.loc[rows, 'overtime_hours'], frame.loc[rows, 'leave_allowance']
+            )
+        ]
+        # Unrounded columns take the rounded amounts too, so the payslip lines match
+        for column in self.RESULT_COLUMNS:
+            frame.loc[rows, column] = [float(DECIMAL.quantize(getattr(result, column))) for result in results]
+        for column in self.PAYSLIP_COLUMNS:
+            frame.loc[rows, column] = [float(DECIMAL.quantize(result.payslip_fields()[column])) for result in results]
+        return len(results)
+
+    def _years_of_service(self, company_doj):
+        """Completed years of service as of today, -1 when the hire date is unknown"""
+        today = date.today()
+        doj = pd.to_datetime(company_doj, errors='coerce')
+        years = today.year - doj.dt.year
+        before_anniversary = (doj.dt.month > today.month) | \
+            ((doj.dt.month == today.month) & (doj.dt.day > today.day))
+        years = years - before_anniversary.astype(int)
+        return years.fillna(-1).astype(int).to_numpy()
+
+    def iter_payslip_data(self):
+        """Yield (employee_id, payslip_data) with Decimal amounts ready for PaySlip"""
+        if self.results is None:
+            raise ValueError("No payroll results calculated")
+
+        columns = ['employee_id', 'input_fingerprint'] + self.PAYSLIP_COLUMNS
+        for row in self.results[columns].itertuples(index=False):
+            payslip_data = {
+                column: Decimal(f"{getattr(row, column):.2f}")
+                for column in self.PAYSLIP_COLUMNS
+            }
+            payslip_data['input_fingerprint'] = row.input_fingerprint
+            yield int(row.employee_id), payslip_data
+
+    def iter_payslip_lines(self):
+        """Yield (employee_id, payslip lines) with amounts rounded to cents"""
+        if self.results is None:
+            raise ValueError("No payroll results calculated")
+
+        codes = list(self.LINE_COLUMNS)
+        amounts = np.column_stack([
+            round_half_up(self.results[column].to_numpy(dtype=float)) for column in self.LINE_COLUMNS.values()
+        ])
+        rates = {'cnss': self.rates.cnss_rate, 'amo': self.rates.amo_rate, 'cimr': self.rates.cimr_rate}
+        for employee_id, hours, years, row in zip(
+            self.results['employee_id'], self.results['overtime_hours'],
+            self.results['years_of_service'], amounts
+        ):
+            values = {code: Decimal(f"{amount:.2f}") for code, amount in zip(codes, row)}
+            values['overtime'] = (values['overtime'], None, hours)
+            values['seniority_bonus'] = (values['seniority_bonus'], None, years if years >= 0 else None)
+            for code, rate in rates.items():
+                values[code] = (values[code], rate, None)
+            yield int(employee_id), build_lines(values)
+
+    def _is_unchanged(self, employee_id, fingerprint):
+        payslip = self.inputs.get_payslip(employee_id)
+        return payslip is not None and payslip.input_fingerprint == fingerprint
+
+    def save_payslips(self, chunk_size=None, on_chunk=None, skip_unchanged=False, refresh_aggregates=True):
+        """
+        Upsert every PaySlip of the month, with its lines, in one transaction
+
+        With skip_unchanged, employees whose stored input fingerprint matches
+        the current inputs are left untouched and counted in self.skipped.
+        With refresh_aggregates, the month's payroll aggregates and the YTD
+        ledger of the engine's employees are recomputed in the same transaction.
+        """
+        rows = []
+        self.skipped = 0
+        period = salary_month_period(self.salary_month)
+        for employee_id, payslip_data in self.iter_payslip_data():
+            if skip_unchanged and self._is_unchanged(employee_id, payslip_data['input_fingerprint']):
+                self.skipped += 1
+                continue
+            payslip_data.update({
+                'employee_id': employee_id,
+                'salary_month': self.salary_month,
+                'period': period,
+                'status': 1,  # Mark as calculated
+            })
+            rows.append(payslip_data)
+
+        if on_chunk and self.skipped:
+            on_chunk(self.skipped)
+
+        saved_ids = {row['employee_id'] for row in rows}
+        with timed('batch.build_lines', rows=len(rows)):
+            lines = {
+                employee_id: employee_lines
+                for employee_id, employee_lines in self.iter_payslip_lines() if employee_id in saved_ids
+            }
+
+        try:
+            with timed('batch.upsert_payslips') as timing:
+                saved = bulk_upsert_payslips(rows, chunk_size, commit=not refresh_aggregates,
+                                             on_chunk=on_chunk, lines=lines)
+                timing.rows = saved
+            if refresh_aggregates:
+                with timed('batch.refresh_aggregates') as timing:
+                    timing.rows = refresh_payroll_aggregates(self.salary_month, commit=False)
+                with timed('batch.refresh_ytd') as timing:
+                    timing.rows = refresh_ytd_for_month(self.salary_month, self.employee_ids, commit=False)
+                with timed('batch.commit'):
+                    db.session.commit()
+            return saved
+        except Exception as e:
+            db.session.rollback()
+            self.errors.append(f"Erreur d'enregistrement: {str(e)}")
+            return 0
+
+
+def calculate_batch_payslips(salary_month, overtime_hours=None, leave_allowance=None, employee_ids=None,
+                             inputs=None, progress=None, rates=None, skip_unchanged=False,
+                             refresh_aggregates=True):
+    """
+    Convenience function to calculate and save a whole month of payslips
+
+    Args:
+        progress: optional JobProgress-like object (set_total/advance/add_errors)
+        skip_unchanged: leave payslips whose input fingerprint did not change
+        refresh_aggregates: update payroll_aggregates and the YTD ledger when the payslips commit
+
+    Returns:
+        tuple: (number of payslips saved, list of errors)
+    """
+    engine = BatchPayrollEngine(salary_month, employee_ids, inputs, rates)
+    try:
+        engine.load_inputs()
+        if progress:
+            progress.set_total(len(engine.input_frame))
+        engine.calculate(overtime_hours, leave_allowance)
+    except Exception as e:
+        errors = [str(e)]
+        if progress:
+            progress.add_errors(errors)
+        return 0, errors
+
+    saved = engine.save_payslips(
+        on_chunk=progress.advance if progress else None,
+        skip_unchanged=skip_unchanged,
+        refresh_aggregates=refresh_aggregates
+    )
+    if progress and engine.errors:
+        progress.add_errors(engine.errors)
+    return saved, engine.errors
@@ -0,0 +1,396 @@
+"""
+Payroll Benchmark
+Seeds a synthetic workforce (employees, advances, attendance punches) and times
+the payroll calculators and batch routes, writing the results as JSON.
+
+Point DATABASE_URL at a scratch database, then:
+
+    python payroll_benchmark.py --sizes 1000 10000 100000 --output benchmark.json
+
+Synthetic rows are tagged (employee_id 'BENCH-...', branch 'Benchmark') and
+removed after each size unless --keep is given; cleanup only touches those
+employees, their branch and the jobs the benchmark started. The batch route
+calculates every active employee, so it is skipped when the database holds
+real employees.
+"""
+
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta
+from sqlalchemy import event, insert, or_
+from app import app, db
+from models import (
+    User, Branch, Department, Employee, Advance, AttendanceEmployee, PaySlip, BackgroundJob,
+    PayrollAggregate, PayrollYtd
+)
+
+BENCH_PREFIX = 'BENCH-'
+BENCH_BRANCH = 'Benchmark'
+BENCH_EMAIL = 'benchmark@payroll.local'
+INSERT_CHUNK_SIZE = 5000
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_SAMPLE = 1000
+DEFAULT_MONTH = '12/2099'  # Never a real payroll month; its payslips are deleted afterwards
+
+
+class SyntheticWorkforce:
+    """
+    Generates employees with realistic distributions
+
+    Salaries are log-normal around 6,000 MAD (floored at the minimum wage),
+    tenure is exponential with a 7 year mean and about 5% of hiring dates
+    are missing; ages stay below 56 so no retirement events are created.
+    """
+
+    MARITAL_STATUSES = [('Marié', 0.55), ('Célibataire', 0.40), ('Divorcé', 0.05)]
+    DEPARTMENTS = ['Production', 'Logistique', 'Administration', 'Commercial']
+
+    def __init__(self, size, salary_month, seed=42, punch_days=22):
+        self.size = size
+        self.salary_month = salary_month
+        self.random = random.Random(seed)
+        self.punch_days = punch_days
+
+    def _salary(self):
+        return round(min(max(self.random.lognormvariate(8.7, 0.45), 3120.0), 80000.0), 2)
+
+    def _company_doj(self, today):
+        if self.random.random() < 0.05:
+            return None
+        tenure_days = int(min(self.random.expovariate(1 / 7.0), 35) * 365.25)
+        return today - timedelta(days=tenure_days)
+
+    def _marital_status(self):
+        pick = self.random.random()
+        for status, weight in self.MARITAL_STATUSES:
+            if pick < weight:
+                return status
+            pick -= weight
+        return self.MARITAL_STATUSES[-1][0]
+
+    def _working_days(self):
+        month, year = map(int, self.salary_month.split('/'))
+        day = date(year, month, 1)
+        days = []
+        while day.month == month and len(days) < self.punch_days:
+            if day.weekday() < 5:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def seed(self):
+        """Insert the synthetic workforce and return the new employee ids"""
+        user = User.query.filter_by(email=BENCH_EMAIL).first()
+        if not user:
+            user = User(name='Benchmark', email=BENCH_EMAIL, password='-', type='company')
+            db.session.add(user)
+        branch = Branch(name=BENCH_BRANCH, created_by=1)
+        db.session.add(branch)
+        db.session.flush()
+        departments = [Department(name=name, branch_id=branch.id, created_by=1) for name in self.DEPARTMENTS]
+        db.session.add_all(departments)
+        db.session.flush()
+
+        today = date.today()
+        employee_rows = [
+            {
+                'user_id': user.id,
+                'name': f"Employé Benchmark {index}",
+                'employee_id': f"{BENCH_PREFIX}{index:06d}",
+                'branch_id': branch.id,
+                'department_id': self.random.choice(departments).id,
+                'salary': self._salary(),
+                'company_doj': self._company_doj(today),
+                'date_of_birth': today - timedelta(days=self.random.randint(20, 55) * 365),
+                'marital_status': self._marital_status(),
+                'is_active': 1,
+                'created_by': 1,
+            }
+            for index in range(self.size)
+        ]
+        employee_ids = []
+        for start in range(0, len(employee_rows), INSERT_CHUNK_SIZE):
+            result = db.session.execute(
+                insert(Employee).returning(Employee.id),
+                employee_rows[start:start + INSERT_CHUNK_SIZE]
+            )
+            employee_ids.extend(result.scalars().all())
+
+        advance_rows = []
+        for employee_id in employee_ids:
+            # About a third of the workforce has one or two outstanding advances
+            if self.random.random() < 0.33:
+                for _ in range(self.random.choice([1, 1, 2])):
+                    advance_rows.append({
+                        'employee_id': employee_id,
+                        'amount': self.random.choice([500, 1000, 1500, 2000, 3000]),
+                        'date': today,
+                        'status': 'active',
+                    })
+        self._insert_chunked(Advance, advance_rows)
+
+        zero = dt_time(0, 0)
+        working_days = self._working_days()
+        punch_rows = []
+        for employee_id in employee_ids:
+            for day in working_days:
+                clock_in = dt_time(8, self.random.randint(0, 20))
+                overtime_minutes = self.random.choice([0, 0, 0, 30, 60, 90])
+                punch_rows.append({
+                    'employee_id': employee_id,
+                    'date': day,
+                    'status': 'Present',
+                    'hs': f"{overtime_minutes / 60:.2f}",
+                    'clock_in': clock_in,
+                    'clock_out': dt_time(17 + overtime_minutes // 60, (overtime_minutes % 60)),
+                    'late': dt_time(0, max(clock_in.minute - 15, 0)),
+                    'early_leaving': zero,
+                    'overtime': dt_time(overtime_minutes // 60, overtime_minutes % 60),
+                    'total_rest': dt_time(1, 0),
+                    'created_by': 1,
+                })
+            if len(punch_rows) >= INSERT_CHUNK_SIZE:
+                self._insert_chunked(AttendanceEmployee, punch_rows)
+                punch_rows = []
+        self._insert_chunked(AttendanceEmployee, punch_rows)
+
+        db.session.commit()
+        return employee_ids
+
+    @staticmethod
+    def _insert_chunked(model, rows):
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            db.session.execute(insert(model), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def real_employee_count():
+    """Active employees that are not synthetic"""
+    return Employee.query.filter(
+        Employee.is_active == 1,
+        or_(Employee.employee_id.is_(None), ~Employee.employee_id.like(f"{BENCH_PREFIX}%"))
+    ).count()
+
+
+def remove_synthetic_workforce(job_ids=()):
+    """Delete the synthetic employees with everything calculated for them, and the benchmark's jobs"""
+    bench_ids = db.session.query(Employee.id).filter(Employee.employee_id.like(f"{BENCH_PREFIX}%"))
+    branch_ids = db.session.query(Branch.id).filter(Branch.name == BENCH_BRANCH)
+    PayrollAggregate.query.filter(PayrollAggregate.branch_id.in_(branch_ids)).delete(synchronize_session=False)
+    for model in (PaySlip, PayrollYtd, Advance, AttendanceEmployee):
+        model.query.filter(model.employee_id.in_(bench_ids)).delete(synchronize_session=False)
+    Employee.query.filter(Employee.employee_id.like(f"{BENCH_PREFIX}%")).delete(synchronize_session=False)
+    Department.query.filter(Department.branch_id.in_(branch_ids)).delete(synchronize_session=False)
+    Branch.query.filter(Branch.name == BENCH_BRANCH).delete(synchronize_session=False)
+    if job_ids:
+        BackgroundJob.query.filter(BackgroundJob.id.in_(job_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+class QueryCounter:
+    """Counts SQL statements sent on the engine, from any thread"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    @contextmanager
+    def counting(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        try:
+            yield self
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _result(payslips, elapsed, latencies, queries):
+    """Benchmark result; latencies are per payslip in seconds"""
+    return {
+        'payslips': payslips,
+        'seconds': round(elapsed, 3),
+        'payslips_per_second': round(payslips / elapsed, 1) if elapsed else None,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+        'queries': queries,
+        'queries_per_payslip': round(queries / payslips, 2) if payslips else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_per_employee(calculate, employee_ids, salary_month):
+    """
+    Time one calculator per employee over preloaded inputs
+
+    Payslips are flushed but rolled back so the benchmark month stays empty.
+    """
+    from payroll_loader import load_payroll_inputs
+
+    counter = QueryCounter()
+    latencies = []
+    with counter.counting():
+        started = time.perf_counter()
+        inputs = load_payroll_inputs(salary_month, employee_ids)
+        for employee_id in employee_ids:
+            call_started = time.perf_counter()
+            calculate(employee_id, salary_month, inputs)
+            latencies.append(time.perf_counter() - call_started)
+        db.session.flush()
+        elapsed = time.perf_counter() - started
+    db.session.rollback()
+    return _result(len(employee_ids), elapsed, latencies, counter.count)
+
+
+def bench_moroccan(employee_ids, salary_month):
+    from payroll_calculator import calculate_employee_payslip
+    return bench_per_employee(
+        lambda employee_id, month, inputs: calculate_employee_payslip(employee_id, month, inputs=inputs, commit=False),
+        employee_ids, salary_month
+    )
+
+
+def bench_simple(employee_ids, salary_month):
+    from simple_payroll_calculator import calculate_simple_payslip
+    return bench_per_employee(
+        lambda employee_id, month, inputs: calculate_simple_payslip(employee_id, month, inputs=inputs, commit=False),
+        employee_ids, salary_month
+    )
+
+
+def bench_batch_engine(employee_ids, salary_month):
+    """Vectorized engine on the synthetic workforce, saved in one transaction"""
+    from payroll_batch import calculate_batch_payslips
+
+    counter = QueryCounter()
+    with counter.counting():
+        started = time.perf_counter()
+        saved, errors = calculate_batch_payslips(salary_month, employee_ids=employee_ids)
+        elapsed = time.perf_counter() - started
+    result = _result(saved, elapsed, [], counter.count)
+    result['errors'] = len(errors)
+    return result
+
+
+def bench_batch_route(salary_month, timeout=3600):
+    """
+    POST /payroll/calculate-batch and wait for its background job to finish
+
+    The route calculates every active employee, so it only runs on a
+    database whose active employees are all synthetic.
+    """
+    real_employees = real_employee_count()
+    if real_employees:
+        return {'skipped': f"{real_employees} real employees in the database would be calculated too"}
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    counter = QueryCounter()
+    with counter.counting():
+        started = time.perf_counter()
+        response = client.post(
+            '/payroll/calculate-batch',
+            data={'salary_month': salary_month},
+            headers={'Accept': 'application/json'}
+        )
+        accepted = time.perf_counter() - started
+        job_id = response.get_json()['job_id']
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] in ('completed', 'partial', 'failed') or time.perf_counter() - started > timeout:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    result = _result(job.get('processed') or 0, elapsed, [], counter.count)
+    result.update({
+        'job_id': job_id,
+        'status': job['status'],
+        'errors': job.get('error_count', 0),
+        'accepted_ms': round(accepted * 1000, 3),
+    })
+    return result
+
+
+def run_size(size, salary_month, sample, seed, keep=False):
+    """Seed one workforce size and run every benchmark on it"""
+    remove_synthetic_workforce()
+
+    started = time.perf_counter()
+    employee_ids = SyntheticWorkforce(size, salary_month, seed).seed()
+    report = {'size': size, 'seed_seconds': round(time.perf_counter() - started, 3)}
+
+    sample_ids = employee_ids[:sample] if sample else employee_ids
+    report['sample'] = len(sample_ids)
+    report['results'] = {
+        'moroccan_calculator': bench_moroccan(sample_ids, salary_month),
+        'simple_calculator': bench_simple(sample_ids, salary_month),
+        'batch_engine': bench_batch_engine(employee_ids, salary_month),
+        'batch_route': bench_batch_route(salary_month),
+    }
+
+    if not keep:
+        route_job = report['results']['batch_route'].get('job_id')
+        remove_synthetic_workforce([route_job] if route_job else ())
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Payroll benchmark on a synthetic workforce')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE,
+                        help='employees timed with the per-employee calculators (0 = all)')
+    parser.add_argument('--month', default=DEFAULT_MONTH, help='salary month MM/YYYY used for the runs')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='payroll_benchmark.json')
+    parser.add_argument('--keep', action='store_true', help='leave the synthetic rows in the database')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        report = {
+            'generated_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': db.engine.dialect.name,
+            'salary_month': args.month,
+            'runs': [],
+        }
+        for size in args.sizes:
+            print(f"Benchmarking {size} employees...")
+            run = run_size(size, args.month, args.sample, args.seed, args.keep)
+            for name, result in run['results'].items():
+                if 'skipped' in result:
+                    print(f"  {name}: skipped, {result['skipped']}")
+                    continue
+                print(f"  {name}: {result['payslips_per_second']} payslips/s, "
+                      f"p99 {result['p99_ms']} ms, {result['queries']} queries")
+            report['runs'].append(run)
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
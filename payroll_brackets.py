@@ -0,0 +1,90 @@
+"""
+Compiled Payroll Bracket Tables
+Sorted bracket bounds with pre-converted Decimal, integer-cent and float
+constants, looked up with bisect (one value) or np.searchsorted (arrays)
+"""
+
+from bisect import bisect_left
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _cents(value):
+    return int((value * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class BracketTable:
+    """
+    Contiguous brackets compiled from a list of dicts
+
+    Each bracket covers (previous upper bound, its upper bound], so there
+    are no gaps between an integer max and the next integer min. Values
+    below the first lower bound match no bracket; values above the last
+    upper bound fall in the last bracket.
+    """
+
+    def __init__(self, brackets, lower_key, upper_key, fields, amount_fields=()):
+        ordered = sorted(brackets, key=lambda bracket: _decimal(bracket[upper_key]))
+        self.fields = list(fields)
+        self.lower_bound = _decimal(ordered[0][lower_key])
+        self.upper_bounds = [_decimal(bracket[upper_key]) for bracket in ordered]
+
+        # Per-bracket constants, converted once
+        self.brackets = [
+            {field: _decimal(bracket[field]) for field in self.fields}
+            for bracket in ordered
+        ]
+        self.float_lower_bound = float(self.lower_bound)
+        self.float_upper_bounds = np.array([float(bound) for bound in self.upper_bounds])
+        self.float_fields = {
+            field: np.array([float(bracket[field]) for bracket in self.brackets])
+            for field in self.fields
+        }
+        self.cent_fields = {
+            field: [
+                _cents(bracket[field])
+                for bracket in self.brackets
+            ]
+            for field in amount_fields
+        }
+
+    def __len__(self):
+        return len(self.brackets)
+
+    def index(self, value):
+        """Bracket index for a value, or -1 below the first bracket"""
+        if value < self.lower_bound:
+            return -1
+        return min(bisect_left(self.upper_bounds, value), len(self.brackets) - 1)
+
+    def lookup(self, value):
+        """Decimal constants of the bracket containing value, or None"""
+        index = self.index(value)
+        return self.brackets[index] if index >= 0 else None
+
+    def index_array(self, values):
+        """Bracket indexes for an array of floats, -1 below the first bracket"""
+        values = np.asarray(values, dtype=float)
+        indexes = np.searchsorted(self.float_upper_bounds, values, side='left')
+        indexes = np.minimum(indexes, len(self.brackets) - 1)
+        return np.where(values < self.float_lower_bound, -1, indexes)
+
+    def lookup_array(self, values, field, default=0.0):
+        """Float constant `field` of each value's bracket, `default` outside any bracket"""
+        indexes = self.index_array(values)
+        constants = self.float_fields[field][np.maximum(indexes, 0)]
+        return np.where(indexes >= 0, constants, default)
+
+
+def compile_tax_table(brackets):
+    """Income tax table from brackets with min, max, rate and deduction"""
+    return BracketTable(brackets, 'min', 'max', ['rate', 'deduction'], amount_fields=['deduction'])
+
+
+def compile_seniority_table(brackets):
+    """Seniority bonus table from brackets with min_years, max_years and rate"""
+    return BracketTable(brackets, 'min_years', 'max_years', ['rate'])
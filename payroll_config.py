@@ -0,0 +1,75 @@
+"""
+Payroll Rate Provider
+Reads payroll rates from the payroll_configurations table once, caches them
+in-process and reloads only when a configuration row changes
+"""
+
+import logging
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func
+from database import db
+from models import PayrollConfiguration
+# Re-exported: rate snapshots are plain objects so the kernel needs no app
+from payroll_kernel import DEFAULT_RATES, PayrollRates
+
+logger = logging.getLogger(__name__)
+
+
+class PayrollRateProvider:
+    """
+    In-process cache of PayrollRates
+
+    The config version is max(updated_at) and the row count of
+    payroll_configurations, checked at most every poll_interval seconds.
+    A batch run takes one snapshot() and uses it throughout.
+    """
+
+    def __init__(self, poll_interval=5):
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        last_update, row_count = db.session.query(
+            func.max(PayrollConfiguration.updated_at),
+            func.count(PayrollConfiguration.id)
+        ).one()
+        return f"{last_update.isoformat() if last_update else '-'}:{row_count}"
+
+    def _load(self, version):
+        values = dict(DEFAULT_RATES)
+        for config in PayrollConfiguration.query.filter_by(is_active=True).all():
+            if config.config_key not in DEFAULT_RATES:
+                continue
+            try:
+                values[config.config_key] = Decimal(config.config_value)
+            except (InvalidOperation, TypeError):
+                logger.warning(f"Invalid payroll configuration {config.config_key}={config.config_value!r}, using default")
+        return PayrollRates(values, version)
+
+    def snapshot(self):
+        """Current rates, reloaded if the configuration changed since the last check"""
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None or now - self._checked_at >= self.poll_interval:
+                version = self._current_version()
+                if self._snapshot is None or version != self._snapshot.version:
+                    self._snapshot = self._load(version)
+                self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next snapshot() to check the configuration version"""
+        with self._lock:
+            self._checked_at = float('-inf')
+
+
+rate_provider = PayrollRateProvider()
+
+
+def get_payroll_rates():
+    """Convenience function returning the current payroll rate snapshot"""
+    return rate_provider.snapshot()
@@ -0,0 +1,185 @@
+"""
+Payroll Month-over-Month Diff
+Compares the payslips of two salary months in one query and a vectorized
+pandas join: employees added or removed, net pay changes above a threshold
+and the component deltas behind them
+
+    flask payroll diff 03/2026 [--previous 02/2026] [--threshold 100] [--threshold-pct 10]
+"""
+
+from datetime import date
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func, select
+from database import db
+from models import Employee, PaySlip, PaySlipLine
+from payroll_ytd import normalize_salary_month, salary_month_period
+
+# Payslip line components compared per employee (see payslip_lines)
+DIFF_COMPONENTS = [
+    'basic_salary', 'monthly_salary', 'overtime', 'overtime_regular', 'overtime_weekend',
+    'overtime_holiday', 'seniority_bonus', 'leave_allowance', 'gross_salary', 'cnss', 'amo',
+    'cimr', 'net_ir', 'advances',
+]
+
+DEFAULT_THRESHOLD = 100       # MAD
+DEFAULT_THRESHOLD_PCT = 10    # percent of last month's net pay
+
+
+def _salary_month(salary_month):
+    """The stored 'MM/YYYY' label of a month given as MM/YYYY or YYYY-MM"""
+    normalized = normalize_salary_month(salary_month)
+    if normalized is None:
+        raise ValueError(f"Invalid salary month: {salary_month}")
+    return normalized
+
+
+def previous_salary_month(salary_month):
+    """'MM/YYYY' of the month before salary_month (MM/YYYY or YYYY-MM)"""
+    period = salary_month_period(salary_month)
+    if period is None:
+        raise ValueError(f"Invalid salary month: {salary_month}")
+    year, month = (period.year, period.month - 1) if period.month > 1 else (period.year - 1, 12)
+    return date(year, month, 1).strftime('%m/%Y')
+
+
+class PayrollDiff:
+    """
+    Differences between the payslips of two months
+
+    Both months are read with a single query returning one row per payslip,
+    with its line components pivoted into columns; the comparison itself is
+    a pandas outer merge on employee id.
+    """
+
+    def __init__(self, salary_month, previous_month=None, threshold=DEFAULT_THRESHOLD,
+                 threshold_pct=DEFAULT_THRESHOLD_PCT, components=None):
+        # Payslips are stored under MM/YYYY; months from the web forms come as YYYY-MM
+        self.salary_month = _salary_month(salary_month)
+        self.previous_month = _salary_month(previous_month) if previous_month else \
+            previous_salary_month(self.salary_month)
+        self.threshold = threshold
+        self.threshold_pct = threshold_pct
+        self.components = components or DIFF_COMPONENTS
+        self.frame = None
+
+    def load(self):
+        """One row per payslip of either month"""
+        query = select(
+            PaySlip.employee_id,
+            PaySlip.salary_month,
+            Employee.employee_id.label('code'),
+            Employee.name,
+            PaySlip.net_payble.label('net_payable'),
+            func.count(PaySlipLine.id).label('line_count'),
+            *[
+                func.sum(case((PaySlipLine.component == component, PaySlipLine.amount), else_=0)).label(component)
+                for component in self.components
+            ]
+        ).select_from(PaySlip) \
+            .join(Employee, PaySlip.employee_id == Employee.id) \
+            .outerjoin(PaySlipLine, PaySlipLine.payslip_id == PaySlip.id) \
+            .where(PaySlip.salary_month.in_([self.salary_month, self.previous_month])) \
+            .group_by(PaySlip.id, PaySlip.employee_id, PaySlip.salary_month,
+                      Employee.employee_id, Employee.name, PaySlip.net_payble)
+
+        columns = ['employee_id', 'salary_month', 'code', 'name', 'net_payable', 'line_count'] + self.components
+        frame = pd.DataFrame(db.session.execute(query).all(), columns=columns)
+        amounts = ['net_payable'] + self.components
+        frame[amounts] = frame[amounts].fillna(0).astype(float)
+        self.frame = frame
+        return frame
+
+    def compare(self):
+        """
+        Returns:
+            dict with a summary, the added and removed employees and the net
+            pay changes above the threshold, largest first
+        """
+        if self.frame is None:
+            self.load()
+
+        frame = self.frame
+        amounts = ['net_payable', 'line_count'] + self.components
+        current = frame[frame['salary_month'] == self.salary_month]
+        previous = frame[frame['salary_month'] == self.previous_month]
+        merged = current[['employee_id', 'code', 'name'] + amounts].merge(
+            previous[['employee_id', 'code', 'name'] + amounts],
+            on='employee_id', how='outer', suffixes=('', '_previous'), indicator=True
+        )
+        for column in ('code', 'name'):
+            values = merged[column].fillna(merged[f"{column}_previous"]).astype(object)
+            merged[column] = values.where(values.notna(), None)
+
+        added = merged[merged['_merge'] == 'left_only']
+        removed = merged[merged['_merge'] == 'right_only']
+        both = merged[merged['_merge'] == 'both'].copy()
+
+        both['delta'] = (both['net_payable'] - both['net_payable_previous']).round(2)
+        previous_net = both['net_payable_previous'].to_numpy()
+        both['delta_pct'] = np.round(
+            np.divide(both['delta'].to_numpy() * 100, np.abs(previous_net),
+                      out=np.full(len(both), np.nan), where=previous_net != 0),
+            2
+        )
+        flagged = (both['delta'].abs() >= self.threshold) | (both['delta_pct'].abs() >= self.threshold_pct)
+        changes = both[flagged].copy()
+        changes = changes.reindex(changes['delta'].abs().sort_values(ascending=False).index)
+
+        # Component deltas only where both payslips have their line breakdown
+        deltas = pd.DataFrame({
+            component: (changes[component] - changes[f"{component}_previous"]).round(2)
+            for component in self.components
+        }, index=changes.index)
+        has_lines = (changes['line_count'] > 0) & (changes['line_count_previous'] > 0)
+
+        return {
+            'salary_month': self.salary_month,
+            'previous_month': self.previous_month,
+            'threshold': self.threshold,
+            'threshold_pct': self.threshold_pct,
+            'summary': {
+                'current_count': int(len(current)),
+                'previous_count': int(len(previous)),
+                'added': int(len(added)),
+                'removed': int(len(removed)),
+                'changed': int(len(changes)),
+                'net_total': round(float(current['net_payable'].sum()), 2),
+                'net_total_previous': round(float(previous['net_payable'].sum()), 2),
+                'net_total_delta': round(float(current['net_payable'].sum() - previous['net_payable'].sum()), 2),
+            },
+            'added': [
+                {'employee_id': int(row.employee_id), 'code': row.code, 'name': row.name,
+                 'net_payable': round(row.net_payable, 2)}
+                for row in added.itertuples(index=False)
+            ],
+            'removed': [
+                {'employee_id': int(row.employee_id), 'code': row.code, 'name': row.name,
+                 'net_payable_previous': round(row.net_payable_previous, 2)}
+                for row in removed.itertuples(index=False)
+            ],
+            'changes': [
+                {
+                    'employee_id': int(row.employee_id),
+                    'code': row.code,
+                    'name': row.name,
+                    'net_payable': round(row.net_payable, 2),
+                    'net_payable_previous': round(row.net_payable_previous, 2),
+                    'delta': row.delta,
+                    'delta_pct': None if np.isnan(row.delta_pct) else row.delta_pct,
+                    'components': {
+                        component: delta for component, delta in component_deltas.items() if delta != 0
+                    } if with_lines else None,
+                }
+                for row, component_deltas, with_lines in zip(
+                    changes.itertuples(index=False), deltas.to_dict('records'), has_lines
+                )
+            ],
+        }
+
+
+def diff_payroll_months(salary_month, previous_month=None, threshold=DEFAULT_THRESHOLD,
+                        threshold_pct=DEFAULT_THRESHOLD_PCT):
+    """Convenience function to compare a month with the previous one"""
+    return PayrollDiff(salary_month, previous_month, threshold, threshold_pct).compare()
+
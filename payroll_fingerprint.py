@@ -0,0 +1,35 @@
+"""
+Payroll Input Fingerprints
+A stable hash of everything a payslip calculation depends on, stored on
+PaySlip so re-running a month can skip employees whose inputs did not change
+"""
+
+import hashlib
+from decimal import Decimal
+
+# Bump when the calculation or what is stored with a payslip changes, so every
+# payslip is recalculated (simple-2: payslips gained their component lines,
+# simple-3: amounts on a half-cent tie are rounded like the Decimal calculator)
+FINGERPRINT_VERSION = 'simple-3'
+
+
+def payslip_fingerprint(salary, company_doj, marital_status, advances, overtime_hours,
+                        leave_allowance, years_of_service, config_version):
+    """
+    Fingerprint of the inputs of a SimpleMoroccanPayrollCalculator payslip
+
+    Years of service are part of the inputs because the seniority bonus
+    changes on the hiring anniversary even when no row was edited.
+    """
+    parts = [
+        FINGERPRINT_VERSION,
+        f"{Decimal(str(salary or 0)):.2f}",
+        company_doj.isoformat() if company_doj else '',
+        marital_status or '',
+        f"{Decimal(str(advances or 0)):.2f}",
+        f"{float(overtime_hours or 0):.4f}",
+        f"{float(leave_allowance or 0):.2f}",
+        str(int(years_of_service)) if company_doj else '',
+        config_version or '',
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
@@ -0,0 +1,170 @@
+"""
+Payroll Background Jobs
+Handlers for the batch payroll runs started from the payroll pages
+"""
+
+import os
+from flask import current_app
+from sqlalchemy import extract
+from job_runner import job_handler
+from database import db
+from models import PaySlip
+from payroll_aggregates import refresh_payroll_aggregates
+from payroll_batch import calculate_batch_payslips
+from payroll_metrics import instrumented_run
+from payroll_ytd import normalize_salary_month, refresh_payroll_ytd
+from payroll_parallel import ParallelPayrollExecutor
+from retirement_scanner import NOTIFICATION_WINDOW_DAYS, scan_retirements
+
+
+def _salary_month(params):
+    """The job's salary month as the stored 'MM/YYYY' label (jobs may be queued with YYYY-MM)"""
+    salary_month = normalize_salary_month(params['salary_month'])
+    if salary_month is None:
+        raise ValueError(f"Mois de salaire invalide: {params['salary_month']}")
+    return salary_month
+
+
+def _run_payroll(salary_month, overtime_hours, progress, skip_unchanged=False, metrics=None):
+    """
+    Run in-process, or across PAYROLL_WORKERS processes when more than one is configured
+
+    Returns:
+        tuple: (number of payslips saved, list of errors, labels of the partitions left unsaved)
+
+    A parallel run whose partitions did not all save ends the job as
+    'partial' ('failed' when none saved). With metrics (PAYROLL_METRICS by default), step timings are collected and
+    the run appears in the payroll metrics endpoint.
+    """
+    workers = current_app.config.get('PAYROLL_WORKERS', 1)
+    if metrics is None:
+        metrics = current_app.config.get('PAYROLL_METRICS', False)
+    with instrumented_run('payroll_batch', metrics, salary_month=salary_month, workers=workers,
+                          job_id=getattr(progress, 'job_id', None)):
+        if workers > 1:
+            executor = ParallelPayrollExecutor(
+                salary_month,
+                workers=workers,
+                partition_by=current_app.config.get('PAYROLL_PARTITION_BY', 'branch')
+            )
+            report = executor.run(overtime_hours, progress=progress, skip_unchanged=skip_unchanged)
+            if report.status != 'completed':
+                progress.status = report.status
+            return report.saved, report.errors, report.failed_partitions
+        saved, errors = calculate_batch_payslips(salary_month, overtime_hours, progress=progress,
+                                                 skip_unchanged=skip_unchanged)
+        return saved, errors, []
+
+
+def _scan_retirements(progress):
+    """Retirement events are refreshed after each payroll run; a failure does not fail the run"""
+    try:
+        return scan_retirements()
+    except Exception as e:
+        progress.add_error(f"Erreur de détection des départs à la retraite: {str(e)}")
+        return 0
+
+
+@job_handler('payroll_batch')
+def run_payroll_batch(params, progress):
+    """Calculate payroll for all active employees"""
+    saved, errors, unsaved_partitions = _run_payroll(_salary_month(params), None, progress,
+                                                     skip_unchanged=params.get('skip_unchanged', False),
+                                                     metrics=params.get('metrics'))
+    return {
+        'saved': saved,
+        'unsaved_partitions': unsaved_partitions,
+        'retirement_events': _scan_retirements(progress),
+    }
+
+
+@job_handler('retirement_scan')
+def run_retirement_scan(params, progress):
+    """Create retirement events for employees retiring within the notification window"""
+    progress.set_total(1)
+    created = scan_retirements(window_days=params.get('window_days', NOTIFICATION_WINDOW_DAYS))
+    progress.advance(1)
+    return {'retirement_events': created}
+
+
+@job_handler('payroll_aggregates')
+def run_payroll_aggregates(params, progress):
+    """Rebuild payroll aggregates for one month, or for every month with payslips"""
+    if params.get('salary_month'):
+        months = [_salary_month(params)]
+    else:
+        months = [month for month, in db.session.query(PaySlip.salary_month).distinct().all()]
+    progress.set_total(len(months))
+    written = 0
+    for salary_month in months:
+        written += refresh_payroll_aggregates(salary_month)
+        progress.advance(1)
+    return {'months': len(months), 'aggregates': written}
+
+
+@job_handler('payroll_ytd')
+def run_payroll_ytd(params, progress):
+    """Rebuild the YTD ledger for one year, or for every year with payslips"""
+    if params.get('year'):
+        years = [int(params['year'])]
+    else:
+        years = sorted(
+            int(year) for year, in
+            db.session.query(extract('year', PaySlip.period)).filter(PaySlip.period.isnot(None)).distinct().all()
+        )
+    progress.set_total(len(years))
+    written = 0
+    for year in years:
+        written += refresh_payroll_ytd(year)
+        progress.advance(1)
+    return {'years': years, 'ledger_rows': written}
+
+
+def _store_attendance(processor, progress):
+    """The export's days go to the attendance history; a failure does not fail the run"""
+    from attendance_store import store_daily_attendance
+
+    try:
+        return store_daily_attendance(processor)
+    except Exception as e:
+        progress.add_error(f"Erreur d'enregistrement de l'historique de présence: {str(e)}")
+        return 0
+
+
+@job_handler('payroll_batch_attendance')
+def run_payroll_batch_with_attendance(params, progress):
+    """Calculate payroll for all active employees using an uploaded Excel attendance file"""
+    from attendance_cache import get_attendance_cache
+    from attendance_processor import AttendanceProcessor
+
+    file_path = params['file_path']
+    try:
+        salary_month = _salary_month(params)
+        # A re-upload of the same export is loaded from the cache instead of parsed
+        processor = AttendanceProcessor(file_path, cache=get_attendance_cache())
+        attendance_summary = processor.get_attendance_summary(salary_month)
+    finally:
+        # Clean up temp file
+        if os.path.exists(file_path):
+            os.unlink(file_path)
+
+    attendance_days = _store_attendance(processor, progress)
+
+    overtime_hours = {
+        employee_id: employee_attendance.get('overtime_hours', 0)
+        for employee_id, employee_attendance in attendance_summary['attendance_data'].items()
+    }
+    saved, errors, unsaved_partitions = _run_payroll(salary_month, overtime_hours, progress,
+                                                     metrics=params.get('metrics'))
+
+    return {
+        'saved': saved,
+        'unsaved_partitions': unsaved_partitions,
+        'retirement_events': _scan_retirements(progress),
+        'total_records': attendance_summary['total_records'],
+        'matched_employees': attendance_summary['matched_employees'],
+        'unmatched_count': attendance_summary['unmatched_count'],
+        'ambiguous_cards': attendance_summary['ambiguous_cards'],
+        'attendance_cached': processor.from_cache,
+        'attendance_days': attendance_days,
+    }
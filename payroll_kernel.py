@@ -0,0 +1,624 @@
+"""
+Payroll Kernel
+Pure payroll calculations on plain records: no Flask app, session or query.
+Both payslip layouts are step pipelines (see payroll_pipeline) configured by
+a kernel class. The calculators, the batch engine and worker processes are
+adapters that build PayrollInput records and store the results.
+"""
+
+from dataclasses import dataclass, fields
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from payroll_brackets import compile_tax_table, compile_seniority_table
+from payroll_pipeline import CENT, DECIMAL, PayrollPipeline, PayrollStep, step
+
+ZERO = Decimal('0')
+
+# Legal defaults, used for any key missing from payroll_configurations
+DEFAULT_RATES = {
+    'cnss_rate': Decimal('0.0448'),        # 4.48%
+    'amo_rate': Decimal('0.0226'),         # 2.26%
+    'cimr_rate': Decimal('0.07'),          # 7%
+    'cnss_ceiling': Decimal('6000'),       # 6,000 MAD
+    'family_allowance': Decimal('30'),     # 30 MAD per dependant
+}
+
+
+def _check_rate_keys(values):
+    """ValueError on rate names that are not in DEFAULT_RATES, which would otherwise be ignored"""
+    unknown = sorted(set(values) - set(DEFAULT_RATES))
+    if unknown:
+        raise ValueError(f"Unknown payroll rates: {', '.join(unknown)}")
+
+
+class PayrollRates:
+    """Snapshot of payroll rates, stamped with the config version it was read at"""
+
+    __slots__ = tuple(DEFAULT_RATES) + ('version',)
+
+    def __init__(self, values=None, version='defaults'):
+        values = values or {}
+        _check_rate_keys(values)
+        for key, default in DEFAULT_RATES.items():
+            setattr(self, key, values.get(key, default))
+        self.version = version
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in DEFAULT_RATES}
+
+    def with_overrides(self, overrides, version=None):
+        """New snapshot with some rates replaced (used for simulations)"""
+        _check_rate_keys(overrides)
+        values = self.as_dict()
+        values.update({key: Decimal(str(value)) for key, value in overrides.items()})
+        return PayrollRates(values, version or f"{self.version}+overrides")
+
+
+def years_of_service(company_doj, today=None):
+    """Completed years of service on `today`, None without a hiring date"""
+    if not company_doj:
+        return None
+    today = today or date.today()
+    years = today.year - company_doj.year
+    if (today.month, today.day) < (company_doj.month, company_doj.day):
+        years -= 1
+    return years
+
+
+def _quantize(amount):
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class _Record:
+    """Shared helpers of the slotted records"""
+
+    __slots__ = ()
+
+    def as_dict(self):
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+@dataclass(frozen=True, slots=True)
+class PayrollInput(_Record):
+    """
+    Everything a payslip depends on for one employee and month
+
+    overtime_hours/leave_allowance feed the simple calculator; the attendance,
+    leave and per-rate overtime fields feed the detailed one.
+    """
+
+    employee_id: int
+    salary: Decimal
+    company_doj: date = None
+    date_of_birth: date = None
+    marital_status: str = None
+    advances: Decimal = ZERO
+    overtime_hours: object = 0
+    leave_allowance: object = 0
+    days_worked: object = 26
+    attendance_holiday_days: object = 0
+    leave_days: object = 0
+    holiday_days: object = 0
+    worked_on_holidays: bool = False
+    regular_overtime_hours: object = 0
+    weekend_overtime_hours: object = 0
+    holiday_overtime_hours: object = 0
+    as_of: date = None
+
+    @classmethod
+    def from_employee(cls, employee, advances=ZERO, **variable):
+        """Record from an Employee-like object and its active advance total"""
+        return cls(
+            employee_id=employee.id,
+            salary=Decimal(str(employee.salary or 0)),
+            company_doj=employee.company_doj,
+            date_of_birth=getattr(employee, 'date_of_birth', None),
+            marital_status=getattr(employee, 'marital_status', None),
+            advances=advances,
+            **variable
+        )
+
+    @property
+    def is_married(self):
+        return self.marital_status == 'Marié'
+
+    @property
+    def years_of_service(self):
+        return years_of_service(self.company_doj, self.as_of)
+
+
+@dataclass(frozen=True, slots=True)
+class SimplePayrollResult(_Record):
+    """Amounts of a simple payslip, unrounded as the Decimal formulas produce them"""
+
+    employee_id: int
+    basic_salary: Decimal
+    years_of_service: object
+    seniority_bonus: Decimal
+    overtime_amount: Decimal
+    leave_allowance: Decimal
+    gross_salary: Decimal
+    cnss: Decimal
+    amo: Decimal
+    cimr: Decimal
+    professional_expenses: Decimal
+    net_taxable_salary: Decimal
+    gross_ir: Decimal
+    family_allowance: Decimal
+    net_ir: Decimal
+    advances: Decimal
+    total_deductions: Decimal
+    net_salary: Decimal
+    net_payable: Decimal
+
+    def payslip_fields(self):
+        """PaySlip columns, in the layout of the existing pay_slips table"""
+        return {
+            'basic_salary': self.basic_salary,
+            'allowance': self.seniority_bonus + self.leave_allowance,  # Combine allowances
+            'commission': ZERO,  # Can be used for other bonuses
+            'overtime': self.overtime_amount,
+            'other_payment': self.family_allowance,  # Store family allowance here for reference
+            'loan': self.advances,  # Store advances as loans
+            'saturation_deduction': self.total_deductions - self.advances,  # Store other deductions
+            'net_payble': self.net_payable  # Note: keeping original typo in field name
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class DetailedPayrollResult(_Record):
+    """Every intermediate amount of MoroccanPayrollCalculator, quantized to cents"""
+
+    basic_salary: Decimal
+    days_worked: object
+    actual_working_hours: Decimal
+    monthly_salary: Decimal
+    leave_days: object
+    holiday_days: object
+    paid_leave_amount: Decimal
+    paid_holiday_amount: Decimal
+    overtime_regular_hours: Decimal
+    overtime_weekend_hours: Decimal
+    overtime_holiday_hours: Decimal
+    overtime_regular_amount: Decimal
+    overtime_weekend_amount: Decimal
+    overtime_holiday_amount: Decimal
+    total_overtime_amount: Decimal
+    taxable_basic_salary: Decimal
+    years_of_service: int
+    seniority_bonus_rate: Decimal
+    seniority_bonus_amount: Decimal
+    taxable_allowances: Decimal
+    non_taxable_allowances: Decimal
+    gross_salary: Decimal
+    gross_taxable_salary: Decimal
+    cnss_rate: Decimal
+    cnss_amount: Decimal
+    amo_rate: Decimal
+    amo_amount: Decimal
+    cimr_rate: Decimal
+    cimr_amount: Decimal
+    professional_expenses_rate: Decimal
+    professional_expenses_amount: Decimal
+    net_taxable_salary: Decimal
+    gross_ir: Decimal
+    is_married: bool
+    number_of_children: int
+    family_allowance: Decimal
+    net_ir: Decimal
+    advance_payments: Decimal
+    loans: Decimal
+    total_deductions: Decimal
+    net_salary: Decimal
+    net_payable: Decimal
+
+
+def _unrounded(amount):
+    return amount
+
+
+def _rounding(ops, rounded):
+    return ops.quantize if rounded else _unrounded
+
+
+# Steps shared by the kernels. Each reads its constants from the kernel
+# configuration, so one step definition runs with either kernel's rates and
+# bracket tables, on Decimals or on arrays.
+
+def seniority_step(base, rounded=False):
+    """Seniority bonus rate for completed years of service (none without a hiring date) applied to base"""
+    def seniority(values, ops, config):
+        rate = ops.coalesce(ops.lookup(config.SENIORITY_TABLE, values['years_of_service'], 'rate'))
+        return {'seniority_rate': rate, 'seniority_bonus': _rounding(ops, rounded)(values[base] * rate)}
+    return PayrollStep('seniority', seniority, [base, 'years_of_service'], ['seniority_rate', 'seniority_bonus'])
+
+
+def contributions_step(base, rounded=False):
+    """CNSS (with ceiling), AMO and CIMR"""
+    def social_contributions(values, ops, config):
+        quantize = _rounding(ops, rounded)
+        rates = config.rates
+        amount = values[base]
+        return {
+            'cnss': quantize(ops.minimum(amount, ops.const(rates.cnss_ceiling)) * ops.const(rates.cnss_rate)),
+            'amo': quantize(amount * ops.const(rates.amo_rate)),
+            'cimr': quantize(amount * ops.const(rates.cimr_rate)),
+        }
+    return PayrollStep('social_contributions', social_contributions, [base], ['cnss', 'amo', 'cimr'])
+
+
+def professional_expenses_step(rate_base, base, rounded=False):
+    """Higher rate up to the threshold of rate_base, applied to base"""
+    def professional_expenses(values, ops, config):
+        rate = ops.where(
+            ops.le(values[rate_base], ops.const(config.PROFESSIONAL_EXPENSES_THRESHOLD)),
+            ops.const(config.PROFESSIONAL_EXPENSES_HIGH),
+            ops.const(config.PROFESSIONAL_EXPENSES_LOW)
+        )
+        return {
+            'professional_expenses_rate': rate,
+            'professional_expenses': _rounding(ops, rounded)(values[base] * rate),
+        }
+    inputs = [rate_base] if rate_base == base else [rate_base, base]
+    return PayrollStep('professional_expenses', professional_expenses, inputs,
+                       ['professional_expenses_rate', 'professional_expenses'])
+
+
+def net_taxable_step(base, rounded=False):
+    def net_taxable_salary(values, ops, config):
+        return {'net_taxable_salary': _rounding(ops, rounded)(
+            values[base] - values['cnss'] - values['amo'] - values['cimr'] - values['professional_expenses']
+        )}
+    return PayrollStep('net_taxable_salary', net_taxable_salary,
+                       [base, 'cnss', 'amo', 'cimr', 'professional_expenses'], ['net_taxable_salary'])
+
+
+def income_tax_step(rounded=False):
+    """Gross IR from the tax table, less the family allowance; net IR cannot be negative"""
+    def income_tax(values, ops, config):
+        net_taxable_salary = values['net_taxable_salary']
+        gross_ir = ops.apply_rate(
+            net_taxable_salary,
+            ops.lookup(config.tax_table, net_taxable_salary, 'rate'),
+            ops.lookup(config.tax_table, net_taxable_salary, 'deduction')
+        )
+        allowance = ops.const(config.rates.family_allowance)
+        family_allowance = ops.where(values['is_married'], ops.zero + allowance, ops.zero) + \
+            ops.number(values['number_of_children']) * allowance
+        net_ir = _rounding(ops, rounded)(ops.maximum(gross_ir - family_allowance, ops.zero))
+        return {'gross_ir': gross_ir, 'family_allowance': family_allowance, 'net_ir': net_ir}
+    return PayrollStep('income_tax', income_tax, ['net_taxable_salary', 'is_married', 'number_of_children'],
+                       ['gross_ir', 'family_allowance', 'net_ir'])
+
+
+# Steps of the simple payslip (unrounded amounts)
+
+@step(['basic_salary', 'overtime_hours'], ['overtime_amount'], skip_unless=['overtime_hours'])
+def simple_overtime(values, ops, config):
+    """Overtime (simple 25% rate)"""
+    hourly_rate = values['basic_salary'] / ops.const(config.STANDARD_MONTHLY_HOURS)
+    return {'overtime_amount': values['overtime_hours'] * hourly_rate * ops.const(config.OVERTIME_RATE)}
+
+
+@step(['basic_salary', 'seniority_bonus', 'overtime_amount', 'leave_allowance'], ['gross_salary'])
+def simple_gross(values, ops, config):
+    return {'gross_salary': values['basic_salary'] + values['seniority_bonus'] +
+            values['overtime_amount'] + values['leave_allowance']}
+
+
+@step(['gross_salary', 'cnss', 'amo', 'cimr', 'net_ir', 'advances'],
+      ['total_deductions', 'net_salary', 'net_payable'])
+def simple_net(values, ops, config):
+    total_deductions = values['cnss'] + values['amo'] + values['cimr'] + values['net_ir']
+    net_salary = values['gross_salary'] - total_deductions
+    return {
+        'total_deductions': total_deductions,
+        'net_salary': net_salary,
+        'net_payable': net_salary - values['advances'],
+    }
+
+
+SIMPLE_PIPELINE = PayrollPipeline(
+    'simple',
+    ['basic_salary', 'years_of_service', 'overtime_hours', 'leave_allowance', 'is_married',
+     'number_of_children', 'advances'],
+    [
+        seniority_step('basic_salary'),
+        simple_overtime,
+        simple_gross,
+        contributions_step('gross_salary'),
+        professional_expenses_step('gross_salary', 'gross_salary'),
+        net_taxable_step('gross_salary'),
+        income_tax_step(),
+        simple_net,
+    ]
+)
+
+
+# Steps of the detailed payslip (amounts quantized to cents where the payslip shows them)
+
+@step(['basic_salary', 'days_worked', 'attendance_holiday_days'],
+      ['actual_working_hours', 'hourly_rate', 'monthly_salary'])
+def attendance_salary(values, ops, config):
+    """Basic salary from attendance"""
+    actual_working_hours = (values['days_worked'] - values['attendance_holiday_days']) * \
+        ops.const(config.HOURS_PER_WORKING_DAY)
+    hourly_rate = values['basic_salary'] / ops.const(config.STANDARD_MONTHLY_HOURS)
+    return {
+        'actual_working_hours': actual_working_hours,
+        'hourly_rate': hourly_rate,
+        'monthly_salary': ops.quantize(hourly_rate * actual_working_hours),
+    }
+
+
+@step(['basic_salary', 'leave_days'], ['paid_leave_amount'], skip_unless=['leave_days'])
+def paid_leave(values, ops, config):
+    leave_days = values['leave_days']
+    amount = (ops.number(leave_days) * values['basic_salary']) / config.MAX_WORKING_DAYS
+    return {'paid_leave_amount': ops.quantize(ops.where(leave_days > 0, amount, ops.zero))}
+
+
+@step(['basic_salary', 'holiday_days', 'worked_on_holidays'], ['paid_holiday_amount'],
+      skip_unless=['holiday_days'])
+def paid_holidays(values, ops, config):
+    """Holidays are paid only when they were not worked"""
+    holiday_days = values['holiday_days']
+    amount = (ops.number(holiday_days) * values['basic_salary']) / config.MAX_WORKING_DAYS
+    amount = ops.where(values['worked_on_holidays'], ops.zero, ops.where(holiday_days > 0, amount, ops.zero))
+    return {'paid_holiday_amount': ops.quantize(amount)}
+
+
+def overtime_step(kind):
+    """Overtime hours of one kind at the kernel's OVERTIME_<KIND> premium, left unrounded"""
+    hours_input, hours, amount = f'{kind}_overtime_hours', f'overtime_{kind}_hours', f'overtime_{kind}_exact'
+
+    def overtime(values, ops, config):
+        premium = 1 + getattr(config, f'OVERTIME_{kind.upper()}')
+        quantity = ops.number(values[hours_input])
+        return {hours: quantity, amount: quantity * values['hourly_rate'] * ops.const(premium)}
+    return PayrollStep(f'overtime_{kind}', overtime, [hours_input, 'hourly_rate'], [hours, amount],
+                       skip_unless=[hours_input])
+
+
+OVERTIME_KINDS = ('regular', 'weekend', 'holiday')
+
+
+@step([f'overtime_{kind}_exact' for kind in OVERTIME_KINDS],
+      [f'overtime_{kind}_amount' for kind in OVERTIME_KINDS] + ['total_overtime_amount'])
+def overtime_total(values, ops, config):
+    exact = [values[f'overtime_{kind}_exact'] for kind in OVERTIME_KINDS]
+    totals = {f'overtime_{kind}_amount': ops.quantize(amount) for kind, amount in zip(OVERTIME_KINDS, exact)}
+    totals['total_overtime_amount'] = ops.quantize(exact[0] + exact[1] + exact[2])
+    return totals
+
+
+@step(['monthly_salary', 'paid_leave_amount', 'paid_holiday_amount', 'total_overtime_amount'],
+      ['taxable_basic_salary'])
+def taxable_basic(values, ops, config):
+    return {'taxable_basic_salary': ops.quantize(
+        values['monthly_salary'] + values['paid_leave_amount'] +
+        values['paid_holiday_amount'] + values['total_overtime_amount']
+    )}
+
+
+@step(['taxable_basic_salary', 'seniority_bonus'],
+      ['taxable_allowances', 'non_taxable_allowances', 'gross_salary', 'gross_taxable_salary'])
+def detailed_gross(values, ops, config):
+    """Gross salary (allowances can be extended)"""
+    taxable_allowances = ops.zero
+    non_taxable_allowances = ops.zero
+    gross_salary = values['taxable_basic_salary'] + values['seniority_bonus'] + taxable_allowances
+    return {
+        'taxable_allowances': taxable_allowances,
+        'non_taxable_allowances': non_taxable_allowances,
+        'gross_salary': gross_salary,
+        'gross_taxable_salary': ops.quantize(gross_salary - non_taxable_allowances),
+    }
+
+
+@step(['gross_taxable_salary', 'cnss', 'amo', 'cimr', 'net_ir', 'advances'],
+      ['advance_payments', 'loans', 'total_deductions', 'net_salary', 'net_payable'])
+def detailed_net(values, ops, config):
+    advance_payments = ops.quantize(values['advances'])
+    loans = ops.quantize(ops.zero)
+    total_deductions = values['amo'] + values['cnss'] + values['cimr'] + values['net_ir']
+    net_salary = values['gross_taxable_salary'] - total_deductions
+    return {
+        'advance_payments': advance_payments,
+        'loans': loans,
+        'total_deductions': total_deductions,
+        'net_salary': net_salary,
+        'net_payable': net_salary - advance_payments - loans,
+    }
+
+
+DETAILED_PIPELINE = PayrollPipeline(
+    'detailed',
+    ['basic_salary', 'days_worked', 'attendance_holiday_days', 'leave_days', 'holiday_days',
+     'worked_on_holidays'] + [f'{kind}_overtime_hours' for kind in OVERTIME_KINDS] +
+    ['years_of_service', 'is_married', 'number_of_children', 'advances'],
+    [
+        attendance_salary,
+        paid_leave,
+        paid_holidays,
+        *[overtime_step(kind) for kind in OVERTIME_KINDS],
+        overtime_total,
+        taxable_basic,
+        seniority_step('taxable_basic_salary', rounded=True),
+        detailed_gross,
+        contributions_step('gross_taxable_salary', rounded=True),
+        professional_expenses_step('taxable_basic_salary', 'gross_taxable_salary', rounded=True),
+        net_taxable_step('gross_taxable_salary', rounded=True),
+        income_tax_step(rounded=True),
+        detailed_net,
+    ]
+)
+
+
+class SimplePayrollKernel:
+    """Configuration of SimpleMoroccanPayrollCalculator: constants, rates and SIMPLE_PIPELINE"""
+
+    PIPELINE = SIMPLE_PIPELINE
+
+    STANDARD_MONTHLY_HOURS = Decimal('191')
+    OVERTIME_RATE = Decimal('1.25')
+    PROFESSIONAL_EXPENSES_THRESHOLD = Decimal('6500')
+    PROFESSIONAL_EXPENSES_HIGH = Decimal('0.35')
+    PROFESSIONAL_EXPENSES_LOW = Decimal('0.25')
+
+    # Seniority bonus rates
+    SENIORITY_RATES = {
+        (2, 4): Decimal('0.05'),    # 5% for 2-4 years
+        (5, 11): Decimal('0.10'),   # 10% for 5-11 years
+        (12, 19): Decimal('0.15'),  # 15% for 12-19 years
+        (20, 24): Decimal('0.20'),  # 20% for 20-24 years
+        (25, 99): Decimal('0.25'),  # 25% for 25+ years
+    }
+
+    # Tax brackets
+    TAX_BRACKETS = [
+        {'min': 0, 'max': 2500, 'rate': 0, 'deduction': 0},
+        {'min': 2501, 'max': 4166, 'rate': 0.10, 'deduction': 250},
+        {'min': 4167, 'max': 5000, 'rate': 0.20, 'deduction': 666.67},
+        {'min': 5001, 'max': 6666, 'rate': 0.30, 'deduction': 1166.67},
+        {'min': 6667, 'max': 15000, 'rate': 0.34, 'deduction': 1433.33},
+        {'min': 15001, 'max': 999999, 'rate': 0.38, 'deduction': 2033.33},
+    ]
+
+    # Bracket tables compiled once, looked up by bisection
+    TAX_TABLE = compile_tax_table(TAX_BRACKETS)
+    SENIORITY_TABLE = compile_seniority_table([
+        {'min_years': min_years, 'max_years': max_years, 'rate': rate}
+        for (min_years, max_years), rate in SENIORITY_RATES.items()
+    ])
+
+    def __init__(self, rates=None, tax_table=None):
+        self.rates = rates or PayrollRates()
+        self.tax_table = tax_table or self.TAX_TABLE
+
+    def _run_step(self, name, **values):
+        return self.PIPELINE.step(name).func(values, DECIMAL, self)
+
+    def seniority_bonus(self, basic_salary, years):
+        """Seniority bonus for completed years of service (None without a hiring date)"""
+        return self._run_step('seniority', basic_salary=basic_salary, years_of_service=years)['seniority_bonus']
+
+    def social_contributions(self, gross_salary):
+        """CNSS (with ceiling), AMO and CIMR"""
+        amounts = self._run_step('social_contributions', gross_salary=gross_salary)
+        return amounts['cnss'], amounts['amo'], amounts['cimr']
+
+    def professional_expenses(self, gross_salary):
+        return self._run_step('professional_expenses', gross_salary=gross_salary)['professional_expenses']
+
+    def income_tax(self, net_taxable_salary, is_married=False, children=0):
+        """(gross IR, family allowance, net IR); net IR cannot be negative"""
+        amounts = self._run_step('income_tax', net_taxable_salary=net_taxable_salary,
+                                 is_married=is_married, number_of_children=children)
+        return amounts['gross_ir'], amounts['family_allowance'], amounts['net_ir']
+
+    def calculate(self, payroll_input):
+        """PayrollInput -> SimplePayrollResult"""
+        values = self.PIPELINE.run({
+            'basic_salary': payroll_input.salary,
+            'years_of_service': payroll_input.years_of_service,
+            'overtime_hours': Decimal(str(payroll_input.overtime_hours)),
+            'leave_allowance': Decimal(str(payroll_input.leave_allowance)),
+            'is_married': payroll_input.is_married,
+            'number_of_children': 0,
+            'advances': payroll_input.advances,
+        }, self)
+        return SimplePayrollResult(
+            employee_id=payroll_input.employee_id,
+            **{field.name: values[field.name] for field in fields(SimplePayrollResult)[1:]}
+        )
+
+
+class MoroccanPayrollKernel:
+    """
+    Configuration of MoroccanPayrollCalculator: constants, rates and
+    DETAILED_PIPELINE in Decimal
+    """
+
+    PIPELINE = DETAILED_PIPELINE
+
+    STANDARD_MONTHLY_HOURS = Decimal('191')
+    MAX_WORKING_DAYS = 26
+    HOURS_PER_WORKING_DAY = Decimal('7.3461538462')
+
+    # Overtime Rates
+    OVERTIME_REGULAR = Decimal('0.25')    # 25%
+    OVERTIME_WEEKEND = Decimal('0.50')    # 50%
+    OVERTIME_HOLIDAY = Decimal('1.00')    # 100%
+
+    # Professional Expenses Rates
+    PROFESSIONAL_EXPENSES_HIGH = Decimal('0.35')  # 35% if salary ≤ 6,500
+    PROFESSIONAL_EXPENSES_LOW = Decimal('0.25')   # 25% if salary > 6,500
+    PROFESSIONAL_EXPENSES_THRESHOLD = Decimal('6500')
+
+    # Income Tax Brackets
+    TAX_BRACKETS = [
+        {'min': Decimal('0'), 'max': Decimal('2500'), 'rate': Decimal('0'), 'deduction': Decimal('0')},
+        {'min': Decimal('2501'), 'max': Decimal('4166'), 'rate': Decimal('0.10'), 'deduction': Decimal('250')},
+        {'min': Decimal('4167'), 'max': Decimal('5000'), 'rate': Decimal('0.20'), 'deduction': Decimal('666.67')},
+        {'min': Decimal('5001'), 'max': Decimal('6666'), 'rate': Decimal('0.30'), 'deduction': Decimal('1166.67')},
+        {'min': Decimal('6667'), 'max': Decimal('15000'), 'rate': Decimal('0.34'), 'deduction': Decimal('1433.33')},
+        {'min': Decimal('15001'), 'max': Decimal('999999'), 'rate': Decimal('0.38'), 'deduction': Decimal('2033.33')},
+    ]
+
+    # Seniority Bonus Rates
+    SENIORITY_BRACKETS = [
+        {'min_years': 2, 'max_years': 4, 'rate': Decimal('0.05')},   # 5%
+        {'min_years': 5, 'max_years': 11, 'rate': Decimal('0.10')},  # 10%
+        {'min_years': 12, 'max_years': 19, 'rate': Decimal('0.15')}, # 15%
+        {'min_years': 20, 'max_years': 24, 'rate': Decimal('0.20')}, # 20%
+        {'min_years': 25, 'max_years': 99, 'rate': Decimal('0.25')}, # 25%
+    ]
+
+    # Bracket tables compiled once, looked up by bisection
+    TAX_TABLE = compile_tax_table(TAX_BRACKETS)
+    SENIORITY_TABLE = compile_seniority_table(SENIORITY_BRACKETS)
+
+    def __init__(self, rates=None):
+        self.rates = rates or PayrollRates()
+        self.tax_table = self.TAX_TABLE
+
+    def calculate(self, payroll_input):
+        """PayrollInput -> DetailedPayrollResult"""
+        years = payroll_input.years_of_service
+        values = self.PIPELINE.run({
+            'basic_salary': payroll_input.salary,
+            'days_worked': payroll_input.days_worked,
+            'attendance_holiday_days': payroll_input.attendance_holiday_days,
+            'leave_days': payroll_input.leave_days,
+            'holiday_days': payroll_input.holiday_days,
+            'worked_on_holidays': payroll_input.worked_on_holidays,
+            'regular_overtime_hours': payroll_input.regular_overtime_hours,
+            'weekend_overtime_hours': payroll_input.weekend_overtime_hours,
+            'holiday_overtime_hours': payroll_input.holiday_overtime_hours,
+            'years_of_service': years,
+            'is_married': payroll_input.is_married,
+            'number_of_children': 0,  # This could come from employee family data
+            'advances': payroll_input.advances,
+        }, self)
+
+        result = {field.name: values.get(field.name) for field in fields(DetailedPayrollResult)}
+        result.update(
+            years_of_service=years if years is not None else 0,
+            seniority_bonus_rate=values['seniority_rate'],
+            seniority_bonus_amount=values['seniority_bonus'],
+            gross_salary=_quantize(values['gross_salary']),
+            cnss_rate=self.rates.cnss_rate,
+            cnss_amount=values['cnss'],
+            amo_rate=self.rates.amo_rate,
+            amo_amount=values['amo'],
+            cimr_rate=self.rates.cimr_rate,
+            cimr_amount=values['cimr'],
+            professional_expenses_amount=values['professional_expenses'],
+            gross_ir=_quantize(values['gross_ir']),
+            family_allowance=_quantize(values['family_allowance']),
+            total_deductions=_quantize(values['total_deductions']),
+            net_salary=_quantize(values['net_salary']),
+            net_payable=_quantize(values['net_payable']),
+        )
+        return DetailedPayrollResult(**result)
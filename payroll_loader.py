@@ -0,0 +1,97 @@
+"""
+Payroll Input Loader
+Prefetches employees, active advances and existing payslips for a month
+with a fixed number of queries, so calculators never query per employee
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from models import Employee, PaySlip, Advance
+from payroll_config import get_payroll_rates
+from payroll_kernel import PayrollInput
+
+
+class PayrollInputs:
+    """Preloaded payroll inputs for one salary month, keyed by employee id"""
+
+    def __init__(self, salary_month, employees, advances, payslips, rates=None):
+        self.salary_month = salary_month
+        self.employees = employees
+        self.advances = advances
+        self.payslips = payslips
+        # One PayrollRates snapshot shared by every payslip of the run
+        self.rates = rates
+
+    def get_employee(self, employee_id):
+        return self.employees.get(employee_id)
+
+    def get_advances(self, employee_id):
+        return self.advances.get(employee_id, [])
+
+    def get_advance_total(self, employee_id):
+        """Sum of active advances, as a Decimal"""
+        return sum(
+            (Decimal(str(advance.amount)) for advance in self.get_advances(employee_id)),
+            Decimal('0')
+        )
+
+    def get_payroll_input(self, employee_id, **variable):
+        """Kernel input record; variable holds overtime, leave and attendance values"""
+        return PayrollInput.from_employee(
+            self.get_employee(employee_id), self.get_advance_total(employee_id), **variable
+        )
+
+    def get_payslip(self, employee_id):
+        return self.payslips.get(employee_id)
+
+    def add_payslip(self, payslip):
+        """Register a newly created payslip so later saves update it"""
+        self.payslips[payslip.employee_id] = payslip
+
+
+class PayrollInputLoader:
+    """
+    Loads everything a payroll run needs in three queries:
+    employees, active advances and the month's existing payslips,
+    plus the payroll rate snapshot
+    """
+
+    def __init__(self, salary_month, employee_ids=None, active_only=True, rates=None):
+        self.salary_month = salary_month
+        self.employee_ids = employee_ids
+        self.active_only = active_only
+        self.rates = rates
+
+    def _filter_employees(self, query):
+        """Apply the employee selection to a query joined on Employee"""
+        if self.active_only:
+            query = query.filter(Employee.is_active == 1)
+        if self.employee_ids is not None:
+            query = query.filter(Employee.id.in_(self.employee_ids))
+        return query
+
+    def load(self):
+        employees = {
+            employee.id: employee
+            for employee in self._filter_employees(Employee.query).order_by(Employee.id).all()
+        }
+
+        advances = defaultdict(list)
+        advance_query = self._filter_employees(
+            Advance.query.join(Employee, Advance.employee_id == Employee.id)
+        ).filter(Advance.status == 'active')
+        for advance in advance_query.all():
+            advances[advance.employee_id].append(advance)
+
+        payslip_query = self._filter_employees(
+            PaySlip.query.join(Employee, PaySlip.employee_id == Employee.id)
+        ).filter(PaySlip.salary_month == self.salary_month)
+        payslips = {payslip.employee_id: payslip for payslip in payslip_query.all()}
+
+        rates = self.rates or get_payroll_rates()
+        return PayrollInputs(self.salary_month, employees, dict(advances), payslips, rates)
+
+
+def load_payroll_inputs(salary_month, employee_ids=None, rates=None):
+    """Convenience function to prefetch payroll inputs for a month"""
+    return PayrollInputLoader(salary_month, employee_ids, rates=rates).load()
@@ -0,0 +1,267 @@
+"""
+Payroll Run Metrics
+Opt-in instrumentation of payroll runs: wall and CPU time, SQL queries and
+rows per step, collected into histograms. The summaries of the latest runs
+are kept in memory for the metrics endpoint.
+
+    with instrumented_run('payroll_batch', salary_month='03/2026'):
+        ...                                   # code calling timed()
+
+    @timed('calculator.save_payslip', rows=1)
+    def save_payslip(...): ...
+
+Outside an instrumented run, timed() costs one thread-local lookup.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+TIME_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+RECENT_RUN_COUNT = 20
+_recent_runs = deque(maxlen=RECENT_RUN_COUNT)
+_recent_lock = threading.Lock()
+
+# Active run of each thread (job threads run payrolls side by side)
+_local = threading.local()
+_listening = set()
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum, min and max"""
+
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, data):
+        """Add the observations of another histogram's to_dict()"""
+        if not data['count']:
+            return
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, data['buckets'])]
+        self.count += data['count']
+        self.total += data['sum']
+        self.min = data['min'] if self.min is None else min(self.min, data['min'])
+        self.max = data['max'] if self.max is None else max(self.max, data['max'])
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for the open bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': self.buckets,
+        }
+
+
+class StepStats:
+    """Histograms of one step name"""
+
+    __slots__ = ('wall', 'cpu', 'queries', 'rows')
+
+    def __init__(self):
+        self.wall = Histogram(TIME_BUCKETS)
+        self.cpu = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(COUNT_BUCKETS)
+        self.rows = Histogram(COUNT_BUCKETS)
+
+    def to_dict(self):
+        return {name: getattr(self, name).to_dict() for name in self.__slots__}
+
+
+class StepTiming:
+    """Handed to the body of timed(); set rows once the step knows how many it handled"""
+
+    __slots__ = ('rows',)
+
+    def __init__(self, rows=None):
+        self.rows = rows
+
+
+class PayrollRunMetrics:
+    """Step statistics of one payroll run"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.steps = {}
+        self.queries = 0
+        self.started_at = datetime.utcnow()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+
+    def record(self, name, wall, cpu, queries, rows=None):
+        stats = self.steps.get(name)
+        if stats is None:
+            stats = self.steps[name] = StepStats()
+        stats.wall.observe(wall)
+        stats.cpu.observe(cpu)
+        stats.queries.observe(queries)
+        if rows is not None:
+            stats.rows.observe(rows)
+
+    @contextmanager
+    def step(self, name, rows=None):
+        timing = StepTiming(rows)
+        queries = self.queries
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield timing
+        finally:
+            self.record(name, time.perf_counter() - wall, time.thread_time() - cpu,
+                        self.queries - queries, timing.rows)
+
+    def merge(self, summary):
+        """Add the steps of another run's summary, e.g. a worker process of a parallel run"""
+        self.queries += summary['queries']
+        for name, data in summary['steps'].items():
+            stats = self.steps.get(name)
+            if stats is None:
+                stats = self.steps[name] = StepStats()
+            for field in StepStats.__slots__:
+                getattr(stats, field).merge(data[field])
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = time.process_time() - self._cpu
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'labels': self.labels,
+            'started_at': self.started_at.isoformat(),
+            'wall_seconds': round(self.wall_seconds, 3) if self.wall_seconds is not None else None,
+            'cpu_seconds': round(self.cpu_seconds, 3) if self.cpu_seconds is not None else None,
+            'queries': self.queries,
+            'steps': {name: stats.to_dict() for name, stats in self.steps.items()},
+        }
+
+    def report(self):
+        """Text table of the steps, by total wall time"""
+        lines = [
+            f"{self.name} {self.labels}: {self.wall_seconds or 0:.3f}s wall, "
+            f"{self.cpu_seconds or 0:.3f}s CPU, {self.queries} queries",
+            f"  {'step':<40} {'calls':>8} {'wall s':>10} {'cpu s':>10} {'p95 s':>9} {'queries':>8} {'rows':>9}",
+        ]
+        for name, stats in sorted(self.steps.items(), key=lambda item: -item[1].wall.total):
+            lines.append(
+                f"  {name:<40} {stats.wall.count:>8} {stats.wall.total:>10.3f} {stats.cpu.total:>10.3f} "
+                f"{stats.wall.quantile(0.95):>9} {stats.queries.total:>8} {stats.rows.total:>9}"
+            )
+        return '\n'.join(lines)
+
+
+def current_metrics():
+    """Metrics of the run active on this thread, None when not instrumented"""
+    return getattr(_local, 'metrics', None)
+
+
+class _NoTiming:
+    """timed() outside an instrumented run: rows assignments are ignored"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_TIMING = _NoTiming()
+
+
+@contextmanager
+def timed(name, rows=None):
+    """Record a step of the active run; usable as a context manager or a decorator"""
+    metrics = current_metrics()
+    if metrics is None:
+        yield _NO_TIMING
+        return
+    with metrics.step(name, rows) as timing:
+        yield timing
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.queries += 1
+
+
+def _listen(engine):
+    """Count the statements of instrumented threads on this engine (registered once)"""
+    if id(engine) not in _listening:
+        event.listen(engine, 'before_cursor_execute', _count_query)
+        _listening.add(id(engine))
+
+
+@contextmanager
+def instrumented_run(name, enabled=True, **labels):
+    """
+    Collect metrics of the payroll run executed in this block
+
+    Yields the PayrollRunMetrics, or None when not enabled. On exit the
+    summary is logged and added to the recent runs.
+    """
+    if not enabled:
+        yield None
+        return
+
+    from database import db
+    _listen(db.engine)
+
+    metrics = PayrollRunMetrics(name, **labels)
+    previous = current_metrics()
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+        metrics.finish()
+        logger.info("Payroll run metrics\n%s", metrics.report())
+        with _recent_lock:
+            _recent_runs.append(metrics.summary())
+
+
+def recent_runs(limit=None):
+    """Summaries of the latest instrumented runs, most recent first"""
+    with _recent_lock:
+        runs = list(reversed(_recent_runs))
+    return runs[:limit] if limit else runs
@@ -0,0 +1,301 @@
+"""
+Parallel Payroll Executor
+Splits active employees into partitions (by branch, department or id range)
+and runs the batch payroll engine on each one in a separate process
+"""
+
+import math
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from database import db
+from models import Employee
+from payroll_aggregates import refresh_payroll_aggregates
+from payroll_config import get_payroll_rates
+from payroll_metrics import current_metrics, instrumented_run, timed
+from payroll_ytd import refresh_ytd_for_month
+
+PARTITION_STRATEGIES = ('branch', 'department', 'range')
+
+# Times a partition whose save failed is run again before it is reported unsaved
+PARTITION_RETRIES = 1
+
+
+class PayrollPartition:
+    """A group of employees calculated together in one worker process"""
+
+    def __init__(self, label, employee_ids):
+        self.label = label
+        self.employee_ids = employee_ids
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+
+class PayrollRunReport:
+    """
+    Merged results and errors of a partitioned payroll run
+
+    Partitions commit separately, so a run can end partial: the partitions
+    listed in failed_partitions kept their previous payslips.
+    """
+
+    def __init__(self, salary_month):
+        self.salary_month = salary_month
+        self.partitions = []
+        self.saved = 0
+        self.errors = []
+        self.elapsed_seconds = 0
+
+    def add_partition_result(self, result):
+        self.partitions.append(result)
+        self.saved += result['saved']
+        self.errors.extend(f"[{result['label']}] {error}" for error in result['errors'])
+
+    @property
+    def failed_partitions(self):
+        """Labels of the partitions left unsaved"""
+        return sorted(result['label'] for result in self.partitions if result['failed'])
+
+    @property
+    def unsaved_employees(self):
+        return sum(result['employees'] for result in self.partitions if result['failed'])
+
+    @property
+    def status(self):
+        """'completed', 'partial' when some partitions are unsaved, 'failed' when all of them are"""
+        failed = len(self.failed_partitions)
+        if not failed:
+            return 'completed'
+        return 'failed' if failed == len(self.partitions) else 'partial'
+
+    def to_dict(self):
+        return {
+            'salary_month': self.salary_month,
+            'status': self.status,
+            'saved': self.saved,
+            'failed_partitions': self.failed_partitions,
+            'unsaved_employees': self.unsaved_employees,
+            'error_count': len(self.errors),
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed_seconds, 3),
+            'partitions': sorted(self.partitions, key=lambda result: result['label']),
+        }
+
+
+def _split(label, employee_ids, max_size):
+    """Split an oversized group into contiguous id ranges of at most max_size"""
+    if len(employee_ids) <= max_size:
+        return [PayrollPartition(label, employee_ids)]
+    return [
+        PayrollPartition(f"{label}#{index + 1}", employee_ids[start:start + max_size])
+        for index, start in enumerate(range(0, len(employee_ids), max_size))
+    ]
+
+
+def plan_partitions(partition_by='branch', workers=1, employee_ids=None, branch_id=None):
+    """
+    Group active employees into partitions
+
+    Groups much larger than an even share of the workforce are split by id
+    range so one big branch does not leave the other workers idle.
+    """
+    if partition_by not in PARTITION_STRATEGIES:
+        raise ValueError(f"Unknown partition strategy: {partition_by}")
+
+    query = db.session.query(Employee.id, Employee.branch_id, Employee.department_id) \
+        .filter(Employee.is_active == 1)
+    if employee_ids is not None:
+        query = query.filter(Employee.id.in_(employee_ids))
+    if branch_id is not None:
+        query = query.filter(Employee.branch_id == branch_id)
+    rows = query.order_by(Employee.id).all()
+    if not rows:
+        return []
+
+    # Aim for about two partitions per worker so finished workers pick up the rest
+    max_size = max(1, math.ceil(len(rows) / (max(workers, 1) * 2)))
+
+    if partition_by == 'range':
+        return _split('ids', [row.id for row in rows], max_size)
+
+    groups = defaultdict(list)
+    for row in rows:
+        if partition_by == 'branch':
+            key = f"branch:{row.branch_id or '-'}"
+        else:
+            key = f"branch:{row.branch_id or '-'}/department:{row.department_id or '-'}"
+        groups[key].append(row.id)
+
+    partitions = []
+    for label, ids in sorted(groups.items()):
+        partitions.extend(_split(label, ids, max_size))
+    return partitions
+
+
+# Minimal app of a worker process, created by its first partition
+_worker_app = None
+
+
+def _get_worker_app():
+    """Settings and db only: workers skip the web app's routes and startup work"""
+    global _worker_app
+    if _worker_app is None:
+        from database import create_worker_app
+
+        _worker_app = create_worker_app()
+    return _worker_app
+
+
+def _run_partition(salary_month, label, employee_ids, overtime_hours, rates, dry_run, skip_unchanged=False,
+                   metrics=False):
+    """
+    Worker process entry point: calculate one partition with its own DB connection
+
+    With metrics, the partition's step metrics are returned for the parent run to merge.
+    """
+    from payroll_batch import BatchPayrollEngine, calculate_batch_payslips
+
+    started = time.perf_counter()
+    with _get_worker_app().app_context(), instrumented_run('payroll_partition', metrics, label=label) as run_metrics:
+        if dry_run:
+            engine = BatchPayrollEngine(salary_month, employee_ids, rates=rates)
+            engine.calculate(overtime_hours)
+            saved, errors = 0, engine.errors
+            failed = bool(errors)
+        else:
+            # Aggregates and the YTD ledger are refreshed once by the parent after every partition committed
+            saved, errors = calculate_batch_payslips(
+                salary_month, overtime_hours, employee_ids=employee_ids, rates=rates,
+                skip_unchanged=skip_unchanged, refresh_aggregates=False
+            )
+            # The partition is saved in one transaction: errors with nothing saved mean it was rolled back
+            failed = bool(errors) and not saved
+
+    result = {
+        'label': label,
+        'employees': len(employee_ids),
+        'saved': saved,
+        'failed': failed,
+        'errors': errors,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if run_metrics is not None:
+        result['metrics'] = run_metrics.summary()
+    return result
+
+
+class ParallelPayrollExecutor:
+    """
+    Runs a payroll month across several processes
+
+    Each partition is saved in its own transaction, so a failing partition
+    is rolled back without affecting the others. It is run again up to
+    `retries` times (its rollback leaves nothing to undo); a partition that
+    still fails leaves the month partially saved, which the report's status
+    and failed_partitions show. Running the month again completes it.
+    """
+
+    def __init__(self, salary_month, workers=None, partition_by='branch', retries=PARTITION_RETRIES):
+        self.salary_month = salary_month
+        self.workers = workers or multiprocessing.cpu_count()
+        self.partition_by = partition_by
+        self.retries = retries
+
+    def run(self, overtime_hours=None, employee_ids=None, branch_id=None, progress=None, dry_run=False,
+            skip_unchanged=False):
+        """
+        Calculate (and unless dry_run, save) every partition
+
+        Args:
+            overtime_hours: dict of employee id -> overtime hours
+            progress: optional JobProgress-like object, advanced per finished partition
+            skip_unchanged: leave payslips whose input fingerprint did not change
+
+        Returns:
+            PayrollRunReport
+        """
+        started = time.perf_counter()
+        report = PayrollRunReport(self.salary_month)
+        overtime_hours = overtime_hours or {}
+        metrics = current_metrics()
+
+        partitions = plan_partitions(self.partition_by, self.workers, employee_ids, branch_id)
+        # Every partition calculates with the same rate snapshot
+        rates = get_payroll_rates()
+        if progress:
+            progress.set_total(sum(len(partition) for partition in partitions))
+
+        # spawn gives every worker a fresh interpreter and connection pool
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            pending = partitions
+            for attempt in range(1, self.retries + 2):
+                futures = {
+                    pool.submit(
+                        _run_partition,
+                        self.salary_month,
+                        partition.label,
+                        partition.employee_ids,
+                        {employee_id: overtime_hours[employee_id]
+                         for employee_id in partition.employee_ids if employee_id in overtime_hours},
+                        rates,
+                        dry_run,
+                        skip_unchanged,
+                        metrics is not None
+                    ): partition
+                    for partition in pending
+                }
+                pending = []
+
+                for future in as_completed(futures):
+                    partition = futures[future]
+                    retry = attempt <= self.retries
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # A crashed worker breaks the pool, which takes no more partitions
+                        retry = retry and not isinstance(e, BrokenProcessPool)
+                        result = {
+                            'label': partition.label,
+                            'employees': len(partition),
+                            'saved': 0,
+                            'failed': True,
+                            'errors': [str(e)],
+                            'seconds': 0,
+                        }
+                    result['attempts'] = attempt
+                    partition_metrics = result.pop('metrics', None)
+                    if partition_metrics:
+                        metrics.merge(partition_metrics)
+                    if result['failed'] and retry:
+                        pending.append(partition)
+                        continue
+                    report.add_partition_result(result)
+                    if progress:
+                        progress.advance(len(partition))
+                        if result['errors']:
+                            progress.add_errors([f"[{result['label']}] {error}" for error in result['errors']])
+                if not pending:
+                    break
+
+        if not dry_run and partitions:
+            try:
+                refreshed_ids = None
+                if employee_ids is not None or branch_id is not None:
+                    refreshed_ids = [
+                        employee_id for partition in partitions for employee_id in partition.employee_ids
+                    ]
+                with timed('parallel.refresh_aggregates'):
+                    refresh_payroll_aggregates(self.salary_month)
+                with timed('parallel.refresh_ytd'):
+                    refresh_ytd_for_month(self.salary_month, refreshed_ids)
+            except Exception as e:
+                report.errors.append(f"Erreur de mise à jour des agrégats: {str(e)}")
+                if progress:
+                    progress.add_error(report.errors[-1])
+
+        report.elapsed_seconds = time.perf_counter() - started
+        return report
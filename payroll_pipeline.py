@@ -0,0 +1,282 @@
+"""
+Payroll Pipeline
+Payroll calculations declared as steps with explicit inputs and outputs.
+A run compiles an execution plan that leaves out the steps whose trigger
+inputs are all zero (leave, holidays, overtime...), and runs it either on one
+employee's Decimal values or on whole NumPy columns. The kernels in
+payroll_kernel are configurations of it.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from payroll_metrics import current_metrics
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+
+# Distance from a half-cent tie, in cents, within which float error can decide the rounding
+HALF_CENT_TOLERANCE = 1e-6
+
+
+def round_half_up(values, places=2):
+    """
+    Round float arrays half-up, like Decimal.quantize(ROUND_HALF_UP) does
+    everywhere except near a tie (see near_half_cent)
+    """
+    factor = 10 ** places
+    return np.sign(values) * np.floor(np.abs(values) * factor + 0.5) / factor
+
+
+def near_half_cent(values):
+    """Mask of the amounts too close to a half-cent tie for float rounding to match Decimal"""
+    fraction = np.abs(values) * 100 % 1
+    return np.abs(fraction - 0.5) < HALF_CENT_TOLERANCE
+
+
+def snap(values):
+    """Remove float noise before comparing amounts against bracket bounds"""
+    return np.round(values, 8)
+
+
+class DecimalOps:
+    """Arithmetic of a per-employee run: Decimal amounts, quantized to cents"""
+
+    vectorized = False
+    zero = ZERO
+
+    @staticmethod
+    def const(value):
+        return value
+
+    @staticmethod
+    def number(value):
+        """Input quantity (int, float or Decimal) as an exact Decimal"""
+        return Decimal(str(value))
+
+    @staticmethod
+    def quantize(amount):
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+    @staticmethod
+    def minimum(a, b):
+        return min(a, b)
+
+    @staticmethod
+    def maximum(a, b):
+        return max(a, b)
+
+    @staticmethod
+    def le(a, b):
+        return a <= b
+
+    @staticmethod
+    def where(condition, a, b):
+        return a if condition else b
+
+    @staticmethod
+    def lookup(table, key, field):
+        """Bracket constant for key, None without a key or a matching bracket"""
+        if key is None:
+            return None
+        bracket = table.lookup(key)
+        return bracket[field] if bracket else None
+
+    @staticmethod
+    def apply_rate(amount, rate, deduction=None):
+        """amount * rate - deduction, zero when the lookup found no bracket"""
+        if rate is None:
+            return ZERO
+        amount = amount * rate
+        return amount - deduction if deduction is not None else amount
+
+    @staticmethod
+    def coalesce(value):
+        return ZERO if value is None else value
+
+    @staticmethod
+    def any_nonzero(value):
+        return value != 0
+
+
+class ArrayOps:
+    """Arithmetic of a vectorized run: float columns, rounded half-up to cents"""
+
+    vectorized = True
+    zero = 0.0
+
+    @staticmethod
+    def const(value):
+        return float(value)
+
+    @staticmethod
+    def number(value):
+        return np.asarray(value, dtype=float)
+
+    @staticmethod
+    def quantize(amount):
+        return round_half_up(amount)
+
+    @staticmethod
+    def minimum(a, b):
+        return np.where(snap(a) >= snap(b), b, a)
+
+    @staticmethod
+    def maximum(a, b):
+        return np.maximum(a, b)
+
+    @staticmethod
+    def le(a, b):
+        return snap(a) <= snap(b)
+
+    @staticmethod
+    def where(condition, a, b):
+        return np.where(condition, a, b)
+
+    @staticmethod
+    def lookup(table, key, field):
+        """Bracket constant per key; 0 below the first bracket (years of service -1 when unknown)"""
+        return table.lookup_array(snap(key), field)
+
+    @staticmethod
+    def apply_rate(amount, rate, deduction=None):
+        amount = amount * rate
+        return amount - deduction if deduction is not None else amount
+
+    @staticmethod
+    def coalesce(value):
+        return value
+
+    @staticmethod
+    def any_nonzero(value):
+        return bool(np.any(np.asarray(value) != 0))
+
+
+DECIMAL = DecimalOps()
+ARRAYS = ArrayOps()
+
+
+class PayrollStep:
+    """
+    One calculation step
+
+    func(values, ops, config) returns a dict with exactly the declared
+    outputs. A step with skip_unless inputs is left out of the plan when all
+    of them are zero; it must then produce zero for every output.
+    """
+
+    __slots__ = ('name', 'func', 'inputs', 'outputs', 'skip_unless')
+
+    def __init__(self, name, func, inputs, outputs, skip_unless=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.skip_unless = tuple(skip_unless)
+
+    def __repr__(self):
+        return f"PayrollStep({self.name}: {', '.join(self.inputs)} -> {', '.join(self.outputs)})"
+
+
+class ExecutionPlan:
+    """The steps of a pipeline that run for one combination of trigger inputs"""
+
+    __slots__ = ('name', 'steps', 'skipped')
+
+    def __init__(self, name, steps, skipped):
+        self.name = name
+        self.steps = steps
+        self.skipped = skipped
+
+    def run(self, values, ops, config):
+        """Fill values with the outputs of every step; skipped outputs are zero"""
+        for step in self.skipped:
+            for output in step.outputs:
+                values[output] = ops.zero
+        metrics = current_metrics()
+        if metrics is None:
+            for step in self.steps:
+                values.update(step.func(values, ops, config))
+            return values
+        # Instrumented run (see payroll_metrics): one timing per step
+        for step in self.steps:
+            with metrics.step(f"pipeline.{self.name}.{step.name}"):
+                values.update(step.func(values, ops, config))
+        return values
+
+
+class PayrollPipeline:
+    """
+    Ordered steps over a declared set of inputs
+
+    Steps are checked once, when the pipeline is built: every input must be
+    a pipeline input or the output of an earlier step, and no value may be
+    produced twice. Plans are compiled once per combination of skipped steps.
+    """
+
+    def __init__(self, name, inputs, steps):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.steps = list(steps)
+        self.outputs = self._check()
+        self.optional_steps = [step for step in self.steps if step.skip_unless]
+        self._plans = {}
+
+    def _check(self):
+        available = set(self.inputs)
+        for step in self.steps:
+            missing = [name for name in step.inputs if name not in available]
+            if missing:
+                raise ValueError(f"{self.name}: step {step.name} needs {', '.join(missing)} before it runs")
+            if not set(step.skip_unless) <= set(step.inputs):
+                raise ValueError(f"{self.name}: step {step.name} can only be skipped on its own inputs")
+            produced = available.intersection(step.outputs)
+            if produced:
+                raise ValueError(f"{self.name}: step {step.name} produces {', '.join(sorted(produced))} again")
+            available.update(step.outputs)
+        return available - set(self.inputs)
+
+    def step(self, name):
+        return next(step for step in self.steps if step.name == name)
+
+    def compile(self, values, ops):
+        """Execution plan for these input values (cached per skipped-step combination)"""
+        key = tuple(
+            any(ops.any_nonzero(values[name]) for name in step.skip_unless)
+            for step in self.optional_steps
+        )
+        plan = self._plans.get(key)
+        if plan is None:
+            active = dict(zip((step.name for step in self.optional_steps), key))
+            plan = ExecutionPlan(
+                self.name,
+                [step for step in self.steps if active.get(step.name, True)],
+                [step for step in self.steps if not active.get(step.name, True)],
+            )
+            self._plans[key] = plan
+        return plan
+
+    def run(self, values, config, ops=DECIMAL):
+        """
+        Run the pipeline on a dict of input values
+
+        Args:
+            values: the pipeline inputs, scalars for one employee or arrays
+            config: object holding the constants, rates and bracket tables
+            ops: DECIMAL for one employee, ARRAYS for columns
+
+        Returns:
+            dict: inputs and every step output
+        """
+        missing = [name for name in self.inputs if name not in values]
+        if missing:
+            raise ValueError(f"{self.name}: missing inputs {', '.join(missing)}")
+        values = dict(values)
+        return self.compile(values, ops).run(values, ops, config)
+
+
+def step(inputs, outputs, skip_unless=(), name=None):
+    """Declare a function as a PayrollStep"""
+    def declare(func):
+        return PayrollStep(name or func.__name__, func, inputs, outputs, skip_unless)
+    return declare
@@ -0,0 +1,160 @@
+"""
+Payroll Simulation
+What-if payroll runs with rate or tax bracket overrides, calculated in memory
+with the vectorized engine; nothing is saved
+"""
+
+from models import Branch
+from payroll_batch import BatchPayrollEngine
+from payroll_brackets import compile_tax_table
+from payroll_loader import PayrollInputLoader
+
+# Result columns summed per scenario and per branch
+SIMULATION_TOTALS = [
+    'gross_salary', 'cnss', 'amo', 'cimr', 'net_ir', 'net_salary', 'net_payble',
+]
+
+BASELINE = 'baseline'
+
+
+class PayrollScenario:
+    """
+    A named set of overrides
+
+    Args:
+        rates: dict of payroll rate overrides, e.g. {'cimr_rate': '0.08'}
+        tax_brackets: full replacement IR scale, same layout as TAX_BRACKETS
+    """
+
+    def __init__(self, name, rates=None, tax_brackets=None):
+        self.name = name
+        self.rates = rates or {}
+        self.tax_brackets = tax_brackets
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get('name'):
+            raise ValueError("Scenario name required")
+        if data['name'] == BASELINE:
+            raise ValueError(f"Scenario name '{BASELINE}' is reserved")
+        return cls(data['name'], data.get('rates'), data.get('tax_brackets'))
+
+
+class PayrollSimulator:
+    """
+    Runs several scenarios over one load of the month's inputs
+
+    Every scenario is compared with a baseline calculated with the current
+    rates and IR scale, for the whole company and per branch.
+    """
+
+    def __init__(self, salary_month, employee_ids=None):
+        self.salary_month = salary_month
+        self.employee_ids = employee_ids
+        self.inputs = None
+        self.input_frame = None
+
+    def load_inputs(self):
+        loader = PayrollInputLoader(self.salary_month, self.employee_ids)
+        self.inputs = loader.load()
+        engine = BatchPayrollEngine(self.salary_month, inputs=self.inputs)
+        self.input_frame = engine.load_inputs()
+        return self.inputs
+
+    def _calculate(self, scenario=None):
+        """Calculate one scenario from the shared input frame"""
+        rates = self.inputs.rates
+        tax_table = None
+        if scenario is not None:
+            if scenario.rates:
+                rates = rates.with_overrides(scenario.rates, version=f"simulation:{scenario.name}")
+            if scenario.tax_brackets:
+                tax_table = compile_tax_table(scenario.tax_brackets)
+
+        engine = BatchPayrollEngine(self.salary_month, inputs=self.inputs, rates=rates, tax_table=tax_table)
+        engine.input_frame = self.input_frame
+        return engine.calculate()
+
+    @staticmethod
+    def _totals(results):
+        totals = {column: round(float(results[column].sum()), 2) for column in SIMULATION_TOTALS}
+        totals['employees'] = int(len(results))
+        return totals
+
+    @staticmethod
+    def _branch_totals(results):
+        by_branch = results.assign(branch_id=results['branch_id'].fillna(0).astype(int)) \
+            .groupby('branch_id')[SIMULATION_TOTALS].sum()
+        return {
+            int(branch_id): {column: round(float(row[column]), 2) for column in SIMULATION_TOTALS}
+            for branch_id, row in by_branch.iterrows()
+        }
+
+    @staticmethod
+    def _delta(totals, baseline):
+        return {
+            column: round(totals[column] - baseline.get(column, 0), 2)
+            for column in SIMULATION_TOTALS
+        }
+
+    def run(self, scenarios):
+        """
+        Calculate the baseline and every scenario
+
+        Args:
+            scenarios: list of PayrollScenario
+
+        Returns:
+            dict: baseline and per-scenario totals, branch totals and deltas
+        """
+        if self.inputs is None:
+            self.load_inputs()
+
+        baseline_results = self._calculate()
+        baseline_totals = self._totals(baseline_results)
+        baseline_branches = self._branch_totals(baseline_results)
+        branch_names = {branch.id: branch.name for branch in Branch.query.all()}
+
+        report = {
+            'salary_month': self.salary_month,
+            'config_version': self.inputs.rates.version,
+            BASELINE: {
+                'totals': baseline_totals,
+                'branches': self._with_names(baseline_branches, branch_names),
+            },
+            'scenarios': [],
+        }
+
+        for scenario in scenarios:
+            results = self._calculate(scenario)
+            totals = self._totals(results)
+            branches = self._branch_totals(results)
+            report['scenarios'].append({
+                'name': scenario.name,
+                'rates': {key: str(value) for key, value in scenario.rates.items()},
+                'tax_brackets': scenario.tax_brackets,
+                'totals': totals,
+                'delta': self._delta(totals, baseline_totals),
+                'branches': self._with_names({
+                    branch_id: dict(branch_totals, delta=self._delta(branch_totals, baseline_branches.get(branch_id, {})))
+                    for branch_id, branch_totals in branches.items()
+                }, branch_names),
+            })
+
+        return report
+
+    @staticmethod
+    def _with_names(branches, branch_names):
+        return [
+            dict(totals, branch_id=branch_id or None, branch_name=branch_names.get(branch_id, 'Sans agence'))
+            for branch_id, totals in sorted(branches.items())
+        ]
+
+
+def simulate_payroll(salary_month, scenarios, employee_ids=None):
+    """Convenience function: scenarios may be PayrollScenario objects or dicts"""
+    scenarios = [
+        scenario if isinstance(scenario, PayrollScenario) else PayrollScenario.from_dict(scenario)
+        for scenario in scenarios
+    ]
+    return PayrollSimulator(salary_month, employee_ids).run(scenarios)
@@ -0,0 +1,126 @@
+"""
+Year-to-Date Payroll Ledger
+One payroll_ytd row per employee and year with the cumulative amounts
+needed for annual IR regularisation, CNSS statements and YTD figures,
+recomputed from the year's payslips whenever they are saved
+"""
+
+from datetime import date
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import PaySlip, PayrollYtd
+from payslip_lines import line_totals
+
+# Ledger column -> payslip line component summed into it (see payslip_lines)
+LINE_TOTALS = {
+    'gross_salary': 'gross_salary',
+    'cnss': 'cnss',
+    'amo': 'amo',
+    'cimr': 'cimr',
+    'professional_expenses': 'professional_expenses',
+    'net_taxable_salary': 'net_taxable_salary',
+    'net_ir': 'net_ir',
+}
+
+LEDGER_COLUMNS = ['months', 'last_period', 'basic_salary'] + list(LINE_TOTALS) + ['net_payable', 'updated_at']
+
+
+def salary_month_period(salary_month):
+    """
+    First day of a salary month, None for anything else
+
+    Accepts 'MM/YYYY' (the stored label) and 'YYYY-MM' (what
+    <input type="month"> submits).
+    """
+    try:
+        if '-' in salary_month:
+            year, month = salary_month.split('-')
+        else:
+            month, year = salary_month.split('/')
+        return date(int(year), int(month), 1)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_salary_month(salary_month):
+    """Salary month as the 'MM/YYYY' label payslips are stored under, None when invalid"""
+    period = salary_month_period(salary_month)
+    return period.strftime('%m/%Y') if period else None
+
+
+def refresh_payroll_ytd(year, employee_ids=None, commit=True):
+    """
+    Recompute ledger rows of a year from its payslips
+
+    Args:
+        employee_ids: only these employees; everyone with a payslip in the year when None
+        commit: commit once the rows are written; batch runs pass False to
+            update the ledger in the transaction that writes the payslips
+
+    Returns:
+        int: number of ledger rows written
+    """
+    criteria = [PaySlip.period >= date(year, 1, 1), PaySlip.period < date(year + 1, 1, 1)]
+    if employee_ids is not None:
+        if not employee_ids:
+            return 0
+        criteria.append(PaySlip.employee_id.in_(employee_ids))
+
+    lines = line_totals(LINE_TOTALS, *criteria)
+    totals = select(
+        PaySlip.employee_id,
+        literal(year),
+        func.count(PaySlip.id),
+        func.max(PaySlip.period),
+        func.coalesce(func.sum(PaySlip.basic_salary), 0),
+        *[func.coalesce(func.sum(getattr(lines.c, column)), 0) for column in LINE_TOTALS],
+        func.coalesce(func.sum(PaySlip.net_payble), 0),
+        func.now(),
+    ).select_from(PaySlip) \
+        .outerjoin(lines, lines.c.payslip_id == PaySlip.id) \
+        .where(*criteria) \
+        .group_by(PaySlip.employee_id)
+
+    statement = insert(PayrollYtd).from_select(['employee_id', 'year'] + LEDGER_COLUMNS, totals)
+    statement = statement.on_conflict_do_update(
+        index_elements=['employee_id', 'year'],
+        set_={column: statement.excluded[column] for column in LEDGER_COLUMNS}
+    )
+
+    try:
+        written = db.session.execute(statement).rowcount
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return written
+
+
+def refresh_ytd_for_month(salary_month, employee_ids=None, commit=True):
+    """Refresh the ledger year of a salary month; months without a period are ignored"""
+    period = salary_month_period(salary_month)
+    if period is None:
+        return 0
+    return refresh_payroll_ytd(period.year, employee_ids, commit)
+
+
+def get_employee_ytd(employee_id, year):
+    """Ledger row of an employee and year, None before their first payslip"""
+    return PayrollYtd.query.filter_by(employee_id=employee_id, year=year).first()
+
+
+def annual_ledger(year):
+    """Every ledger row of a year, by employee"""
+    return PayrollYtd.query.filter_by(year=year).order_by(PayrollYtd.employee_id).all()
+
+
+def ledger_to_dict(row):
+    return {
+        'employee_id': row.employee_id,
+        'year': row.year,
+        'months': row.months,
+        'last_period': row.last_period.isoformat() if row.last_period else None,
+        **{column: float(getattr(row, column)) for column in ['basic_salary'] + list(LINE_TOTALS) + ['net_payable']},
+    }
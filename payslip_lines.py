@@ -0,0 +1,226 @@
+"""
+Payslip Line Items
+The full breakdown of a payslip stored as one pay_slip_lines row per
+component, so views and reports read it instead of recomputing payslips
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import Employee, PaySlip, PaySlipLine
+from payroll_pipeline import CENT
+
+ZERO = Decimal('0')
+
+# code -> (label, kind), in payslip display order. 'detail' lines explain the IR
+# base and are not paid or withheld themselves. Lines are left out when zero,
+# except 'total' lines which are always kept.
+COMPONENTS = {
+    'basic_salary': ('Salaire de base', 'total'),
+    'monthly_salary': ('Salaire du mois', 'earning'),
+    'paid_leave': ('Congés payés', 'earning'),
+    'paid_holiday': ('Jours fériés payés', 'earning'),
+    'overtime_regular': ('Heures supplémentaires 25%', 'earning'),
+    'overtime_weekend': ('Heures supplémentaires 50%', 'earning'),
+    'overtime_holiday': ('Heures supplémentaires 100%', 'earning'),
+    'overtime': ('Heures supplémentaires', 'earning'),
+    'seniority_bonus': ('Prime d\'ancienneté', 'earning'),
+    'leave_allowance': ('Indemnité de congé', 'earning'),
+    'gross_salary': ('Salaire brut', 'total'),
+    'cnss': ('CNSS', 'deduction'),
+    'amo': ('AMO', 'deduction'),
+    'cimr': ('CIMR', 'deduction'),
+    'professional_expenses': ('Frais professionnels', 'detail'),
+    'net_taxable_salary': ('Salaire net imposable', 'total'),
+    'gross_ir': ('IR brut', 'detail'),
+    'family_allowance': ('Déduction charges de famille', 'detail'),
+    'net_ir': ('IR net', 'deduction'),
+    'advances': ('Avances', 'deduction'),
+    'loans': ('Prêts', 'deduction'),
+    'total_deductions': ('Total retenues', 'total'),
+    'net_salary': ('Salaire net', 'total'),
+    'net_payable': ('Net à payer', 'total'),
+}
+
+POSITIONS = {code: position for position, code in enumerate(COMPONENTS)}
+
+
+def _quantize(amount):
+    return Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def build_lines(values):
+    """
+    Line dicts from component values
+
+    Args:
+        values: dict of component code -> amount, or (amount, rate, quantity)
+
+    Returns:
+        list of dicts with component, position, amount, rate and quantity
+    """
+    lines = []
+    for code, value in values.items():
+        amount, rate, quantity = value if isinstance(value, tuple) else (value, None, None)
+        amount = _quantize(amount)
+        if amount == ZERO and COMPONENTS[code][1] != 'total':
+            continue
+        lines.append({
+            'component': code,
+            'position': POSITIONS[code],
+            'amount': amount,
+            'rate': rate,
+            'quantity': _quantize(quantity) if quantity is not None else None,
+        })
+    return lines
+
+
+def detailed_lines(result):
+    """Lines of a payroll_kernel.DetailedPayrollResult"""
+    return build_lines({
+        'basic_salary': result.basic_salary,
+        'monthly_salary': (result.monthly_salary, None, result.days_worked),
+        'paid_leave': (result.paid_leave_amount, None, result.leave_days),
+        'paid_holiday': (result.paid_holiday_amount, None, result.holiday_days),
+        'overtime_regular': (result.overtime_regular_amount, None, result.overtime_regular_hours),
+        'overtime_weekend': (result.overtime_weekend_amount, None, result.overtime_weekend_hours),
+        'overtime_holiday': (result.overtime_holiday_amount, None, result.overtime_holiday_hours),
+        'seniority_bonus': (result.seniority_bonus_amount, result.seniority_bonus_rate, result.years_of_service),
+        'gross_salary': result.gross_taxable_salary,
+        'cnss': (result.cnss_amount, result.cnss_rate, None),
+        'amo': (result.amo_amount, result.amo_rate, None),
+        'cimr': (result.cimr_amount, result.cimr_rate, None),
+        'professional_expenses': (result.professional_expenses_amount, result.professional_expenses_rate, None),
+        'net_taxable_salary': result.net_taxable_salary,
+        'gross_ir': result.gross_ir,
+        'family_allowance': result.family_allowance,
+        'net_ir': result.net_ir,
+        'advances': result.advance_payments,
+        'loans': result.loans,
+        'total_deductions': result.total_deductions,
+        'net_salary': result.net_salary,
+        'net_payable': result.net_payable,
+    })
+
+
+def simple_lines(result, rates=None, overtime_hours=None):
+    """Lines of a payroll_kernel.SimplePayrollResult; rates add the contribution rates"""
+    return build_lines({
+        'basic_salary': result.basic_salary,
+        'overtime': (result.overtime_amount, None, overtime_hours),
+        'seniority_bonus': (result.seniority_bonus, None, result.years_of_service),
+        'leave_allowance': result.leave_allowance,
+        'gross_salary': result.gross_salary,
+        'cnss': (result.cnss, rates.cnss_rate if rates else None, None),
+        'amo': (result.amo, rates.amo_rate if rates else None, None),
+        'cimr': (result.cimr, rates.cimr_rate if rates else None, None),
+        'professional_expenses': result.professional_expenses,
+        'net_taxable_salary': result.net_taxable_salary,
+        'gross_ir': result.gross_ir,
+        'family_allowance': result.family_allowance,
+        'net_ir': result.net_ir,
+        'advances': result.advances,
+        'total_deductions': result.total_deductions,
+        'net_salary': result.net_salary,
+        'net_payable': result.net_payable,
+    })
+
+
+def set_payslip_lines(payslip, lines):
+    """
+    Replace the lines of an ORM payslip
+
+    Lines of components already on the payslip are updated in place: the
+    unit of work inserts new rows before deleting orphans, which would
+    collide on the (payslip_id, component) key.
+    """
+    existing = {line.component: line for line in payslip.lines}
+    updated = []
+    for values in lines:
+        line = existing.get(values['component'])
+        if line is None:
+            line = PaySlipLine(**values)
+        else:
+            for key, value in values.items():
+                setattr(line, key, value)
+        updated.append(line)
+    # Lines no longer produced are removed by the delete-orphan cascade
+    payslip.lines = updated
+
+
+def replace_lines(payslip_ids, lines_by_employee):
+    """
+    Replace the lines of many payslips in the current transaction
+
+    Args:
+        payslip_ids: dict of employee id -> payslip id
+        lines_by_employee: dict of employee id -> list of line dicts
+
+    Returns:
+        int: number of lines written
+    """
+    ids = [payslip_ids[employee_id] for employee_id in lines_by_employee if employee_id in payslip_ids]
+    if not ids:
+        return 0
+    db.session.execute(delete(PaySlipLine.__table__).where(PaySlipLine.payslip_id.in_(ids)))
+
+    values = [
+        {**line, 'payslip_id': payslip_ids[employee_id]}
+        for employee_id, lines in lines_by_employee.items() if employee_id in payslip_ids
+        for line in lines
+    ]
+    if values:
+        db.session.execute(insert(PaySlipLine.__table__).values(values))
+    return len(values)
+
+
+def line_totals(columns, *criteria):
+    """
+    Subquery with one row per payslip and the given components pivoted into columns
+
+    Args:
+        columns: dict of output column -> component code
+        criteria: filters on PaySlip selecting the payslips
+    """
+    return select(
+        PaySlipLine.payslip_id,
+        *[
+            func.sum(case((PaySlipLine.component == component, PaySlipLine.amount), else_=0)).label(column)
+            for column, component in columns.items()
+        ]
+    ).join(PaySlip, PaySlipLine.payslip_id == PaySlip.id) \
+        .where(PaySlipLine.component.in_(list(columns.values())), *criteria) \
+        .group_by(PaySlipLine.payslip_id).subquery()
+
+
+GROUP_COLUMNS = {
+    'branch': Employee.branch_id,
+    'department': Employee.department_id,
+}
+
+
+def component_totals(salary_month, group_by='branch', components=None):
+    """
+    Sum of each payslip component for a month, per branch or department
+
+    One aggregate query over pay_slip_lines; nothing is recomputed.
+
+    Returns:
+        dict of group id -> {component: total}
+    """
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"Unknown grouping: {group_by}")
+    group_column = GROUP_COLUMNS[group_by]
+
+    query = db.session.query(group_column, PaySlipLine.component, func.sum(PaySlipLine.amount)) \
+        .join(PaySlip, PaySlipLine.payslip_id == PaySlip.id) \
+        .join(Employee, PaySlip.employee_id == Employee.id) \
+        .filter(PaySlip.salary_month == salary_month)
+    if components:
+        query = query.filter(PaySlipLine.component.in_(components))
+
+    totals = {}
+    for group_id, component, total in query.group_by(group_column, PaySlipLine.component).all():
+        totals.setdefault(group_id, {})[component] = total
+    return totals
@@ -0,0 +1,93 @@
+"""
+Bulk PaySlip Persistence
+Writes a whole payroll run with multi-row INSERT ... ON CONFLICT DO UPDATE
+statements inside a single transaction, together with each payslip's lines
+"""
+
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import PaySlip
+from payslip_lines import replace_lines
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns that identify a payslip; everything else is overwritten on conflict
+CONFLICT_COLUMNS = ['employee_id', 'salary_month']
+
+# Columns kept from the first insert when a payslip is recalculated
+INSERT_ONLY_COLUMNS = ['id', 'created_by', 'created_at']
+
+
+def _chunks(rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+def bulk_upsert_payslips(rows, chunk_size=None, commit=True, on_chunk=None, lines=None):
+    """
+    Insert or update many payslips at once
+
+    Args:
+        rows: list of dicts with employee_id, salary_month and PaySlip columns
+        chunk_size: rows per INSERT statement (defaults to PAYSLIP_UPSERT_CHUNK_SIZE)
+        commit: commit the transaction once every chunk succeeded
+        on_chunk: optional callback receiving the row count of each written chunk
+        lines: optional dict of employee id -> payslip line dicts (see payslip_lines);
+            the lines of every written payslip are replaced
+
+    Returns:
+        int: number of rows written
+
+    Either every row is written or, on any error, none are: the transaction
+    is rolled back and the exception re-raised.
+    """
+    if not rows:
+        return 0
+
+    if chunk_size is None:
+        chunk_size = current_app.config.get('PAYSLIP_UPSERT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    table = PaySlip.__table__
+    now = datetime.utcnow()
+    defaults = {'status': 1, 'created_by': 1, 'created_at': now, 'updated_at': now}
+    update_columns = [
+        column.name for column in table.columns
+        if column.name not in CONFLICT_COLUMNS + INSERT_ONLY_COLUMNS
+    ]
+
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            values = [{**defaults, **row} for row in chunk]
+            # Multi-row VALUES needs the same keys on every row
+            columns = set().union(*values)
+            values = [{column: row.get(column) for column in columns} for row in values]
+
+            statement = insert(table).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=CONFLICT_COLUMNS,
+                set_={
+                    column: statement.excluded[column]
+                    for column in update_columns if column in columns
+                }
+            )
+            if lines is None:
+                db.session.execute(statement)
+            else:
+                written = db.session.execute(statement.returning(table.c.employee_id, table.c.id))
+                payslip_ids = {employee_id: payslip_id for employee_id, payslip_id in written}
+                replace_lines(payslip_ids, {
+                    row['employee_id']: lines[row['employee_id']]
+                    for row in chunk if row['employee_id'] in lines
+                })
+            if on_chunk:
+                on_chunk(len(chunk))
+
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(rows)
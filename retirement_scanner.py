@@ -0,0 +1,97 @@
+"""
+Retirement Scanner
+Finds employees reaching retirement age within a notification window with
+one query and records their RetirementEvent rows in bulk, outside payroll
+"""
+
+import calendar
+from datetime import date, timedelta
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import Employee, RetirementEvent
+
+RETIREMENT_AGE = 60
+NOTIFICATION_WINDOW_DAYS = 60
+
+
+def add_years(day, years):
+    """Same calendar day `years` later (or earlier); Feb 29 falls back to Feb 28"""
+    year = day.year + years
+    if day.month == 2 and day.day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return day.replace(year=year)
+
+
+class RetirementScanner:
+    """
+    Creates retirement events for active employees whose retirement date
+    falls between today and today + window_days
+    """
+
+    def __init__(self, retirement_age=RETIREMENT_AGE, window_days=NOTIFICATION_WINDOW_DAYS, today=None):
+        self.retirement_age = retirement_age
+        self.window_days = window_days
+        self.today = today or date.today()
+
+    def retirement_date(self, date_of_birth):
+        return add_years(date_of_birth, self.retirement_age)
+
+    def find_candidates(self):
+        """
+        Active employees retiring within the window, as (employee_id, retirement_date)
+
+        The date_of_birth range is widened by a day on each side so Feb 29
+        birthdays are never missed; exact dates are checked afterwards.
+        """
+        window_end = self.today + timedelta(days=self.window_days)
+        earliest_birth = add_years(self.today, -self.retirement_age) - timedelta(days=1)
+        latest_birth = add_years(window_end, -self.retirement_age) + timedelta(days=1)
+
+        rows = db.session.query(Employee.id, Employee.date_of_birth).filter(
+            Employee.is_active == 1,
+            Employee.date_of_birth.between(earliest_birth, latest_birth)
+        ).all()
+
+        candidates = []
+        for employee_id, date_of_birth in rows:
+            retirement_date = self.retirement_date(date_of_birth)
+            if self.today <= retirement_date <= window_end:
+                candidates.append((employee_id, retirement_date))
+        return candidates
+
+    def scan(self, commit=True):
+        """
+        Insert the missing retirement events
+
+        Returns:
+            int: number of events created
+        """
+        rows = [
+            {
+                'employee_id': employee_id,
+                'retirement_date': retirement_date,
+                'notification_date': self.today,
+                'status': 'scheduled',
+                'notes': f"Employee approaching retirement in {(retirement_date - self.today).days} days",
+            }
+            for employee_id, retirement_date in self.find_candidates()
+        ]
+        if not rows:
+            return 0
+
+        statement = insert(RetirementEvent).values(rows).on_conflict_do_nothing(
+            index_elements=['employee_id', 'retirement_date']
+        )
+        try:
+            created = db.session.execute(statement).rowcount
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return created
+
+
+def scan_retirements(window_days=NOTIFICATION_WINDOW_DAYS, today=None):
+    """Convenience function to create upcoming retirement events"""
+    return RetirementScanner(window_days=window_days, today=today).scan()
@@ -1,4 +1,4 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, send_file, Response
 import csv
 import io
 from werkzeug.utils import secure_filename
@@ -7,7 +7,7 @@ from app import app, db
 from models import (
     User, Branch, Department, Designation, Employee, AttendanceEmployee, 
     AllowanceOption, DeductionOption, PaySlip, EmergencyContact, 
-    EmployeeDocument, PerformanceReview, LeaveRequest, EmployeeTraining
+    EmployeeDocument, PerformanceReview, LeaveRequest, EmployeeTraining, BackgroundJob
 )
 from forms import (
     BranchForm, DepartmentForm, DesignationForm, EmployeeForm, 
@@ -15,7 +15,9 @@ from forms import (
     PerformanceReviewForm, LeaveRequestForm, TrainingForm
 )
 from datetime import datetime, timedelta
+from decimal import Decimal
 from sqlalchemy import func, extract
+from sqlalchemy.exc import IntegrityError
 
 @app.route('/')
 def index():
@@ -28,9 +30,10 @@ def index():
     today = datetime.now().date()
     present_today = AttendanceEmployee.query.filter_by(date=today, status='present').count()
     
-    # Recent pay slips
+    # Recent pay slips, from the monthly payroll aggregates
+    from payroll_aggregates import month_totals
     current_month = datetime.now().strftime('%m/%Y')
-    payroll_this_month = PaySlip.query.filter_by(salary_month=current_month).count()
+    payroll_this_month = month_totals(current_month)['headcount']
     
     # Current date for display
     current_date = datetime.now().strftime('%d/%m/%Y')
@@ -685,22 +688,41 @@ def attendance_create():
         overtime = datetime.strptime('00:00:00', '%H:%M:%S').time()
         total_rest = datetime.strptime('00:00:00', '%H:%M:%S').time()
         
-        attendance = AttendanceEmployee(
-            employee_id=form.employee_id.data,
-            date=form.date.data,
-            status=form.status.data,
-            hs='8',  # Default 8 hours
-            clock_in=form.clock_in.data,
-            clock_out=form.clock_out.data,
-            late=late,
-            early_leaving=early_leaving,
-            overtime=overtime,
-            total_rest=total_rest,
-            created_by=1
-        )
-        db.session.add(attendance)
-        db.session.commit()
-        flash('Présence enregistrée avec succès!', 'success')
+        values = {
+            'status': form.status.data,
+            'hs': '8',  # Default 8 hours
+            'clock_in': form.clock_in.data,
+            'clock_out': form.clock_out.data,
+            'late': late,
+            'early_leaving': early_leaving,
+            'overtime': overtime,
+            'total_rest': total_rest,
+        }
+        # One row per employee and day (imported exports create most of them): update it
+        attendance = AttendanceEmployee.query.filter_by(
+            employee_id=form.employee_id.data, date=form.date.data
+        ).first()
+        if attendance is not None:
+            for field, value in values.items():
+                setattr(attendance, field, value)
+            message = 'Présence mise à jour avec succès!'
+        else:
+            attendance = AttendanceEmployee(
+                employee_id=form.employee_id.data,
+                date=form.date.data,
+                created_by=1,
+                **values
+            )
+            db.session.add(attendance)
+            message = 'Présence enregistrée avec succès!'
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The day was saved meanwhile (import or another form)
+            db.session.rollback()
+            flash('Une présence existe déjà pour cet employé à cette date, veuillez réessayer.', 'error')
+            return render_template('attendance/create.html', form=form)
+        flash(message, 'success')
         return redirect(url_for('attendance_list'))
     return render_template('attendance/create.html', form=form)
 
@@ -713,15 +735,22 @@ def payroll_list():
 
 @app.route('/payroll/create', methods=['GET', 'POST'])
 def payroll_create():
+    from payroll_ytd import normalize_salary_month
+    
     form = PayrollForm()
     if form.validate_on_submit():
+        # Stored as 'MM/YYYY' whether typed like that or as YYYY-MM
+        salary_month = normalize_salary_month(form.salary_month.data.strip())
+        if salary_month is None:
+            form.salary_month.errors.append('Mois invalide, utilisez MM/AAAA (ex: 03/2026)')
+            return render_template('payroll/create.html', form=form)
+        
         try:
             # Import the simplified payroll calculator
             from simple_payroll_calculator import calculate_simple_payslip
             
             # Get form data
             employee_id = form.employee_id.data
-            salary_month = form.salary_month.data
             
             # Convert overtime amount to hours (approximate)
             overtime_amount = float(form.overtime.data or 0)
@@ -763,47 +792,76 @@ def payroll_create():
 @app.route('/payroll/<int:id>')
 def payroll_view(id):
     """View detailed payslip"""
+    from payslip_lines import COMPONENTS
+    
     payslip = PaySlip.query.get_or_404(id)
-    return render_template('payroll/view.html', payslip=payslip)
+    return render_template('payroll/view.html', payslip=payslip, components=COMPONENTS)
+
+@app.route('/payroll/components')
+def payroll_component_totals():
+    """JSON totals of each payslip component for a month, per branch or department"""
+    from payslip_lines import component_totals
+    
+    salary_month = _salary_month(request.args.get('salary_month'))
+    if not salary_month:
+        return jsonify({'error': 'Mois de salaire requis'}), 400
+    group_by = request.args.get('group_by', 'branch')
+    components = request.args.getlist('component') or None
+    
+    try:
+        totals = component_totals(salary_month, group_by, components)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'salary_month': salary_month,
+        'group_by': group_by,
+        'totals': [
+            {f'{group_by}_id': group_id, 'components': {code: float(total) for code, total in amounts.items()}}
+            for group_id, amounts in totals.items()
+        ]
+    })
+
+def _salary_month(value):
+    """Requested salary month as the stored 'MM/YYYY' label (forms send YYYY-MM); others are kept as sent"""
+    from payroll_ytd import normalize_salary_month
+    
+    return normalize_salary_month(value) or value
+
+def _wants_json():
+    """True when the client asked for JSON rather than an HTML page"""
+    return request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html
+
+def _job_started_response(job):
+    """Answer a batch request as soon as its job is queued"""
+    if _wants_json():
+        return jsonify({
+            'job_id': job.id,
+            'status_url': url_for('payroll_job_progress', id=job.id)
+        }), 202
+    flash(f'Calcul en lot lancé en arrière-plan (tâche #{job.id})', 'info')
+    return redirect(url_for('payroll_job_view', id=job.id))
 
 @app.route('/payroll/calculate-batch', methods=['POST'])
 def payroll_calculate_batch():
-    """Calculate payroll for all employees for a given month"""
-    salary_month = request.form.get('salary_month')
+    """Queue payroll calculation for all employees for a given month"""
+    from payroll_ytd import normalize_salary_month
+    
+    salary_month = normalize_salary_month(request.form.get('salary_month'))
     if not salary_month:
         flash('Mois de salaire requis', 'error')
         return redirect(url_for('payroll_list'))
     
     try:
-        from simple_payroll_calculator import calculate_simple_payslip
-        
-        # Get all active employees
-        employees = Employee.query.filter_by(is_active=1).all()
-        successful_calculations = 0
-        total_errors = []
+        from job_runner import enqueue_job
         
-        for employee in employees:
-            try:
-                # Basic calculation with no overtime or special allowances for batch
-                payslip, errors = calculate_simple_payslip(
-                    employee.id, 
-                    salary_month, 
-                    overtime_hours=0, 
-                    leave_allowance=0
-                )
-                
-                if payslip:
-                    successful_calculations += 1
-                if errors:
-                    total_errors.extend([f"{employee.name}: {error}" for error in errors])
-                    
-            except Exception as e:
-                total_errors.append(f"{employee.name}: {str(e)}")
-        
-        flash(f'{successful_calculations} fiches de paie calculées avec succès selon la loi marocaine!', 'success')
-        flash('Calculs incluant: bonus ancienneté, CNSS/AMO/CIMR, et impôt progressif', 'info')
-        if total_errors:
-            flash(f'{len(total_errors)} erreurs rencontrées lors du calcul', 'warning')
+        # Basic calculation with no overtime or special allowances for batch
+        job = enqueue_job('payroll_batch', {
+            'salary_month': salary_month,
+            'skip_unchanged': request.form.get('skip_unchanged') == '1',
+            # None falls back to the PAYROLL_METRICS setting
+            'metrics': True if request.form.get('metrics') == '1' else None
+        })
+        return _job_started_response(job)
             
     except Exception as e:
         flash(f'Erreur lors du calcul en lot: {str(e)}', 'error')
@@ -812,11 +870,13 @@ def payroll_calculate_batch():
 
 @app.route('/payroll/calculate-batch-with-attendance', methods=['GET', 'POST'])
 def payroll_calculate_batch_with_attendance():
-    """Calculate payroll for all employees using Excel attendance data"""
+    """Queue payroll calculation for all employees using Excel attendance data"""
     if request.method == 'GET':
         return render_template('payroll/batch_with_attendance.html')
     
-    salary_month = request.form.get('salary_month')
+    from payroll_ytd import normalize_salary_month
+    
+    salary_month = normalize_salary_month(request.form.get('salary_month'))
     if not salary_month:
         flash('Mois de salaire requis', 'error')
         return redirect(url_for('payroll_list'))
@@ -836,76 +896,137 @@ def payroll_calculate_batch_with_attendance():
         return render_template('payroll/batch_with_attendance.html')
     
     try:
-        # Save uploaded file temporarily
+        # Save uploaded file; the background job deletes it once processed
         import tempfile
-        import os
+        from job_runner import enqueue_job
         
         with tempfile.NamedTemporaryFile(delete=False, suffix='.xls') as tmp_file:
             file.save(tmp_file.name)
             temp_file_path = tmp_file.name
         
-        # Process attendance data
-        from attendance_processor import AttendanceProcessor
-        from simple_payroll_calculator import calculate_simple_payslip
-        
-        processor = AttendanceProcessor(temp_file_path)
-        attendance_summary = processor.get_attendance_summary(salary_month)
-        
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
-        # Calculate payroll with attendance data
-        employees = Employee.query.filter_by(is_active=1).all()
-        successful_calculations = 0
-        total_errors = []
-        attendance_matched = attendance_summary['matched_employees']
-        
-        for employee in employees:
-            try:
-                # Get attendance data for this employee if available
-                employee_attendance = attendance_summary['attendance_data'].get(employee.id, {})
-                
-                overtime_hours = employee_attendance.get('overtime_hours', 0)
-                leave_allowance = 0  # Can be extended to include leave calculations
-                
-                # Calculate payslip with attendance-based overtime
-                payslip, errors = calculate_simple_payslip(
-                    employee.id, 
-                    salary_month, 
-                    overtime_hours, 
-                    leave_allowance
-                )
-                
-                if payslip:
-                    successful_calculations += 1
-                    # Add attendance info to payslip comments
-                    if employee_attendance:
-                        days_worked = employee_attendance.get('days_worked', 0)
-                        total_hours = employee_attendance.get('total_hours', 0)
-                        payslip.comments = f"Jours travaillés: {days_worked}, Heures totales: {total_hours:.1f}, Heures sup.: {overtime_hours:.1f}"
-                        db.session.commit()
-                
-                if errors:
-                    total_errors.extend([f"{employee.name}: {error}" for error in errors])
-                    
-            except Exception as e:
-                total_errors.append(f"{employee.name}: {str(e)}")
-        
-        # Success messages
-        flash(f'{successful_calculations} fiches de paie calculées avec données d\'assiduité!', 'success')
-        flash(f'Assiduité intégrée pour {attendance_matched} employés sur {attendance_summary["total_records"]} enregistrements', 'info')
-        flash('Calculs incluant: heures supplémentaires, bonus ancienneté, CNSS/AMO/CIMR, et impôt progressif', 'info')
-        
-        if total_errors:
-            flash(f'{len(total_errors)} erreurs rencontrées lors du calcul', 'warning')
-        
-        # Show unmatched employees warning
-        unmatched = attendance_summary['unmatched_count']
-        if unmatched > 0:
-            flash(f'{unmatched} employés du fichier Excel non trouvés dans la base de données', 'warning')
+        job = enqueue_job('payroll_batch_attendance', {
+            'salary_month': salary_month,
+            'file_path': temp_file_path
+        })
+        return _job_started_response(job)
             
     except Exception as e:
         flash(f'Erreur lors du traitement du fichier: {str(e)}', 'error')
         return render_template('payroll/batch_with_attendance.html')
+
+@app.route('/payroll/jobs/<int:id>')
+def payroll_job_view(id):
+    """Progress page for a background payroll run"""
+    job = BackgroundJob.query.get_or_404(id)
+    return render_template('payroll/job.html', job=job)
+
+@app.route('/payroll/jobs/<int:id>/progress')
+def payroll_job_progress(id):
+    """JSON progress of a background payroll run"""
+    from job_runner import job_to_dict
+    
+    job = BackgroundJob.query.get_or_404(id)
+    return jsonify(job_to_dict(job))
+
+@app.route('/payroll/jobs/<int:id>/errors')
+def payroll_job_errors(id):
+    """Stream the error list of a background payroll run, one JSON line per error"""
+    import json
+    
+    job = BackgroundJob.query.get_or_404(id)
+    errors = json.loads(job.errors) if job.errors else []
+    
+    def generate():
+        for error in errors:
+            yield json.dumps({'error': error}, ensure_ascii=False) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _float_totals(totals):
+    """Decimal totals as JSON numbers"""
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in totals.items()}
+
+@app.route('/payroll/aggregates')
+def payroll_aggregates():
+    """JSON payroll totals: month-over-month trend, and per branch for one month"""
+    from payroll_aggregates import branch_totals, monthly_trend
+    
+    months = request.args.get('months', 12, type=int)
+    data = {'trend': [_float_totals(totals) for totals in monthly_trend(months)]}
+    salary_month = _salary_month(request.args.get('salary_month'))
+    if salary_month:
+        data['salary_month'] = salary_month
+        data['branches'] = [
+            {'branch_id': branch_id, **_float_totals(totals)}
+            for branch_id, totals in branch_totals(salary_month).items()
+        ]
+    return jsonify(data)
+
+@app.route('/payroll/ytd')
+def payroll_ytd_ledger():
+    """JSON year-to-date ledger of every employee, for annual IR and CNSS statements"""
+    from payroll_ytd import annual_ledger, ledger_to_dict
     
-    return redirect(url_for('payroll_list'))
\ No newline at end of file
+    year = request.args.get('year', datetime.now().year, type=int)
+    return jsonify({'year': year, 'employees': [ledger_to_dict(row) for row in annual_ledger(year)]})
+
+@app.route('/payroll/ytd/<int:employee_id>')
+def payroll_ytd_employee(employee_id):
+    """JSON year-to-date totals of one employee"""
+    from payroll_ytd import get_employee_ytd, ledger_to_dict
+    
+    year = request.args.get('year', datetime.now().year, type=int)
+    row = get_employee_ytd(employee_id, year)
+    if row is None:
+        return jsonify({'error': 'Aucun bulletin pour cette année'}), 404
+    return jsonify(ledger_to_dict(row))
+
+@app.route('/payroll/diff')
+def payroll_diff():
+    """JSON month-over-month comparison of payslips"""
+    from payroll_diff import DEFAULT_THRESHOLD, DEFAULT_THRESHOLD_PCT, diff_payroll_months
+    
+    salary_month = _salary_month(request.args.get('salary_month'))
+    if not salary_month:
+        return jsonify({'error': 'Mois de salaire requis'}), 400
+    
+    try:
+        diff = diff_payroll_months(
+            salary_month,
+            _salary_month(request.args.get('previous_month')),
+            request.args.get('threshold', DEFAULT_THRESHOLD, type=float),
+            request.args.get('threshold_pct', DEFAULT_THRESHOLD_PCT, type=float)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        diff['changes'] = diff['changes'][:limit]
+    return jsonify(diff)
+
+@app.route('/payroll/metrics')
+def payroll_metrics():
+    """JSON step timings of the latest instrumented payroll runs of this process"""
+    from payroll_metrics import recent_runs
+    
+    return jsonify({'runs': recent_runs(request.args.get('limit', type=int))})
+
+@app.route('/payroll/simulate', methods=['POST'])
+def payroll_simulate():
+    """What-if payroll totals for rate/IR scale overrides; nothing is saved
+
+    Body: {"salary_month": "MM/YYYY", "scenarios": [{"name": ..., "rates": {...}, "tax_brackets": [...]}]}
+    """
+    from payroll_simulation import simulate_payroll
+    
+    data = request.get_json(silent=True) or {}
+    salary_month = _salary_month(data.get('salary_month'))
+    scenarios = data.get('scenarios') or []
+    if not salary_month:
+        return jsonify({'error': 'Mois de salaire requis'}), 400
+    
+    try:
+        return jsonify(simulate_payroll(salary_month, scenarios, data.get('employee_ids')))
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        return jsonify({'error': f'Scénario invalide: {str(e)}'}), 400
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Schema Upgrades
+Idempotent DDL for databases created before a model gained a constraint,
+index or column. db.create_all() only creates missing tables, so existing
+tables are brought up to date here.
+"""
+
+import logging
+from sqlalchemy import text
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+def _keep_latest(table, columns, index):
+    """
+    Delete the duplicates a new unique index would reject, keeping the row
+    updated last (then the highest id) of each key
+
+    Skipped once the index exists, so the table is not scanned at every startup.
+    """
+    key = ', '.join(columns)
+    not_null = ' AND '.join(f'{column} IS NOT NULL' for column in columns)
+    return (
+        f"DELETE FROM {table} WHERE to_regclass('{index}') IS NULL AND id IN ("
+        f"SELECT id FROM (SELECT id, row_number() OVER ("
+        f"PARTITION BY {key} ORDER BY updated_at DESC NULLS LAST, id DESC) AS position "
+        f"FROM {table} WHERE {not_null}) ranked WHERE position > 1)"
+    )
+
+# (description, SQL) pairs, applied in order; each statement must be idempotent
+SCHEMA_UPGRADES = [
+    (
+        # Their lines go with them (ON DELETE CASCADE)
+        'duplicate payslips per employee and month',
+        _keep_latest('pay_slips', ['employee_id', 'salary_month'], 'uq_pay_slips_employee_month')
+    ),
+    (
+        'unique payslip per employee and month',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_pay_slips_employee_month '
+        'ON pay_slips (employee_id, salary_month)'
+    ),
+    (
+        'payslip input fingerprint',
+        'ALTER TABLE pay_slips ADD COLUMN IF NOT EXISTS input_fingerprint VARCHAR(64)'
+    ),
+    (
+        'one retirement event per employee and date',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_retirement_events_employee_date '
+        'ON retirement_events (employee_id, retirement_date)'
+    ),
+    (
+        'payslip period date',
+        'ALTER TABLE pay_slips ADD COLUMN IF NOT EXISTS period DATE'
+    ),
+    (
+        'payslip period backfill',
+        "UPDATE pay_slips SET period = to_date(salary_month, 'MM/YYYY') "
+        "WHERE period IS NULL AND salary_month ~ '^(0?[1-9]|1[0-2])/[0-9]{4}$'"
+    ),
+    (
+        'payslip period index per employee',
+        'CREATE INDEX IF NOT EXISTS ix_pay_slips_employee_period ON pay_slips (employee_id, period)'
+    ),
+    (
+        'payslip period index',
+        'CREATE INDEX IF NOT EXISTS ix_pay_slips_period ON pay_slips (period)'
+    ),
+    (
+        'payslip YYYY-MM month labels',
+        # Months submitted by <input type="month"> before they were normalized
+        "UPDATE pay_slips SET salary_month = to_char(to_date(salary_month, 'YYYY-MM'), 'MM/YYYY'), "
+        "period = to_date(salary_month, 'YYYY-MM') "
+        "WHERE salary_month ~ '^[0-9]{4}-(0?[1-9]|1[0-2])$' AND NOT EXISTS ("
+        "SELECT 1 FROM pay_slips other WHERE other.employee_id = pay_slips.employee_id "
+        "AND other.salary_month = to_char(to_date(pay_slips.salary_month, 'YYYY-MM'), 'MM/YYYY'))"
+    ),
+    (
+        'payroll aggregate YYYY-MM month labels',
+        "UPDATE payroll_aggregates SET salary_month = to_char(to_date(salary_month, 'YYYY-MM'), 'MM/YYYY') "
+        "WHERE salary_month ~ '^[0-9]{4}-(0?[1-9]|1[0-2])$' AND NOT EXISTS ("
+        "SELECT 1 FROM payroll_aggregates other "
+        "WHERE other.branch_id IS NOT DISTINCT FROM payroll_aggregates.branch_id "
+        "AND other.department_id IS NOT DISTINCT FROM payroll_aggregates.department_id "
+        "AND other.salary_month = to_char(to_date(payroll_aggregates.salary_month, 'YYYY-MM'), 'MM/YYYY'))"
+    ),
+    (
+        'duplicate attendance rows per employee and date',
+        _keep_latest('attendance_employees', ['employee_id', 'date'], 'uq_attendance_employees_employee_date')
+    ),
+    (
+        'one attendance row per employee and date',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_employees_employee_date '
+        'ON attendance_employees (employee_id, date)'
+    ),
+]
+
+
+def prepare_database():
+    """Create the missing tables, then apply the schema upgrades (web server startup, flask db upgrade)"""
+    db.create_all()
+    apply_schema_upgrades()
+
+
+def apply_schema_upgrades():
+    """Apply every schema upgrade, logging (not raising) the ones that fail"""
+    for description, statement in SCHEMA_UPGRADES:
+        try:
+            db.session.execute(text(statement))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Schema upgrade skipped ({description}): {e}")
@@ -0,0 +1,106 @@
+"""
+Test setup: the app runs against TEST_DATABASE_URL, an in-memory SQLite
+database when it is not set. DATABASE_URL is never used, so the suite cannot
+touch the application's database.
+
+Tests marked requires_postgres exercise PostgreSQL-only SQL (ON CONFLICT,
+COPY, the schema upgrades) and are skipped unless TEST_DATABASE_URL points
+at a PostgreSQL database, e.g.
+
+    TEST_DATABASE_URL=postgresql://localhost/hr_test python -m pytest
+"""
+
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Like main.py: the app module is imported first, it imports the payroll modules in order
+import app  # noqa: E402
+from database import db  # noqa: E402
+from models import Branch, Department, Employee, User  # noqa: E402
+from payroll_config import rate_provider  # noqa: E402
+from schema_upgrades import prepare_database  # noqa: E402
+
+POSTGRES = os.environ['DATABASE_URL'].startswith('postgresql')
+
+# Importing app leaves the database alone; the web server creates the tables at startup
+with app.app.app_context():
+    if POSTGRES:
+        prepare_database()
+    else:
+        db.create_all()
+
+
+def pytest_collection_modifyitems(config, items):
+    if POSTGRES:
+        return
+    skip = pytest.mark.skip(reason='needs TEST_DATABASE_URL to point at PostgreSQL')
+    for item in items:
+        if 'requires_postgres' in item.keywords:
+            item.add_marker(skip)
+
+
+def _clear_tables():
+    db.session.rollback()
+    if POSTGRES:
+        tables = ', '.join(table.name for table in db.metadata.sorted_tables)
+        db.session.execute(db.text(f'TRUNCATE {tables} RESTART IDENTITY CASCADE'))
+    else:
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+    db.session.commit()
+    rate_provider.invalidate()
+
+
+@pytest.fixture
+def database():
+    """App context on an empty database; every table is emptied afterwards"""
+    with app.app.app_context():
+        yield db
+        _clear_tables()
+
+
+@pytest.fixture
+def branch(database):
+    """A user and a branch with one department, the owners of test employees"""
+    user = User(name='Admin', email='admin@example.com', password='x')
+    database.session.add(user)
+    database.session.flush()
+    branch = Branch(name='Casablanca', created_by=user.id)
+    database.session.add(branch)
+    database.session.flush()
+    database.session.add(Department(branch_id=branch.id, name='Production', created_by=user.id))
+    database.session.commit()
+    return branch
+
+
+@pytest.fixture
+def make_employee(branch):
+    """Creates employees of the test branch, active unless is_active=0 is given"""
+    department = Department.query.filter_by(branch_id=branch.id).one()
+
+    def make(name='Ahmed Benali', salary='5000', **values):
+        values.setdefault('employee_id', f'EMP{Employee.query.count() + 1:04d}')
+        values.setdefault('company_doj', date(2020, 1, 15))
+        values.setdefault('is_active', 1)
+        employee = Employee(user_id=branch.created_by, created_by=branch.created_by, name=name,
+                            salary=Decimal(salary), branch_id=branch.id, department_id=department.id,
+                            **values)
+        db.session.add(employee)
+        db.session.commit()
+        return employee
+
+    return make
+
+
+@pytest.fixture
+def client(database, monkeypatch):
+    """Test client of the web app, forms submitted without a CSRF token"""
+    monkeypatch.setitem(app.app.config, 'WTF_CSRF_ENABLED', False)
+    return app.app.test_client()
@@ -0,0 +1,96 @@
+"""
+A repeat upload of an attendance export is loaded from the cache without
+parsing Excel, and the cache stays within its size budget
+"""
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from attendance_cache import AttendanceCache, file_digest
+from attendance_processor import AttendanceProcessor
+
+SAMPLE_EXPORT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'attached_assets', 'Events Today_20250826123445_1756208312404.xls'
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AttendanceCache(str(tmp_path / 'cache'), 50 * 1024 * 1024)
+
+
+def _entries(cache):
+    return sorted(name for name in os.listdir(cache.directory))
+
+
+def _frame(rows):
+    return pd.DataFrame({
+        'card_number': [f'{row:07d}' for row in range(rows)],
+        'time': pd.date_range('2025-08-05 08:00', periods=rows, freq='min'),
+        'is_in': [row % 2 == 0 for row in range(rows)],
+    })
+
+
+def test_repeat_upload_skips_excel(cache, tmp_path, monkeypatch):
+    first = AttendanceProcessor(SAMPLE_EXPORT, chunk_rows=64, cache=cache)
+    summary = first.process_attendance_data()
+    assert not first.from_cache
+    assert _entries(cache) == [file_digest(SAMPLE_EXPORT)]
+
+    # Same content under another name
+    upload = tmp_path / 'upload.xls'
+    shutil.copy(SAMPLE_EXPORT, upload)
+    monkeypatch.setattr(AttendanceProcessor, 'iter_chunks', lambda self: pytest.fail('export parsed again'))
+    again = AttendanceProcessor(str(upload), cache=cache)
+
+    assert again.process_attendance_data() == summary
+    assert again.from_cache
+
+
+def test_columns_keep_their_types(cache):
+    frame = _frame(5)
+
+    list(cache.store('a' * 64, iter([frame.iloc[:3], frame.iloc[3:]])))
+
+    loaded = pd.concat(cache.get('a' * 64), ignore_index=True)
+    pd.testing.assert_frame_equal(loaded, frame)
+
+
+def test_interrupted_read_leaves_no_entry(cache):
+    def chunks():
+        yield _frame(3)
+        raise ValueError('Fichier de présence illisible')
+
+    with pytest.raises(ValueError):
+        list(cache.store('b' * 64, chunks()))
+
+    assert cache.get('b' * 64) is None
+    assert _entries(cache) == []
+
+
+def test_unreadable_file_is_not_cached(cache, tmp_path):
+    path = tmp_path / 'export.xls'
+    path.write_text('Time;Prénom\n')
+
+    with pytest.raises(ValueError):
+        AttendanceProcessor(str(path), cache=cache).process_attendance_data()
+
+    assert _entries(cache) == []
+
+
+def test_least_recently_used_entries_evicted(cache):
+    for digest in ('c' * 64, 'd' * 64):
+        list(cache.store(digest, iter([_frame(2000)])))
+    entry_size = cache._size(cache._entry('c' * 64))
+    # c was stored first, reading it again makes d the least recently used
+    os.utime(cache._entry('c' * 64), (1, 1))
+    list(cache.get('c' * 64))
+
+    cache.max_bytes = entry_size * 2
+    list(cache.store('e' * 64, iter([_frame(2000)])))
+
+    assert _entries(cache) == ['c' * 64, 'e' * 64]
@@ -0,0 +1,74 @@
+"""
+Device users are matched by card number, then exact name, then similar name;
+shared card numbers and close similar names are left unmatched
+"""
+
+from attendance_matching import FUZZY_MARGIN, FUZZY_THRESHOLD, EmployeeMatcher, normalize_name, trigrams
+from attendance_processor import AttendanceProcessor
+
+EMPLOYEES = [(1, 'E1042', 'Ahmed Benali'), (2, 'E1043', 'Salma Idrissi'), (3, None, 'Youssef Alami')]
+
+
+def _similarity(first, second):
+    first, second = trigrams(normalize_name(first)), trigrams(normalize_name(second))
+    return len(first & second) / len(first | second)
+
+
+def test_card_number_wins_over_name():
+    match = EmployeeMatcher(EMPLOYEES).match('Salma Idrissi', ' e1042 ')
+    assert match == (1, 'Ahmed Benali', 'card')
+
+
+def test_exact_name_ignores_accents_case_and_word_order():
+    match = EmployeeMatcher(EMPLOYEES).match('IDRISSI Sälma', '9999')
+    assert match == (2, 'Salma Idrissi', 'name')
+
+
+def test_similar_name_above_threshold():
+    assert _similarity('Ahmed Benaly', 'Ahmed Benali') >= FUZZY_THRESHOLD
+    assert EmployeeMatcher(EMPLOYEES).match('Ahmed Benaly') == (1, 'Ahmed Benali', 'fuzzy')
+
+
+def test_similar_name_below_threshold():
+    assert _similarity('Ahmed Benani', 'Ahmed Benali') < FUZZY_THRESHOLD
+    assert EmployeeMatcher(EMPLOYEES).match('Ahmed Benani') is None
+
+
+def test_similar_names_without_clear_lead():
+    matcher = EmployeeMatcher(EMPLOYEES + [(4, 'E1044', 'Ahmed Benalo')])
+    assert abs(_similarity('Ahmed Benaly', 'Ahmed Benali') - _similarity('Ahmed Benaly', 'Ahmed Benalo')) < FUZZY_MARGIN
+    assert matcher.match('Ahmed Benaly') is None
+
+
+def test_name_shared_by_two_employees():
+    matcher = EmployeeMatcher(EMPLOYEES + [(4, 'E1044', 'Ahmed Benali')])
+    assert matcher.match('Ahmed Benali') is None
+    assert matcher.match('Ahmed Benali', 'E1044') == (4, 'Ahmed Benali', 'card')
+
+
+def test_shared_card_number_matches_nobody():
+    matcher = EmployeeMatcher(EMPLOYEES + [(4, 'e1042', 'Karim Tazi')])
+    assert matcher.sharing_card('E1042') == ['Ahmed Benali', 'Karim Tazi']
+    # Not even by the exact name of one of them
+    assert matcher.match('Ahmed Benali', 'E1042') is None
+    assert matcher.sharing_card('E1043') == []
+    assert matcher.match('Salma Idrissi', 'E1043') == (2, 'Salma Idrissi', 'card')
+
+
+def test_shared_card_number_reported_by_processor(make_employee):
+    # Distinct codes in the database, the same card number once normalized
+    make_employee('Ahmed Benali', employee_id='1042')
+    make_employee('Karim Tazi', employee_id='1042 ')
+    salma = make_employee('Salma Idrissi', employee_id='1043')
+    processor = AttendanceProcessor('export.xls')
+    processor.processed_data = {
+        'Ahmed Benali_1042': dict(name='Ahmed Benali', card_number='1042', days_worked=20,
+                                  total_hours=160, overtime_hours=0),
+        'Salma Idrissi_1043': dict(name='Salma Idrissi', card_number='1043', days_worked=21,
+                                   total_hours=170, overtime_hours=2),
+    }
+
+    matched = processor.match_with_database_employees()
+
+    assert list(matched) == [salma.id]
+    assert processor.ambiguous_cards == {'1042': ['Ahmed Benali', 'Karim Tazi']}
@@ -0,0 +1,102 @@
+"""
+Streaming an export and loading it whole with read_excel give the same
+punches; unreadable files fail the job or command with the reason
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app import app
+from attendance_processor import AttendanceProcessor
+from job_runner import run_job
+from models import BackgroundJob
+
+SAMPLE_EXPORT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'attached_assets', 'Events Today_20250826123445_1756208312404.xls'
+)
+
+
+def _punches(processor):
+    return pd.concat([processor._prepare_punches(chunk) for chunk in processor.iter_chunks()], ignore_index=True)
+
+
+def _both_paths(path):
+    """(streamed punches, read_excel punches) of an export"""
+    streamed = _punches(AttendanceProcessor(path, chunk_rows=64))
+    loaded = AttendanceProcessor(path)
+    assert loaded.read_excel_file()
+    return streamed, _punches(loaded)
+
+
+@pytest.fixture
+def xlsx_export(tmp_path):
+    """Export whose card number column has a blank, so read_excel reads it as floats"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Time', 'Prénom', 'Last Name', 'Numéro de carte', 'In / Out Status', 'Device'])
+    sheet.append(['2025-08-05 08:02:11', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 In', 'pointeuse'])
+    sheet.append(['2025-08-05 17:05:40', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 Out', 'pointeuse'])
+    sheet.append(['2025-08-05 08:15:00', 'Salma', 'Idrissi', None, 'pointeuse-1 In', 'pointeuse'])
+    path = tmp_path / 'export.xlsx'
+    workbook.save(path)
+    return str(path)
+
+
+def test_sample_export_streamed_like_read_excel():
+    streamed, loaded = _both_paths(SAMPLE_EXPORT)
+    assert len(streamed) > 0
+    assert not streamed['card_number'].str.endswith('.0').any()
+    pd.testing.assert_frame_equal(streamed, loaded)
+
+
+def test_whole_card_numbers_lose_float_suffix(xlsx_export):
+    streamed, loaded = _both_paths(xlsx_export)
+    assert loaded['card_number'].tolist() == ['3111173', '3111173', 'nan']
+    pd.testing.assert_frame_equal(streamed, loaded)
+
+
+def test_summary_identical_on_both_paths():
+    streamed = AttendanceProcessor(SAMPLE_EXPORT, chunk_rows=64)
+    loaded = AttendanceProcessor(SAMPLE_EXPORT)
+    loaded.read_excel_file()
+    assert streamed.process_attendance_data() == loaded.process_attendance_data()
+
+
+@pytest.fixture
+def not_an_export(tmp_path):
+    path = tmp_path / 'export.xls'
+    path.write_text('Time;Prénom\n2025-08-05 08:02:11;Ahmed\n')
+    return str(path)
+
+
+def test_unreadable_file_raises(not_an_export):
+    with pytest.raises(ValueError, match='Fichier de présence illisible: Not an Excel workbook'):
+        AttendanceProcessor(not_an_export).process_attendance_data()
+    with pytest.raises(ValueError, match='Fichier de présence illisible'):
+        AttendanceProcessor(not_an_export).read_excel_file()
+
+
+def test_ingest_command_reports_unreadable_file(database, not_an_export):
+    result = app.test_cli_runner().invoke(args=['attendance', 'ingest', not_an_export])
+
+    assert result.exit_code == 1
+    assert 'Fichier de présence illisible: Not an Excel workbook' in result.stderr
+
+
+def test_payroll_job_fails_on_unreadable_file(database, not_an_export):
+    job = BackgroundJob(job_type='payroll_batch_attendance', status='queued', created_by=1,
+                        params=json.dumps({'file_path': not_an_export, 'salary_month': '08/2025'}))
+    database.session.add(job)
+    database.session.commit()
+
+    run_job(job.id)
+
+    database.session.expire_all()
+    assert job.status == 'failed'
+    assert 'Fichier de présence illisible' in json.loads(job.errors)[0]
+    assert not os.path.exists(not_an_export)
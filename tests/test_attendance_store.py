@@ -0,0 +1,128 @@
+"""
+One attendance row per employee and day: imports and the attendance form
+update the day instead of adding a second row
+"""
+
+from datetime import date, time
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import text
+
+from attendance_processor import AttendanceProcessor
+from attendance_store import STAGING_TABLE, store_daily_attendance
+from models import AttendanceEmployee
+from schema_upgrades import apply_schema_upgrades
+
+
+def _export(tmp_path, punches):
+    """Export of (time, first name, last name, card number, status) punches"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Time', 'Prénom', 'Last Name', 'Numéro de carte', 'In / Out Status', 'Device'])
+    for punch in punches:
+        sheet.append([*punch, 'pointeuse'])
+    path = tmp_path / f'export_{len(list(tmp_path.iterdir()))}.xlsx'
+    workbook.save(path)
+    return str(path)
+
+
+def _store(path):
+    processor = AttendanceProcessor(path)
+    processor.get_attendance_summary('08/2025')
+    return store_daily_attendance(processor)
+
+
+def _form(employee, clock_in):
+    return {'employee_id': employee.id, 'date': '2025-08-05', 'status': 'present',
+            'clock_in': clock_in, 'clock_out': '17:00'}
+
+
+def test_form_updates_the_existing_day(client, make_employee):
+    employee = make_employee()
+
+    client.post('/attendance/create', data=_form(employee, '08:00'))
+    response = client.post('/attendance/create', data=_form(employee, '08:20'), follow_redirects=True)
+
+    assert 'Présence mise à jour avec succès!' in response.get_data(as_text=True)
+    rows = AttendanceEmployee.query.all()
+    assert [(row.date, row.clock_in) for row in rows] == [(date(2025, 8, 5), time(8, 20))]
+
+
+def test_form_reports_a_day_saved_meanwhile(client, make_employee, monkeypatch):
+    employee = make_employee()
+    client.post('/attendance/create', data=_form(employee, '08:00'))
+
+    # The existing row is not seen, as when an import saves the day between the lookup and the commit
+    class Unseen:
+        def filter_by(self, **criteria):
+            return self
+
+        def first(self):
+            return None
+
+    monkeypatch.setattr(AttendanceEmployee, 'query', Unseen())
+    response = client.post('/attendance/create', data=_form(employee, '08:20'))
+
+    assert response.status_code == 200
+    assert 'Une présence existe déjà' in response.get_data(as_text=True)
+    monkeypatch.undo()
+    assert [row.clock_in for row in AttendanceEmployee.query.all()] == [time(8, 0)]
+
+
+@pytest.mark.requires_postgres
+def test_reimport_updates_the_days(database, make_employee, tmp_path):
+    employee = make_employee(employee_id='3111173')
+    punches = [
+        ('2025-08-05 08:02:11', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 In'),
+        ('2025-08-05 17:05:40', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 Out'),
+    ]
+    assert _store(_export(tmp_path, punches)) == 1
+    created_at = AttendanceEmployee.query.one().created_at
+
+    punches[0] = ('2025-08-05 07:55:00', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 In')
+    punches.append(('2025-08-06 08:00:00', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 In'))
+    assert _store(_export(tmp_path, punches)) == 2
+
+    database.session.expire_all()
+    rows = AttendanceEmployee.query.order_by(AttendanceEmployee.date).all()
+    assert [(row.employee_id, row.date) for row in rows] == [(employee.id, date(2025, 8, 5)),
+                                                             (employee.id, date(2025, 8, 6))]
+    assert rows[0].clock_in == time(7, 55)
+    assert rows[0].created_at == created_at
+
+
+@pytest.mark.requires_postgres
+def test_import_leaves_a_permanent_table_of_the_staging_name(database, make_employee, tmp_path):
+    make_employee(employee_id='3111173')
+    database.session.execute(text(f'CREATE TABLE {STAGING_TABLE} (id INTEGER)'))
+    database.session.commit()
+    try:
+        assert _store(_export(tmp_path, [('2025-08-05 08:02:11', 'Ahmed', 'Benali', 3111173, 'pointeuse-1 In')])) == 1
+        assert database.session.execute(text(f"SELECT to_regclass('public.{STAGING_TABLE}')")).scalar()
+    finally:
+        database.session.rollback()
+        database.session.execute(text(f'DROP TABLE IF EXISTS public.{STAGING_TABLE}'))
+        database.session.commit()
+
+
+@pytest.mark.requires_postgres
+def test_upgrade_keeps_the_latest_duplicate_day(database, make_employee):
+    employee = make_employee()
+    database.session.execute(text(
+        'ALTER TABLE attendance_employees DROP CONSTRAINT IF EXISTS uq_attendance_employees_employee_date'
+    ))
+    database.session.execute(text('DROP INDEX IF EXISTS uq_attendance_employees_employee_date'))
+    for clock_in, updated_at in [('08:00', '2025-08-05 18:00'), ('08:30', '2025-08-06 09:00'),
+                                 ('09:00', '2025-08-05 19:00')]:
+        database.session.execute(text(
+            "INSERT INTO attendance_employees (employee_id, date, status, hs, clock_in, clock_out, late, "
+            "early_leaving, overtime, total_rest, created_by, updated_at) VALUES (:employee, '2025-08-05', "
+            "'present', '8', :clock_in, '17:00', '00:00', '00:00', '00:00', '00:00', 1, :updated_at)"
+        ), {'employee': employee.id, 'clock_in': clock_in, 'updated_at': updated_at})
+    database.session.commit()
+
+    apply_schema_upgrades()
+
+    assert [row.clock_in for row in AttendanceEmployee.query.all()] == [time(8, 30)]
+    assert database.session.execute(text("SELECT to_regclass('uq_attendance_employees_employee_date')")).scalar()
@@ -0,0 +1,114 @@
+"""
+Jobs left queued or running by a stopped server are failed or requeued
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db
+from job_runner import job_handler, recover_stale_jobs, run_job
+from models import BackgroundJob
+
+
+@job_handler('test_recovery')
+def _recovery_job(params, progress):
+    return {'echo': params.get('echo')}
+
+
+@job_handler('test_partial')
+def _partial_job(params, progress):
+    progress.status = 'partial'
+    return {'saved': 2, 'unsaved_partitions': ['branch:3']}
+
+
+@pytest.fixture
+def jobs():
+    """Adds jobs last updated the given number of seconds ago; removes every job afterwards"""
+    created = []
+
+    def add(status, seconds_ago, **values):
+        stamp = datetime.utcnow() - timedelta(seconds=seconds_ago)
+        job = BackgroundJob(job_type='test_recovery', status=status, created_by=1,
+                            created_at=stamp, updated_at=stamp, **values)
+        db.session.add(job)
+        db.session.commit()
+        created.append(job.id)
+        return job.id
+
+    with app.app_context():
+        yield add
+        db.session.rollback()
+        BackgroundJob.query.filter(BackgroundJob.id.in_(created)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _job(job_id):
+    db.session.expire_all()
+    return db.session.get(BackgroundJob, job_id)
+
+
+def _wait_for(job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while _job(job_id).status != status and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return _job(job_id)
+
+
+def test_stale_running_job_is_failed(jobs):
+    stale = jobs('running', 3600, errors=json.dumps(['Employé 3: salaire manquant']), error_count=1)
+    alive = jobs('running', 5)
+
+    failed, _ = recover_stale_jobs()
+
+    assert failed == 1
+    job = _job(stale)
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+    assert job.error_count == 2
+    assert json.loads(job.errors)[0] == 'Employé 3: salaire manquant'
+    assert _job(alive).status == 'running'
+
+
+def test_stale_queued_job_is_requeued(jobs):
+    stale = jobs('queued', 3600, params=json.dumps({'echo': 'relancé'}))
+
+    _, requeued = recover_stale_jobs()
+
+    assert requeued == [stale]
+    job = _wait_for(stale, 'completed')
+    assert job.status == 'completed'
+    assert json.loads(job.result) == {'echo': 'relancé'}
+
+
+def test_finished_jobs_are_left_alone(jobs):
+    completed = jobs('completed', 3600)
+
+    assert recover_stale_jobs() == (0, [])
+    assert _job(completed).status == 'completed'
+
+
+def test_handler_can_end_job_as_partial(jobs):
+    job_id = jobs('queued', 0)
+    _job(job_id).job_type = 'test_partial'
+    db.session.commit()
+
+    run_job(job_id)
+
+    job = _job(job_id)
+    assert job.status == 'partial'
+    assert json.loads(job.result)['unsaved_partitions'] == ['branch:3']
+
+
+def test_recover_command_runs_queued_jobs_in_the_foreground(jobs):
+    running = jobs('running', 3600)
+    queued = jobs('queued', 3600, params=json.dumps({'echo': 'cli'}))
+
+    output = app.test_cli_runner().invoke(args=['jobs', 'recover']).output
+
+    assert '1 interrupted jobs marked failed' in output
+    assert _job(running).status == 'failed'
+    # Completed before the command returned
+    assert _job(queued).status == 'completed'
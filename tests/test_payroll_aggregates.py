@@ -0,0 +1,81 @@
+"""
+Payroll aggregates hold each payslip of a month once, under its employee's
+current branch and department
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from models import Branch, Department, PayrollAggregate, PaySlip
+from payroll_aggregates import month_totals, refresh_payroll_aggregates
+from simple_payroll_calculator import calculate_simple_payslip
+
+
+@pytest.fixture
+def sales(database, branch):
+    """Second department, in a second branch"""
+    rabat = Branch(name='Rabat', created_by=branch.created_by)
+    database.session.add(rabat)
+    database.session.flush()
+    department = Department(branch_id=rabat.id, name='Ventes', created_by=branch.created_by)
+    database.session.add(department)
+    database.session.commit()
+    return department
+
+
+def _payslip(database, employee, net):
+    database.session.add(PaySlip(employee_id=employee.id, salary_month='03/2026', basic_salary=employee.salary,
+                                 net_payble=Decimal(net), created_by=1))
+    database.session.commit()
+
+
+def _groups():
+    return {
+        (row.branch_id, row.department_id): (row.headcount, row.net_payable)
+        for row in PayrollAggregate.query.filter_by(salary_month='03/2026')
+    }
+
+
+def test_month_totals(database, make_employee):
+    for net in ['4100.00', '5200.50']:
+        _payslip(database, make_employee(), net)
+
+    assert refresh_payroll_aggregates('03/2026') == 1
+
+    totals = month_totals('03/2026')
+    assert (totals['headcount'], totals['net_payable']) == (2, Decimal('9300.50'))
+
+
+def test_moved_employee_is_counted_once(database, make_employee, sales):
+    stays, moves = make_employee('Ahmed Benali'), make_employee('Salma Idrissi')
+    production = (moves.branch_id, moves.department_id)
+    _payslip(database, stays, '4100.00')
+    _payslip(database, moves, '5200.50')
+    refresh_payroll_aggregates('03/2026')
+
+    moves.branch_id, moves.department_id = sales.branch_id, sales.id
+    database.session.commit()
+    # Single payslip recalculated after the move, as from the payslip form
+    payslip, errors = calculate_simple_payslip(moves.id, '03/2026')
+
+    assert errors == []
+    assert _groups() == {
+        production: (1, Decimal('4100.00')),
+        (sales.branch_id, sales.id): (1, payslip.net_payble),
+    }
+    assert month_totals('03/2026')['headcount'] == 2
+
+
+def test_aggregates_endpoint(database, client, make_employee):
+    _payslip(database, make_employee(), '4100.00')
+    refresh_payroll_aggregates('03/2026')
+
+    data = client.get('/payroll/aggregates?salary_month=03/2026').get_json()
+
+    assert [(month['salary_month'], month['headcount']) for month in data['trend']] == [('03/2026', 1)]
+    assert [branch['net_payable'] for branch in data['branches']] == [4100.0]
+
+
+def test_reports_dashboard_route_is_gone(client):
+    assert client.get('/reports/dashboard').status_code == 404
@@ -0,0 +1,83 @@
+"""
+The vectorized batch stores the amounts the Decimal calculator stores,
+including on half-cent ties
+"""
+
+import random
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from payroll_batch import BatchPayrollEngine
+from payroll_config import PayrollRates
+from payroll_kernel import SimplePayrollKernel
+from payroll_loader import PayrollInputs
+from payroll_pipeline import DECIMAL
+
+CASES = 2000
+
+
+def _engine(employees, advances=None):
+    """Batch engine on in-memory inputs"""
+    employees = {employee.id: employee for employee in employees}
+    advances = {
+        employee_id: [SimpleNamespace(amount=amount)] for employee_id, amount in (advances or {}).items()
+    }
+    inputs = PayrollInputs('03/2026', employees, advances, {}, PayrollRates())
+    return BatchPayrollEngine('03/2026', inputs=inputs)
+
+
+def _employee(id_, salary, company_doj=None, marital_status=None):
+    return SimpleNamespace(id=id_, name=f'Employé {id_}', branch_id=1, salary=salary,
+                           company_doj=company_doj, marital_status=marital_status)
+
+
+def _decimal_payslip(engine, employee_id, overtime_hours, leave_allowance):
+    payroll_input = engine.inputs.get_payroll_input(
+        employee_id, overtime_hours=overtime_hours, leave_allowance=leave_allowance, as_of=date.today()
+    )
+    result = SimplePayrollKernel(engine.rates).calculate(payroll_input)
+    return {column: DECIMAL.quantize(amount) for column, amount in result.payslip_fields().items()}
+
+
+def test_overtime_on_half_cent_tie_is_rounded_like_decimal():
+    # 3306 / 191 * 21.01 * 1.25 is exactly 454.575; Decimal lands on 454.57499...
+    engine = _engine([_employee(1, Decimal('3306'))])
+    engine.calculate({1: 21.01})
+
+    payslips = dict(engine.iter_payslip_data())
+    assert payslips[1]['overtime'] == Decimal('454.57')
+    expected = _decimal_payslip(engine, 1, 21.01, 0)
+    assert {column: payslips[1][column] for column in expected} == expected
+
+    lines = dict(engine.iter_payslip_lines())
+    overtime = [line for line in lines[1] if line['component'] == 'overtime']
+    assert overtime[0]['amount'] == Decimal('454.57')
+
+
+@pytest.mark.parametrize('seed', [3, 17])
+def test_batch_matches_decimal_kernel(seed):
+    generator = random.Random(seed)
+    employees, overtime, leave, advances = [], {}, {}, {}
+    for id_ in range(1, CASES + 1):
+        # Salaries and hours on multiples of 1.91 hit half-cent ties often
+        salary = generator.choice([
+            Decimal(generator.randint(1500, 30000)),
+            Decimal(generator.randint(150000, 3000000)) / 100,
+            Decimal(191 * generator.randint(10, 150)) / 10,
+        ])
+        company_doj = generator.choice([None, date(generator.randint(1980, 2025), generator.randint(1, 12), 15)])
+        employees.append(_employee(id_, salary, company_doj, generator.choice(['Marié', 'Célibataire'])))
+        overtime[id_] = generator.choice([0, generator.randint(1, 40), generator.randint(0, 3000) / 100,
+                                          191 * generator.randint(1, 20) / 100])
+        leave[id_] = generator.choice([0, generator.randint(0, 100000) / 100])
+        advances[id_] = generator.choice([Decimal('0'), Decimal(generator.randint(0, 300000)) / 100])
+
+    engine = _engine(employees, advances)
+    engine.calculate(overtime, leave)
+
+    for employee_id, payslip in engine.iter_payslip_data():
+        expected = _decimal_payslip(engine, employee_id, overtime[employee_id], leave[employee_id])
+        assert {column: payslip[column] for column in expected} == expected, employee_id
@@ -0,0 +1,74 @@
+"""
+The benchmark seeds a reproducible synthetic workforce, removes only its own
+rows and stays away from real employees
+"""
+
+import json
+
+import pytest
+
+from models import Advance, AttendanceEmployee, Branch, Employee
+from payroll_benchmark import (
+    BENCH_BRANCH, BENCH_PREFIX, DEFAULT_MONTH as MONTH, SyntheticWorkforce, bench_batch_route, main,
+    remove_synthetic_workforce
+)
+
+
+def _workforce():
+    return [(employee.salary, employee.company_doj, employee.marital_status)
+            for employee in Employee.query.filter(Employee.employee_id.like(f"{BENCH_PREFIX}%"))
+            .order_by(Employee.employee_id)]
+
+
+def test_seed_is_reproducible(database):
+    employee_ids = SyntheticWorkforce(50, MONTH, seed=7).seed()
+    first = _workforce()
+    remove_synthetic_workforce()
+    SyntheticWorkforce(50, MONTH, seed=7).seed()
+
+    assert len(employee_ids) == 50
+    assert _workforce() == first
+    assert all(3120 <= salary <= 80000 for salary, _, _ in first)
+    assert {status for _, _, status in first} <= {'Marié', 'Célibataire', 'Divorcé'}
+    # Weekdays of December 2099, up to 22 punches each
+    assert AttendanceEmployee.query.count() == 50 * 22
+
+
+def test_cleanup_leaves_real_employees(database, make_employee):
+    real = make_employee('Ahmed Benali')
+    database.session.add(Advance(employee_id=real.id, amount=500, date=real.company_doj))
+    database.session.commit()
+    SyntheticWorkforce(10, MONTH).seed()
+
+    remove_synthetic_workforce()
+
+    assert [employee.id for employee in Employee.query.all()] == [real.id]
+    assert Advance.query.count() == 1
+    assert AttendanceEmployee.query.count() == 0
+    assert Branch.query.filter_by(name=BENCH_BRANCH).count() == 0
+
+
+def test_batch_route_skipped_with_real_employees(make_employee):
+    make_employee('Ahmed Benali')
+    SyntheticWorkforce(5, MONTH).seed()
+
+    assert bench_batch_route(MONTH) == {'skipped': '1 real employees in the database would be calculated too'}
+
+
+@pytest.mark.requires_postgres
+def test_report_written_as_json(database, tmp_path):
+    output = tmp_path / 'benchmark.json'
+
+    main(['--sizes', '30', '--sample', '10', '--output', str(output)])
+
+    report = json.loads(output.read_text())
+    run = report['runs'][0]
+    assert (run['size'], run['sample']) == (30, 10)
+    results = run['results']
+    assert results['simple_calculator']['payslips'] == 10
+    assert results['moroccan_calculator']['payslips'] == 10
+    assert results['batch_engine']['payslips'] == 30
+    assert results['batch_route']['status'] == 'completed'
+    assert results['simple_calculator']['p99_ms'] >= results['simple_calculator']['p50_ms']
+    # Nothing left behind
+    assert Employee.query.count() == 0
@@ -0,0 +1,60 @@
+"""
+Compiled bracket tables leave no gap between an integer max and the next
+min, and array lookups find the brackets single lookups find
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from payroll_brackets import compile_tax_table
+from payroll_kernel import MoroccanPayrollKernel, SimplePayrollKernel
+
+TAX_TABLE = SimplePayrollKernel.TAX_TABLE
+SENIORITY_TABLE = MoroccanPayrollKernel.SENIORITY_TABLE
+
+
+@pytest.mark.parametrize('value, rate', [
+    (Decimal('0'), Decimal('0')),
+    (Decimal('2500'), Decimal('0')),
+    (Decimal('2500.50'), Decimal('0.10')),
+    (Decimal('4166.01'), Decimal('0.20')),
+    (Decimal('5000.99'), Decimal('0.30')),
+    (Decimal('15000'), Decimal('0.34')),
+    (Decimal('2000000'), Decimal('0.38')),
+])
+def test_tax_bracket_covers_values_between_integer_bounds(value, rate):
+    assert TAX_TABLE.lookup(value)['rate'] == rate
+
+
+def test_tax_between_brackets_is_not_zero():
+    _, _, net_ir = SimplePayrollKernel().income_tax(Decimal('2500.50'))
+    assert net_ir == Decimal('0.05')
+
+
+def test_values_below_first_bracket():
+    assert TAX_TABLE.lookup(Decimal('-1')) is None
+    assert SENIORITY_TABLE.lookup(1) is None
+    assert SENIORITY_TABLE.lookup(2)['rate'] == Decimal('0.05')
+    assert SENIORITY_TABLE.lookup(25)['rate'] == Decimal('0.25')
+
+
+def test_brackets_given_out_of_order():
+    table = compile_tax_table([
+        {'min': 1001, 'max': 2000, 'rate': 0.2, 'deduction': 100},
+        {'min': 0, 'max': 1000, 'rate': 0, 'deduction': 0},
+    ])
+    assert table.lookup(Decimal('1000.5')) == {'rate': Decimal('0.2'), 'deduction': Decimal('100')}
+
+
+def test_array_lookup_matches_single_lookup():
+    values = np.concatenate([np.arange(-2, 20000, 0.5), [2500.01, 4166.99, 999999, 1e7]])
+
+    rates = TAX_TABLE.lookup_array(values, 'rate', default=-1.0)
+
+    expected = []
+    for value in values:
+        bracket = TAX_TABLE.lookup(Decimal(str(value)))
+        expected.append(float(bracket['rate']) if bracket else -1.0)
+    assert rates.tolist() == expected
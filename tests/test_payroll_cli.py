@@ -0,0 +1,95 @@
+"""
+flask payroll run and flask attendance ingest run payroll from a shell:
+progress on stdout, errors on stderr and a non-zero exit status on errors
+"""
+
+import os
+
+import pytest
+
+import payroll_batch
+from app import app
+from models import Branch, Department, PaySlip
+
+SAMPLE_EXPORT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'attached_assets', 'Events Today_20250826123445_1756208312404.xls'
+)
+
+
+def _invoke(*args):
+    return app.test_cli_runner().invoke(args=list(args))
+
+
+@pytest.fixture
+def two_branches(database, branch, make_employee):
+    """Ahmed in Casablanca, Salma in Rabat"""
+    rabat = Branch(name='Rabat', created_by=branch.created_by)
+    database.session.add(rabat)
+    database.session.flush()
+    department = Department(branch_id=rabat.id, name='Production', created_by=branch.created_by)
+    database.session.add(department)
+    database.session.commit()
+    ahmed = make_employee('Ahmed Benali', '5000')
+    salma = make_employee('Salma Idrissi', '7200')
+    salma.branch_id, salma.department_id = rabat.id, department.id
+    database.session.commit()
+    return ahmed, salma, rabat
+
+
+def test_dry_run_saves_nothing(two_branches):
+    result = _invoke('payroll', 'run', '--month', '2026-03', '--dry-run')
+
+    assert result.exit_code == 0, result.output
+    assert 'payroll: 2 employees' in result.output
+    assert 'payroll: 2/2 (100%)' in result.output
+    assert 'Dry run: net payable' in result.output
+    assert PaySlip.query.count() == 0
+
+
+@pytest.mark.parametrize('args, message', [
+    (['--month', '13/2026'], 'Invalid value for --month: expected MM/YYYY'),
+    (['--month', '03/2026', '--branch', 'Tanger'], 'Invalid value for --branch: unknown branch Tanger'),
+])
+def test_invalid_options(two_branches, args, message):
+    result = _invoke('payroll', 'run', *args)
+
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+def test_errors_exit_with_status_1(two_branches, monkeypatch):
+    monkeypatch.setattr(payroll_batch, 'calculate_batch_payslips',
+                        lambda *args, **kwargs: (1, ['Employé 2: salaire manquant']))
+
+    result = _invoke('payroll', 'run', '--month', '03/2026')
+
+    assert result.exit_code == 1
+    assert '1 payslips saved' in result.output
+    assert '1 errors' in result.stderr
+
+
+@pytest.mark.requires_postgres
+def test_run_one_branch(two_branches):
+    _, salma, rabat = two_branches
+
+    result = _invoke('payroll', 'run', '--month', '03/2026', '--branch', 'Rabat')
+
+    assert result.exit_code == 0, result.output
+    assert '1 payslips saved' in result.output
+    assert [payslip.employee_id for payslip in PaySlip.query.all()] == [salma.id]
+
+
+def test_ingest_reports_unmatched_employees(two_branches):
+    result = _invoke('attendance', 'ingest', SAMPLE_EXPORT, '--no-store')
+
+    assert result.exit_code == 0, result.output
+    assert ' 0 matched' in result.output
+    assert '  unmatched: ' in result.output
+
+
+def test_ingest_payroll_needs_a_month(two_branches):
+    result = _invoke('attendance', 'ingest', SAMPLE_EXPORT, '--run-payroll')
+
+    assert result.exit_code == 2
+    assert '--run-payroll needs --month' in result.output
@@ -0,0 +1,90 @@
+"""
+Payroll rates come from the active configuration rows, cached until the
+configuration version changes
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from models import PayrollConfiguration
+from payroll_config import DEFAULT_RATES, PayrollRateProvider, PayrollRates
+
+
+@pytest.fixture
+def provider(database):
+    """Provider that only checks the configuration version when invalidated"""
+    return PayrollRateProvider(poll_interval=3600)
+
+
+def _configure(database, key, value, **values):
+    config = PayrollConfiguration(config_key=key, config_value=value, **values)
+    database.session.add(config)
+    database.session.commit()
+    return config
+
+
+def test_defaults_without_configuration(provider):
+    assert provider.snapshot().as_dict() == DEFAULT_RATES
+
+
+def test_active_rows_override_defaults(database, provider):
+    _configure(database, 'cnss_rate', '0.05')
+    _configure(database, 'amo_rate', '0.03', is_active=False)
+    _configure(database, 'cimr_rate', 'sept pour cent')
+    _configure(database, 'smig', '3000')
+
+    rates = provider.snapshot()
+
+    assert rates.cnss_rate == Decimal('0.05')
+    assert rates.amo_rate == DEFAULT_RATES['amo_rate']
+    assert rates.cimr_rate == DEFAULT_RATES['cimr_rate']
+
+
+def test_snapshot_cached_until_configuration_changes(database, provider):
+    config = _configure(database, 'cnss_ceiling', '6000')
+    first = provider.snapshot()
+
+    provider.invalidate()
+    assert provider.snapshot() is first
+
+    config.config_value = '6500'
+    database.session.commit()
+    # Not checked again within the poll interval
+    assert provider.snapshot() is first
+
+    provider.invalidate()
+    second = provider.snapshot()
+    assert second.cnss_ceiling == Decimal('6500')
+    assert second.version != first.version
+
+
+def test_deleted_row_changes_version(database, provider):
+    _configure(database, 'family_allowance', '36')
+    config = _configure(database, 'cnss_rate', '0.05')
+    assert provider.snapshot().cnss_rate == Decimal('0.05')
+
+    database.session.delete(config)
+    database.session.commit()
+    provider.invalidate()
+
+    rates = provider.snapshot()
+    assert rates.cnss_rate == DEFAULT_RATES['cnss_rate']
+    assert rates.family_allowance == Decimal('36')
+
+
+def test_unknown_rate_names_are_refused():
+    with pytest.raises(ValueError, match='Unknown payroll rates: smig'):
+        PayrollRates({'smig': Decimal('3000')})
+    with pytest.raises(ValueError, match='Unknown payroll rates: cnss'):
+        PayrollRates().with_overrides({'cnss': 0.05})
+
+
+def test_overrides_leave_snapshot_untouched():
+    rates = PayrollRates(version='v1')
+
+    simulated = rates.with_overrides({'cnss_rate': 0.05})
+
+    assert simulated.cnss_rate == Decimal('0.05')
+    assert simulated.version == 'v1+overrides'
+    assert rates.cnss_rate == DEFAULT_RATES['cnss_rate']
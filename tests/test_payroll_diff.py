@@ -0,0 +1,86 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import app, db
+from models import Employee, PaySlip, User
+from payroll_diff import PayrollDiff, previous_salary_month
+
+
+@pytest.mark.parametrize('salary_month, previous', [
+    ('03/2026', '02/2026'),
+    ('2026-03', '02/2026'),
+    ('2026-01', '12/2025'),
+])
+def test_previous_salary_month(salary_month, previous):
+    assert previous_salary_month(salary_month) == previous
+
+
+def test_previous_salary_month_invalid():
+    with pytest.raises(ValueError):
+        previous_salary_month('2026-13')
+
+
+def test_diff_of_web_form_months():
+    """Months as <input type="month"> submits them find the MM/YYYY payslips"""
+    with app.app_context():
+        user = User(name='diff', email='diff@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        employee = Employee(user_id=user.id, name='Diff Employee', employee_id='DIFF1', is_active=1, created_by=1)
+        db.session.add(employee)
+        db.session.flush()
+        for salary_month, net in (('02/2026', '5000'), ('03/2026', '5400')):
+            db.session.add(PaySlip(employee_id=employee.id, salary_month=salary_month, net_payble=Decimal(net),
+                                   basic_salary=Decimal('5000'), status=1, created_by=1))
+        db.session.commit()
+        try:
+            diff = PayrollDiff('2026-03', threshold=100).compare()
+            assert (diff['salary_month'], diff['previous_month']) == ('03/2026', '02/2026')
+            assert diff['summary']['current_count'] == diff['summary']['previous_count'] == 1
+            assert [change['delta'] for change in diff['changes']] == [400]
+            assert PayrollDiff('2026-03', '2026-02').previous_month == '02/2026'
+        finally:
+            PaySlip.query.filter_by(employee_id=employee.id).delete()
+            db.session.delete(employee)
+            db.session.delete(user)
+            db.session.commit()
+
+
+@pytest.fixture
+def two_months(database, make_employee):
+    """Payslips of 02/2026 and 03/2026, net pay up by 400"""
+    employee = make_employee(employee_id='DIFF2')
+    for salary_month, net in (('02/2026', '5000'), ('03/2026', '5400')):
+        database.session.add(PaySlip(employee_id=employee.id, salary_month=salary_month, net_payble=Decimal(net),
+                                     basic_salary=Decimal('5000'), status=1, created_by=1))
+    database.session.commit()
+    return employee
+
+
+def test_diff_command(two_months, tmp_path):
+    output = tmp_path / 'diff.json'
+
+    result = app.test_cli_runner().invoke(args=['payroll', 'diff', '2026-03', '--output', str(output)])
+
+    assert result.exit_code == 0, result.output
+    assert '02/2026 -> 03/2026: 1 -> 1 payslips' in result.output
+    assert 'DIFF2 Ahmed Benali: 5000.00 -> 5400.00 (+400.00)' in result.output
+    assert json.loads(output.read_text())['changes'][0]['delta'] == 400
+
+
+def test_diff_command_threshold(two_months):
+    result = app.test_cli_runner().invoke(args=['payroll', 'diff', '03/2026', '--threshold', '500',
+                                                '--threshold-pct', '50'])
+
+    assert result.exit_code == 0, result.output
+    assert 'changes above threshold: 0' in result.output
+
+
+def test_diff_command_rejects_an_invalid_month(database):
+    result = app.test_cli_runner().invoke(args=['payroll', 'diff', '03/2026', '--previous', '2026-13'])
+
+    assert result.exit_code == 2
+    assert 'Invalid value for --previous: expected MM/YYYY' in result.output
@@ -0,0 +1,46 @@
+"""
+Re-running a month with skip_unchanged leaves payslips whose inputs did not
+change untouched
+"""
+
+from datetime import date
+
+import pytest
+
+from models import PaySlip
+from payroll_batch import calculate_batch_payslips
+from payroll_fingerprint import payslip_fingerprint
+
+INPUTS = dict(salary='5000', company_doj=date(2020, 1, 15), marital_status='Marié', advances=0,
+              overtime_hours=0, leave_allowance=0, years_of_service=6, config_version='v1')
+
+
+def test_fingerprint_ignores_how_amounts_are_written():
+    assert payslip_fingerprint(**INPUTS) == payslip_fingerprint(**{**INPUTS, 'salary': 5000.0, 'advances': None})
+
+
+@pytest.mark.parametrize('change', [
+    {'salary': '5000.01'},
+    {'overtime_hours': 2},
+    {'years_of_service': 7},
+    {'config_version': 'v2'},
+])
+def test_fingerprint_changes_with_inputs(change):
+    assert payslip_fingerprint(**INPUTS) != payslip_fingerprint(**{**INPUTS, **change})
+
+
+@pytest.mark.requires_postgres
+def test_rerun_skips_unchanged_payslips(database, make_employee):
+    first = make_employee('Ahmed Benali', '5000')
+    second = make_employee('Salma Idrissi', '7200')
+    assert calculate_batch_payslips('03/2026') == (2, [])
+    stored = {payslip.employee_id: payslip.updated_at for payslip in PaySlip.query.all()}
+
+    second.salary = 7500
+    database.session.commit()
+    assert calculate_batch_payslips('03/2026', skip_unchanged=True) == (1, [])
+
+    database.session.expire_all()
+    payslips = {payslip.employee_id: payslip for payslip in PaySlip.query.all()}
+    assert payslips[first.id].updated_at == stored[first.id]
+    assert payslips[second.id].basic_salary == 7500
@@ -0,0 +1,89 @@
+"""
+The payroll kernel calculates from plain records, without an app or a
+database, and the calculators are adapters over it
+"""
+
+import os
+import pickle
+import subprocess
+import sys
+from dataclasses import FrozenInstanceError
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+import payroll_kernel
+from payroll_kernel import MoroccanPayrollKernel, PayrollInput, SimplePayrollKernel
+from simple_payroll_calculator import SimpleMoroccanPayrollCalculator
+
+PAYROLL_INPUT = PayrollInput(1, Decimal('8000'), company_doj=date(2015, 3, 1), marital_status='Marié',
+                             advances=Decimal('500'), overtime_hours=4, as_of=date(2026, 3, 31))
+
+
+def test_kernel_runs_without_app_or_database():
+    script = (
+        'import sys\n'
+        'from decimal import Decimal\n'
+        'from payroll_kernel import PayrollInput, SimplePayrollKernel\n'
+        'result = SimplePayrollKernel().calculate(PayrollInput(1, Decimal("5000")))\n'
+        'print(result.gross_salary, [name for name in ("flask", "database", "models") if name in sys.modules])\n'
+    )
+    loaded = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(payroll_kernel.__file__))
+    assert loaded.stdout.split() == ['5000', '[]']
+
+
+def test_records_are_frozen_and_slotted():
+    result = SimplePayrollKernel().calculate(PAYROLL_INPUT)
+    for record in (PAYROLL_INPUT, result):
+        assert not hasattr(record, '__dict__')
+        with pytest.raises(FrozenInstanceError):
+            record.employee_id = 2
+        # Sent to and from worker processes
+        assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_detailed_payslip():
+    result = MoroccanPayrollKernel().calculate(PAYROLL_INPUT)
+
+    assert result.years_of_service == 11
+    assert result.seniority_bonus_amount == Decimal('800.00')
+    assert result.gross_salary == Decimal('8800.00')
+    assert (result.cnss_amount, result.amo_amount, result.cimr_amount) == \
+        (Decimal('268.80'), Decimal('198.88'), Decimal('616.00'))
+    assert result.professional_expenses_amount == Decimal('2200.00')
+    assert result.net_taxable_salary == Decimal('5516.32')
+    assert (result.gross_ir, result.family_allowance, result.net_ir) == \
+        (Decimal('488.23'), Decimal('30.00'), Decimal('458.23'))
+    assert result.total_deductions == Decimal('1541.91')
+    assert result.net_payable == Decimal('6758.09')
+
+
+def test_simple_payslip_amounts_add_up():
+    result = SimplePayrollKernel().calculate(PAYROLL_INPUT)
+
+    assert result.gross_salary == result.basic_salary + result.seniority_bonus + result.overtime_amount
+    assert result.total_deductions == result.cnss + result.amo + result.cimr + result.net_ir
+    assert result.net_salary == result.gross_salary - result.total_deductions
+    assert result.net_payable == result.net_salary - result.advances
+
+
+def test_input_from_employee_like_object():
+    employee = SimpleNamespace(id=7, salary=4200.5, company_doj=None)
+
+    payroll_input = PayrollInput.from_employee(employee, Decimal('100'), overtime_hours=2)
+
+    assert payroll_input.salary == Decimal('4200.5')
+    assert payroll_input.years_of_service is None
+    assert not payroll_input.is_married
+    assert SimplePayrollKernel().calculate(payroll_input).seniority_bonus == 0
+
+
+def test_calculator_is_an_adapter(make_employee):
+    employee = make_employee('Ahmed Benali', '8000', marital_status='Marié')
+
+    calculated = SimpleMoroccanPayrollCalculator(employee.id, '03/2026').calculate_result(overtime_hours=4)
+
+    assert calculated == SimplePayrollKernel().calculate(PayrollInput.from_employee(employee, overtime_hours=4))
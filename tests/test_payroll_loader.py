@@ -0,0 +1,94 @@
+"""
+Payroll inputs of a month are loaded in a fixed number of queries, and the
+calculators read them without querying per employee
+"""
+
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from models import Advance, PaySlip
+from payroll_calculator import calculate_employee_payslip
+from payroll_config import PayrollRates
+from payroll_loader import PayrollInputLoader, load_payroll_inputs
+from simple_payroll_calculator import calculate_simple_payslip
+
+
+@contextmanager
+def _selects(database):
+    """List of the SELECT statements run inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', record)
+
+
+def _workforce(database, make_employee, size):
+    employees = [make_employee(f'Employé {n}', str(4000 + 100 * n)) for n in range(size)]
+    for employee in employees:
+        database.session.add(Advance(employee_id=employee.id, amount=300, date=date(2026, 3, 5)))
+    database.session.commit()
+    return employees
+
+
+def test_selection_of_employees_advances_and_payslips(database, make_employee):
+    first, second = _workforce(database, make_employee, 2)
+    retired = make_employee('Karim Tazi', is_active=0)
+    database.session.add_all([
+        Advance(employee_id=first.id, amount=200, date=date(2026, 3, 6)),
+        Advance(employee_id=first.id, amount=999, date=date(2026, 2, 6), status='deducted'),
+        PaySlip(employee_id=first.id, salary_month='03/2026', net_payble=1, basic_salary=1, created_by=1),
+        PaySlip(employee_id=first.id, salary_month='02/2026', net_payble=1, basic_salary=1, created_by=1),
+    ])
+    database.session.commit()
+
+    inputs = load_payroll_inputs('03/2026', rates=PayrollRates())
+
+    assert list(inputs.employees) == [first.id, second.id]
+    assert inputs.get_employee(retired.id) is None
+    assert inputs.get_advance_total(first.id) == 500
+    assert inputs.get_payslip(first.id).salary_month == '03/2026'
+    assert inputs.get_payslip(second.id) is None
+
+    chosen = PayrollInputLoader('03/2026', [second.id, retired.id], active_only=False, rates=PayrollRates()).load()
+    assert sorted(chosen.employees) == sorted([second.id, retired.id])
+    assert chosen.get_advances(first.id) == []
+
+
+@pytest.mark.parametrize('size', [2, 8])
+def test_loading_runs_three_queries(database, make_employee, size):
+    _workforce(database, make_employee, size)
+    database.session.expire_all()
+
+    with _selects(database) as selects:
+        load_payroll_inputs('03/2026', rates=PayrollRates())
+
+    assert len(selects) == 3
+
+
+@pytest.mark.parametrize('calculate', [
+    lambda employee_id, inputs: calculate_simple_payslip(employee_id, '03/2026', inputs=inputs, commit=False),
+    lambda employee_id, inputs: calculate_employee_payslip(employee_id, '03/2026', inputs=inputs, commit=False),
+])
+def test_calculators_do_not_query_per_employee(database, make_employee, calculate):
+    employees = _workforce(database, make_employee, 4)
+    database.session.expire_all()
+    inputs = load_payroll_inputs('03/2026', rates=PayrollRates())
+
+    with _selects(database) as selects:
+        for employee in employees:
+            payslip, errors = calculate(employee.id, inputs)
+            assert not errors
+            assert 0 < payslip.net_payble < payslip.basic_salary
+
+    assert selects == []
+    assert len(inputs.payslips) == 4
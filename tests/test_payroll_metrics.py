@@ -0,0 +1,95 @@
+"""
+Instrumented payroll runs record wall and CPU time, queries and rows per
+step; uninstrumented code pays nothing
+"""
+
+from payroll_metrics import (
+    TIME_BUCKETS, Histogram, PayrollRunMetrics, current_metrics, instrumented_run, recent_runs, timed
+)
+from simple_payroll_calculator import calculate_simple_payslip
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram((1, 5, 10))
+    for value in (0.5, 2, 3, 4, 20):
+        histogram.observe(value)
+
+    assert histogram.buckets == [1, 3, 0, 1]
+    assert histogram.quantile(0.5) == 5
+    assert histogram.quantile(1) == 20
+    assert (histogram.min, histogram.max, histogram.total) == (0.5, 20, 29.5)
+
+    other = Histogram((1, 5, 10))
+    other.observe(7)
+    histogram.merge(other.to_dict())
+    assert histogram.buckets == [1, 3, 1, 1]
+    assert histogram.count == 6
+
+
+def test_timed_outside_a_run_records_nothing():
+    assert current_metrics() is None
+    with timed('calculator.calculate') as timing:
+        timing.rows = 10
+
+    @timed('calculator.save_payslip', rows=1)
+    def save():
+        return 'saved'
+
+    assert save() == 'saved'
+
+
+def test_disabled_run_yields_none():
+    with instrumented_run('payroll_cli', False) as metrics:
+        assert metrics is None
+        assert current_metrics() is None
+
+
+def test_instrumented_calculation(make_employee):
+    employee = make_employee('Ahmed Benali', '5000')
+
+    with instrumented_run('payroll_cli', salary_month='03/2026') as metrics:
+        calculate_simple_payslip(employee.id, '03/2026')
+        with timed('batch.upsert_payslips') as timing:
+            timing.rows = 3
+
+    assert current_metrics() is None
+    save = metrics.steps['calculator.save_payslip']
+    assert save.wall.count == 1
+    assert save.rows.total == 1
+    assert save.queries.total > 0
+    assert metrics.steps['calculator.calculate'].cpu.count == 1
+    assert metrics.steps['batch.upsert_payslips'].rows.total == 3
+    assert metrics.queries >= save.queries.total
+    assert metrics.wall_seconds >= save.wall.total
+
+    latest = recent_runs(1)[0]
+    assert latest['name'] == 'payroll_cli'
+    assert latest['labels'] == {'salary_month': '03/2026'}
+    assert 'calculator.save_payslip' in metrics.report()
+
+
+def test_worker_summaries_are_merged():
+    worker = PayrollRunMetrics('worker')
+    worker.record('calculator.calculate', 0.002, 0.001, 0, rows=1)
+    worker.queries = 4
+    run = PayrollRunMetrics('payroll_batch')
+    run.record('calculator.calculate', 0.003, 0.002, 1, rows=1)
+
+    run.merge(worker.summary())
+
+    stats = run.steps['calculator.calculate']
+    assert stats.wall.count == 2
+    assert stats.rows.total == 2
+    assert run.queries == 4
+    assert len(stats.wall.buckets) == len(TIME_BUCKETS) + 1
+
+
+def test_metrics_endpoint_lists_recent_runs(client):
+    with instrumented_run('payroll_batch', salary_month='04/2026'):
+        with timed('batch.commit'):
+            pass
+
+    runs = client.get('/payroll/metrics?limit=1').get_json()['runs']
+
+    assert [run['labels'] for run in runs] == [{'salary_month': '04/2026'}]
+    assert runs[0]['steps']['batch.commit']['wall']['count'] == 1
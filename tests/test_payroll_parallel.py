@@ -0,0 +1,90 @@
+"""
+Partitions that fail to save are retried, and those still failing are
+reported as unsaved
+"""
+
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+import payroll_parallel
+from payroll_parallel import ParallelPayrollExecutor, PayrollPartition, PayrollRunReport
+
+
+def _result(label, employees, saved, errors=()):
+    return {'label': label, 'employees': employees, 'saved': saved, 'failed': bool(errors) and not saved,
+            'errors': list(errors), 'seconds': 0}
+
+
+@pytest.fixture
+def partitions(monkeypatch):
+    """Runs the executor on three in-process partitions; returns the attempts made per label"""
+    attempts = {}
+    failures = {}
+
+    def run_partition(salary_month, label, employee_ids, overtime_hours, rates, dry_run, skip_unchanged,
+                      metrics):
+        attempts[label] = attempts.get(label, 0) + 1
+        if attempts[label] <= failures.get(label, 0):
+            return _result(label, len(employee_ids), 0, ["Erreur d'enregistrement: deadlock detected"])
+        return _result(label, len(employee_ids), len(employee_ids))
+
+    monkeypatch.setattr(payroll_parallel, '_run_partition', run_partition)
+    monkeypatch.setattr(payroll_parallel, 'ProcessPoolExecutor',
+                        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(payroll_parallel, 'get_payroll_rates', lambda: None)
+    monkeypatch.setattr(payroll_parallel, 'plan_partitions', lambda *args: [
+        PayrollPartition('branch:1', [1, 2]),
+        PayrollPartition('branch:2', [3]),
+        PayrollPartition('branch:3', [4, 5, 6]),
+    ])
+    return attempts, failures
+
+
+def test_failed_partition_is_retried(partitions):
+    attempts, failures = partitions
+    failures['branch:2'] = 1
+
+    report = ParallelPayrollExecutor('03/2026', workers=2).run(dry_run=True)
+
+    assert attempts == {'branch:1': 1, 'branch:2': 2, 'branch:3': 1}
+    assert report.status == 'completed'
+    assert report.saved == 6
+    assert report.errors == []
+
+
+def test_partition_failing_every_attempt_leaves_run_partial(partitions):
+    attempts, failures = partitions
+    failures['branch:3'] = 2
+
+    report = ParallelPayrollExecutor('03/2026', workers=2, retries=1).run(dry_run=True)
+
+    assert attempts['branch:3'] == 2
+    assert report.status == 'partial'
+    assert report.failed_partitions == ['branch:3']
+    assert report.unsaved_employees == 3
+    assert report.saved == 3
+    assert report.to_dict()['failed_partitions'] == ['branch:3']
+    assert report.errors == ["[branch:3] Erreur d'enregistrement: deadlock detected"]
+
+
+def test_report_status():
+    report = PayrollRunReport('03/2026')
+    assert report.status == 'completed'
+    report.add_partition_result(_result('branch:1', 2, 0, ['Erreur']))
+    assert report.status == 'failed'
+    report.add_partition_result(_result('branch:2', 1, 1))
+    assert report.status == 'partial'
+
+
+def _worker_modules():
+    payroll_parallel._get_worker_app()
+    return 'app' in sys.modules, 'routes' in sys.modules, 'models' in sys.modules
+
+
+def test_worker_app_leaves_out_the_web_app():
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        assert pool.submit(_worker_modules).result() == (False, False, True)
@@ -0,0 +1,84 @@
+"""
+Pipelines are checked when declared, and the steps a plan leaves out would
+only have produced zeros
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from payroll_kernel import MoroccanPayrollKernel, SimplePayrollKernel
+from payroll_pipeline import ARRAYS, DECIMAL, ExecutionPlan, PayrollPipeline, step
+
+SIMPLE_INPUTS = {
+    'basic_salary': Decimal('6200'), 'years_of_service': 7, 'overtime_hours': Decimal('0'),
+    'leave_allowance': Decimal('0'), 'is_married': True, 'number_of_children': 0, 'advances': Decimal('0'),
+}
+DETAILED_INPUTS = {
+    'basic_salary': Decimal('6200'), 'days_worked': 24, 'attendance_holiday_days': 0, 'leave_days': 0,
+    'holiday_days': 0, 'worked_on_holidays': False, 'regular_overtime_hours': 0,
+    'weekend_overtime_hours': 0, 'holiday_overtime_hours': 0, 'years_of_service': 7, 'is_married': False,
+    'number_of_children': 0, 'advances': Decimal('300'),
+}
+
+
+@step(['a'], ['b'])
+def double(values, ops, config):
+    return {'b': values['a'] * 2}
+
+
+@step(['b', 'bonus'], ['c'], skip_unless=['bonus'])
+def add_bonus(values, ops, config):
+    return {'c': values['b'] + values['bonus']}
+
+
+def test_steps_checked_when_declared():
+    with pytest.raises(ValueError, match='step double needs a before it runs'):
+        PayrollPipeline('toy', ['bonus'], [double])
+    with pytest.raises(ValueError, match='step double produces b again'):
+        PayrollPipeline('toy', ['a', 'b'], [double])
+    with pytest.raises(ValueError, match='add_bonus can only be skipped on its own inputs'):
+        PayrollPipeline('toy', ['a', 'b', 'bonus'], [step(['b'], ['c'], skip_unless=['bonus'])(add_bonus.func)])
+
+
+def test_plan_skips_steps_with_zero_triggers():
+    pipeline = PayrollPipeline('toy', ['a', 'bonus'], [double, add_bonus])
+
+    assert pipeline.run({'a': Decimal('2'), 'bonus': Decimal('0')}, None)['c'] == 0
+    assert pipeline.run({'a': Decimal('2'), 'bonus': Decimal('1')}, None)['c'] == 5
+    plan = pipeline.compile({'a': Decimal('3'), 'bonus': Decimal('0')}, DECIMAL)
+    assert [step.name for step in plan.skipped] == ['add_bonus']
+    assert pipeline.compile({'a': Decimal('9'), 'bonus': Decimal('0')}, DECIMAL) is plan
+
+    with pytest.raises(ValueError, match='toy: missing inputs bonus'):
+        pipeline.run({'a': Decimal('2')}, None)
+
+
+def test_plan_on_columns_runs_step_when_any_value_triggers_it():
+    pipeline = PayrollPipeline('toy', ['a', 'bonus'], [double, add_bonus])
+
+    values = pipeline.run({'a': np.array([1.0, 2.0]), 'bonus': np.array([0.0, 0.5])}, None, ARRAYS)
+
+    assert values['c'].tolist() == [2.0, 4.5]
+
+
+@pytest.mark.parametrize('kernel, inputs', [
+    (SimplePayrollKernel(), SIMPLE_INPUTS),
+    (MoroccanPayrollKernel(), DETAILED_INPUTS),
+])
+def test_skipped_steps_would_have_produced_zeros(kernel, inputs):
+    pipeline = kernel.PIPELINE
+    plan = pipeline.compile(dict(inputs), DECIMAL)
+    assert plan.skipped
+
+    every_step = ExecutionPlan(pipeline.name, pipeline.steps, [])
+
+    assert plan.run(dict(inputs), DECIMAL, kernel) == every_step.run(dict(inputs), DECIMAL, kernel)
+
+
+def test_detailed_plan_keeps_triggered_steps():
+    plan = MoroccanPayrollKernel.PIPELINE.compile({**DETAILED_INPUTS, 'weekend_overtime_hours': 3}, DECIMAL)
+
+    skipped = {step.name for step in plan.skipped}
+    assert skipped == {'paid_leave', 'paid_holidays', 'overtime_regular', 'overtime_holiday'}
@@ -0,0 +1,55 @@
+"""
+Simulation scenarios override known payroll rates; unknown rate names are
+rejected instead of silently ignored
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from payroll_config import PayrollRates
+
+
+def test_override_replaces_a_known_rate():
+    rates = PayrollRates().with_overrides({'cimr_rate': '0.08'}, version='simulation:cimr')
+
+    assert rates.cimr_rate == Decimal('0.08')
+    assert rates.cnss_rate == PayrollRates().cnss_rate
+    assert rates.version == 'simulation:cimr'
+
+
+@pytest.mark.parametrize('build', [
+    lambda: PayrollRates().with_overrides({'cimr_rat': '0.08'}),
+    lambda: PayrollRates({'cimr_rat': Decimal('0.08')}),
+])
+def test_unknown_rate_is_rejected(build):
+    with pytest.raises(ValueError, match='cimr_rat'):
+        build()
+
+
+def _simulate(client, rates):
+    return client.post('/payroll/simulate', json={
+        'salary_month': '03/2026', 'scenarios': [{'name': 'CIMR 8%', 'rates': rates}]
+    })
+
+
+def test_simulation_reports_the_scenario_delta(client, make_employee):
+    # No hiring date: no seniority bonus, the gross salary is the salary
+    make_employee(salary='10000', company_doj=None)
+
+    response = _simulate(client, {'cimr_rate': '0.08'})
+
+    assert response.status_code == 200
+    scenario = response.get_json()['scenarios'][0]
+    assert scenario['rates'] == {'cimr_rate': '0.08'}
+    # One more point of CIMR on 10,000 MAD
+    assert scenario['delta']['cimr'] == 100.0
+
+
+def test_simulation_with_unknown_rate_is_a_bad_request(client, make_employee):
+    make_employee(salary='10000')
+
+    response = _simulate(client, {'cimr_rat': '0.08'})
+
+    assert response.status_code == 400
+    assert 'cimr_rat' in response.get_json()['error']
@@ -0,0 +1,78 @@
+"""
+Saved payslips keep their breakdown as line items, which the payslip view and
+the component totals read without recomputing
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from models import Advance, PaySlipLine
+from payslip_lines import build_lines, component_totals
+from simple_payroll_calculator import calculate_simple_payslip
+
+
+def _lines(payslip):
+    return {line.component: line.amount for line in PaySlipLine.query.filter_by(payslip_id=payslip.id)}
+
+
+def test_zero_lines_dropped_except_totals():
+    lines = build_lines({
+        'basic_salary': Decimal('0'),
+        'overtime': (Decimal('0'), None, 0),
+        'cnss': (Decimal('224.004'), Decimal('0.0448'), None),
+        'seniority_bonus': (Decimal('250.005'), Decimal('0.05'), 3),
+    })
+
+    assert [line['component'] for line in lines] == ['basic_salary', 'cnss', 'seniority_bonus']
+    assert [line['amount'] for line in lines] == [Decimal('0.00'), Decimal('224.00'), Decimal('250.01')]
+    assert lines[2]['quantity'] == Decimal('3.00')
+
+
+def test_saved_payslip_has_its_breakdown(make_employee):
+    employee = make_employee('Ahmed Benali', '5000', company_doj=None)
+
+    payslip, _ = calculate_simple_payslip(employee.id, '03/2026')
+
+    lines = _lines(payslip)
+    assert lines['basic_salary'] == lines['gross_salary'] == Decimal('5000.00')
+    assert lines['cnss'] == Decimal('224.00')
+    assert lines['net_payable'] == payslip.net_payble
+    assert lines['total_deductions'] == payslip.saturation_deduction
+    assert 'seniority_bonus' not in lines
+
+
+def test_recalculation_updates_lines_in_place(database, make_employee):
+    employee = make_employee('Ahmed Benali', '5000', company_doj=None)
+    database.session.add(Advance(employee_id=employee.id, amount=400, date=date(2026, 3, 2)))
+    database.session.commit()
+    payslip, _ = calculate_simple_payslip(employee.id, '03/2026')
+    assert _lines(payslip)['advances'] == Decimal('400.00')
+
+    Advance.query.delete()
+    employee.salary = 6000
+    database.session.commit()
+    payslip, errors = calculate_simple_payslip(employee.id, '03/2026')
+
+    assert not errors
+    lines = _lines(payslip)
+    assert 'advances' not in lines
+    assert lines['basic_salary'] == Decimal('6000.00')
+
+
+def test_component_totals_per_branch(branch, make_employee):
+    for name, salary in [('Ahmed Benali', '5000'), ('Salma Idrissi', '7000')]:
+        calculate_simple_payslip(make_employee(name, salary, company_doj=None).id, '03/2026')
+
+    totals = component_totals('03/2026', components=['gross_salary', 'cnss'])
+
+    assert totals == {branch.id: {'gross_salary': Decimal('12000.00'), 'cnss': Decimal('492.80')}}
+
+
+def test_payslip_view_shows_lines(client, make_employee):
+    employee = make_employee('Ahmed Benali', '5000', company_doj=None)
+    payslip, _ = calculate_simple_payslip(employee.id, '03/2026')
+
+    page = client.get(f'/payroll/{payslip.id}').get_data(as_text=True)
+
+    assert 'CNSS' in page
+    assert '224.00' in page
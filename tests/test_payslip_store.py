@@ -0,0 +1,67 @@
+"""
+Payslips are upserted in chunks on (employee_id, salary_month), all or nothing
+"""
+
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from models import PaySlip, PaySlipLine
+from payslip_store import bulk_upsert_payslips
+from schema_upgrades import apply_schema_upgrades
+
+pytestmark = pytest.mark.requires_postgres
+
+
+def _rows(employees, net):
+    return [{'employee_id': employee.id, 'salary_month': '03/2026', 'basic_salary': Decimal('5000'),
+             'net_payble': Decimal(net)} for employee in employees]
+
+
+@pytest.fixture
+def employees(make_employee):
+    return [make_employee(f'Employé {number}') for number in range(3)]
+
+
+def test_second_run_updates_the_payslips_of_the_first(database, employees):
+    chunks = []
+    assert bulk_upsert_payslips(_rows(employees, '4100.00'), chunk_size=2, on_chunk=chunks.append) == 3
+    ids = {payslip.employee_id: payslip.id for payslip in PaySlip.query.all()}
+
+    assert bulk_upsert_payslips(_rows(employees, '4250.50'), chunk_size=2, on_chunk=chunks.append) == 3
+
+    database.session.expire_all()
+    payslips = PaySlip.query.all()
+    assert chunks == [2, 1, 2, 1]
+    assert {payslip.employee_id: payslip.id for payslip in payslips} == ids
+    assert {payslip.net_payble for payslip in payslips} == {Decimal('4250.50')}
+
+
+def test_failing_chunk_writes_nothing(database, employees):
+    rows = _rows(employees, '4100.00') + [{'employee_id': 999999, 'salary_month': '03/2026',
+                                            'basic_salary': Decimal('1'), 'net_payble': Decimal('1')}]
+
+    with pytest.raises(Exception):
+        bulk_upsert_payslips(rows, chunk_size=2)
+
+    assert PaySlip.query.count() == 0
+
+
+def test_upgrade_keeps_the_latest_duplicate_payslip(database, employees):
+    database.session.execute(text('ALTER TABLE pay_slips DROP CONSTRAINT IF EXISTS uq_pay_slips_employee_month'))
+    database.session.execute(text('DROP INDEX IF EXISTS uq_pay_slips_employee_month'))
+    ids = []
+    for net, updated_at in [('4100.00', '2026-04-01 10:00'), ('4250.50', '2026-04-02 10:00')]:
+        ids.append(database.session.execute(text(
+            "INSERT INTO pay_slips (employee_id, salary_month, basic_salary, net_payble, created_by, updated_at) "
+            "VALUES (:employee, '03/2026', 5000, :net, 1, :updated_at) RETURNING id"
+        ), {'employee': employees[0].id, 'net': net, 'updated_at': updated_at}).scalar())
+        database.session.add(PaySlipLine(payslip_id=ids[-1], component='net_payable', amount=Decimal(net)))
+    database.session.commit()
+
+    apply_schema_upgrades()
+
+    assert [(payslip.id, payslip.net_payble) for payslip in PaySlip.query.all()] == [(ids[1], Decimal('4250.50'))]
+    assert [line.payslip_id for line in PaySlipLine.query.all()] == [ids[1]]
+    assert database.session.execute(text("SELECT to_regclass('uq_pay_slips_employee_month')")).scalar()
@@ -0,0 +1,76 @@
+"""
+Employees reaching retirement age within the window get one retirement
+event, Feb 29 birthdays included
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from app import app
+from models import RetirementEvent
+from retirement_scanner import RetirementScanner, add_years, scan_retirements
+
+
+@pytest.mark.parametrize('day, years, expected', [
+    (date(1968, 2, 29), 60, date(2028, 2, 29)),
+    (date(1968, 2, 29), 61, date(2029, 2, 28)),
+    (date(2029, 2, 28), -61, date(1968, 2, 28)),
+    (date(1966, 7, 14), 60, date(2026, 7, 14)),
+])
+def test_add_years(day, years, expected):
+    assert add_years(day, years) == expected
+
+
+def test_feb_29_birthday_retires_on_feb_28_of_a_common_year(database, make_employee):
+    employee = make_employee(date_of_birth=date(1968, 2, 29))
+
+    # Retirement day is today: the birth date range is widened so it is not missed
+    scanner = RetirementScanner(retirement_age=61, window_days=0, today=date(2029, 2, 28))
+
+    assert scanner.find_candidates() == [(employee.id, date(2029, 2, 28))]
+
+
+def test_window_bounds(database, make_employee):
+    inside = make_employee('Ahmed Benali', date_of_birth=date(1966, 5, 31))
+    make_employee('Salma Idrissi', date_of_birth=date(1966, 6, 1))
+    make_employee('Karim Tazi', date_of_birth=date(1966, 3, 31))
+    make_employee('Nadia Alaoui', date_of_birth=date(1966, 5, 1), is_active=0)
+
+    scanner = RetirementScanner(window_days=60, today=date(2026, 4, 1))
+
+    assert scanner.find_candidates() == [(inside.id, date(2026, 5, 31))]
+
+
+@pytest.mark.requires_postgres
+def test_recorded_retirement_is_not_recorded_again(database, make_employee):
+    employee = make_employee(date_of_birth=date(1966, 5, 31))
+
+    assert scan_retirements(today=date(2026, 4, 1)) == 1
+    assert scan_retirements(today=date(2026, 4, 15)) == 0
+
+    events = RetirementEvent.query.all()
+    assert [(event.employee_id, event.retirement_date, event.notification_date) for event in events] == [
+        (employee.id, date(2026, 5, 31), date(2026, 4, 1))
+    ]
+
+
+@pytest.mark.requires_postgres
+def test_payroll_command_records_retirements(database, make_employee):
+    make_employee(date_of_birth=add_years(date.today() + timedelta(days=10), -60))
+
+    result = app.test_cli_runner().invoke(args=['payroll', 'run', '--month', '03/2026'])
+
+    assert result.exit_code == 0, result.output
+    assert '1 retirement events created' in result.output
+    assert RetirementEvent.query.count() == 1
+
+
+@pytest.mark.requires_postgres
+def test_scan_command(database, make_employee):
+    make_employee(date_of_birth=add_years(date.today(), -60))
+
+    result = app.test_cli_runner().invoke(args=['payroll', 'scan-retirements', '--window-days', '5'])
+
+    assert result.exit_code == 0, result.output
+    assert '1 retirement events created' in result.output
@@ -0,0 +1,51 @@
+from datetime import date
+
+import pytest
+
+from models import PaySlip
+from payroll_ytd import normalize_salary_month, salary_month_period
+
+
+@pytest.mark.parametrize('salary_month, period', [
+    ('03/2026', date(2026, 3, 1)),
+    ('3/2026', date(2026, 3, 1)),
+    # <input type="month"> of the batch forms
+    ('2026-03', date(2026, 3, 1)),
+    ('2026-12', date(2026, 12, 1)),
+])
+def test_salary_month_period(salary_month, period):
+    assert salary_month_period(salary_month) == period
+    assert normalize_salary_month(salary_month) == period.strftime('%m/%Y')
+
+
+@pytest.mark.parametrize('salary_month', ['13/2026', '2026-13', '2026/03', 'mars 2026', '', None])
+def test_invalid_salary_month(salary_month):
+    assert salary_month_period(salary_month) is None
+    assert normalize_salary_month(salary_month) is None
+
+
+def _create_payslip(client, employee, salary_month):
+    return client.post('/payroll/create', data={
+        'employee_id': employee.id, 'salary_month': salary_month, 'basic_salary': '5000',
+    })
+
+
+@pytest.mark.parametrize('salary_month', ['03/2026', '2026-03', ' 3/2026 '])
+def test_payslip_form_stores_the_month_label(client, make_employee, salary_month):
+    employee = make_employee()
+
+    response = _create_payslip(client, employee, salary_month)
+
+    assert response.status_code == 302
+    payslip = PaySlip.query.one()
+    assert (payslip.salary_month, payslip.period) == ('03/2026', date(2026, 3, 1))
+
+
+def test_payslip_form_rejects_an_unreadable_month(client, make_employee):
+    employee = make_employee()
+
+    response = _create_payslip(client, employee, 'mars 2026')
+
+    assert response.status_code == 200
+    assert 'Mois invalide' in response.get_data(as_text=True)
+    assert PaySlip.query.count() == 0